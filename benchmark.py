@@ -0,0 +1,397 @@
+"""
+Throughput benchmarks for the War game engines.
+
+Every engine plays the same fixed seed set under every rule combination it
+supports, and the best of a few repeats is reported as games/sec, rounds/sec
+and ns/round. Results are saved as JSON so a later run can be compared
+against them with ``--baseline``:
+
+    python benchmark.py --output before.json
+    # ... optimize ...
+    python benchmark.py --baseline before.json --output after.json
+
+Engines are registered in ``ENGINES``; a new engine only needs a function
+that plays a list of seeds and returns the total number of rounds played,
+decorated with ``register_engine``.
+
+``--metrics`` also counts the mechanics behind those rounds (draws, discard
+pickups, wars, suit ups, battles) per rule set, untimed, to show which of
+them dominate the cost of a round.
+"""
+
+import json
+import logging
+import platform
+import random
+import time
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence
+
+from helper_functions import RULE_SETS, GameMetrics, GameState, rules_name
+from simulation import iter_seeded_games, play_game
+from war_engine import play_war
+
+# The legacy engine is slow and the lockstep engine only pays off on big batches
+DEFAULT_GAMES = {"legacy": 100, "vector": 20000}
+
+
+class UnsupportedRules(Exception):
+    """Raised by an engine that does not implement the requested house rules"""
+
+
+# Plays every seed with the given (suit_up, battle_advantage) rules, returns total rounds
+EngineRunner = Callable[[Sequence[int], bool, bool], int]
+
+
+@dataclass(frozen=True)
+class Engine:
+    """A benchmarked engine, prepare runs once before the timed runs"""
+
+    run: EngineRunner
+    prepare: Optional[Callable[[Sequence[int], bool, bool], object]] = None
+
+
+ENGINES: Dict[str, Engine] = {}
+
+
+def register_engine(name: str, prepare=None):
+    """Decorator adding an engine runner to ENGINES under name"""
+
+    def register(runner: EngineRunner) -> EngineRunner:
+        ENGINES[name] = Engine(runner, prepare)
+        return runner
+
+    return register
+
+
+class _RoundCounter(logging.Handler):
+    """Counts the round headers the legacy engine logs, it has no other result"""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.rounds = 0
+
+    def emit(self, record):
+        if record.msg.startswith("---- Round"):
+            self.rounds += 1
+
+
+@register_engine("legacy")
+def _run_legacy(seeds: Sequence[int], suit_up: bool, battle_advantage: bool) -> int:
+    """legacy_war_game.play_war: string cards, list.pop(0), any(hand) scans"""
+    if battle_advantage:
+        raise UnsupportedRules("legacy engine has no battle with advantage rule")
+    # Imported here, the legacy module configures logging when it is imported
+    import legacy_war_game
+
+    legacy_war_game.args = SimpleNamespace(auto=True, output=False, suit_up=suit_up)
+    counter = _RoundCounter()
+    logger = logging.getLogger()
+    level = logger.level
+    # The legacy engine always logs every round at INFO, as its own basicConfig sets up
+    logger.setLevel(logging.INFO)
+    logger.addHandler(counter)
+    try:
+        for seed in seeds:
+            random.seed(seed)
+            try:
+                legacy_war_game.play_war()
+            except AssertionError:
+                pass  # Its 10,000 round limit, the rounds were still played
+    finally:
+        logger.removeHandler(counter)
+        logger.setLevel(level)
+    return counter.rounds
+
+
+_rounds_cache: Dict[tuple, int] = {}
+
+
+def _rounds_played(seeds: Sequence[int], suit_up: bool, battle_advantage: bool) -> int:
+    """Total rounds of the seeded games, computed once outside the timed runs"""
+    key = (tuple(seeds), suit_up, battle_advantage)
+    if key not in _rounds_cache:
+        _rounds_cache[key] = sum(
+            result.rounds
+            for result in iter_seeded_games(seeds, suit_up, battle_advantage)
+        )
+    return _rounds_cache[key]
+
+
+@register_engine("war_engine", prepare=_rounds_played)
+def _run_war_engine(seeds: Sequence[int], suit_up: bool, battle_advantage: bool) -> int:
+    """war_engine.play_war without logging, the engine behind war_game.py"""
+    for seed in seeds:
+        play_war(
+            suit_up=suit_up,
+            battle_advantage=battle_advantage,
+            verbosity="none",
+            rng=random.Random(seed),
+        )
+    # Same deals and rules as the headless engine, so the same number of rounds
+    return _rounds_played(seeds, suit_up, battle_advantage)
+
+
+@register_engine("simulation")
+def _run_simulation(seeds: Sequence[int], suit_up: bool, battle_advantage: bool) -> int:
+    """simulation.play_game, the headless object engine"""
+    return sum(
+        result.rounds for result in iter_seeded_games(seeds, suit_up, battle_advantage)
+    )
+
+
+@register_engine("vector")
+def _run_vector(seeds: Sequence[int], suit_up: bool, battle_advantage: bool) -> int:
+    """vector_engine lockstep batch, including building the deals"""
+    # Imported here so the other engines can be benchmarked without NumPy loaded
+    from vector_engine import deals_from_seeds, simulate_deals
+
+    results = simulate_deals(deals_from_seeds(seeds), suit_up, battle_advantage)
+    return int(results.rounds.sum())
+
+
+@dataclass
+class BenchmarkResult:
+    """Best of several timed runs of one engine under one rule set"""
+
+    engine: str
+    suit_up: bool
+    battle_advantage: bool
+    games: int
+    rounds: int
+    seconds: float
+    games_per_sec: float
+    rounds_per_sec: float
+    ns_per_round: float
+
+
+def benchmark_engine(
+    engine: str,
+    seeds: Sequence[int],
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    repeat: int = 3,
+) -> Optional[BenchmarkResult]:
+    """
+    Time engine over seeds, keeping the fastest of repeat runs.
+    Returns None if the engine doesn't support the rules.
+    """
+    runner = ENGINES[engine]
+    seeds = tuple(seeds)
+
+    best = None
+    for _ in range(repeat):
+        try:
+            if best is None and runner.prepare is not None:
+                runner.prepare(seeds, suit_up, battle_advantage)
+            start = time.perf_counter()
+            rounds = runner.run(seeds, suit_up, battle_advantage)
+        except UnsupportedRules:
+            return None
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return BenchmarkResult(
+        engine=engine,
+        suit_up=suit_up,
+        battle_advantage=battle_advantage,
+        games=len(seeds),
+        rounds=rounds,
+        seconds=best,
+        games_per_sec=len(seeds) / best,
+        rounds_per_sec=rounds / best,
+        ns_per_round=best / rounds * 1e9 if rounds else 0.0,
+    )
+
+
+def run_benchmarks(
+    engines: Sequence[str],
+    seeds: Sequence[int],
+    rule_sets=RULE_SETS,
+    repeat: int = 3,
+    games: Optional[Dict[str, int]] = None,
+) -> List[BenchmarkResult]:
+    """
+    Benchmark every engine under every rule set. games optionally plays only
+    the first n seeds for some engines, or extends the seed set for them.
+    """
+    results = []
+    for engine in engines:
+        engine_seeds = seeds
+        if games and engine in games:
+            engine_seeds = range(seeds[0], seeds[0] + games[engine])
+        for suit_up, battle_advantage in rule_sets:
+            result = benchmark_engine(
+                engine, engine_seeds, suit_up, battle_advantage, repeat
+            )
+            if result is not None:
+                results.append(result)
+    return results
+
+
+def results_to_json(results: List[BenchmarkResult], first_seed: int = 0) -> dict:
+    """
+    JSON document for a benchmark run, with enough context to compare runs.
+    Every engine played seeds first_seed, first_seed + 1, ... for its games.
+    """
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "first_seed": first_seed,
+        "results": [asdict(result) for result in results],
+    }
+
+
+def compare_to_baseline(current: dict, baseline: dict) -> List[dict]:
+    """
+    Match results by engine and rules, speedup > 1 means the current run is faster.
+    Results missing from either run are skipped.
+    """
+
+    def key(result):
+        return (result["engine"], result["suit_up"], result["battle_advantage"])
+
+    baseline_results = {key(result): result for result in baseline["results"]}
+    comparisons = []
+    for result in current["results"]:
+        before = baseline_results.get(key(result))
+        if before is None or not result["ns_per_round"]:
+            continue
+        comparisons.append(
+            {
+                "engine": result["engine"],
+                "suit_up": result["suit_up"],
+                "battle_advantage": result["battle_advantage"],
+                "baseline_ns_per_round": before["ns_per_round"],
+                "ns_per_round": result["ns_per_round"],
+                "speedup": before["ns_per_round"] / result["ns_per_round"],
+            }
+        )
+    return comparisons
+
+
+def collect_metrics(
+    seeds: Sequence[int], suit_up: bool = False, battle_advantage: bool = False
+) -> GameMetrics:
+    """Mechanics counted over the seeded games with simulation.play_game"""
+    metrics = GameMetrics()
+    for seed in seeds:
+        game_state = GameState()
+        game_state.setup_game(shuffle_deck=True, rng=random.Random(seed))
+        game_state.enable_metrics(metrics)
+        play_game(game_state, suit_up, battle_advantage)
+    return metrics
+
+
+def main(argv=None):
+    """Run the benchmarks described by the command line and print a table"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the War game engines")
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES),
+        help="Engines to benchmark (default: all)",
+    )
+    parser.add_argument(
+        "--games", type=int, default=500, help="Games per engine and rule set"
+    )
+    parser.add_argument(
+        "--games-for",
+        action="append",
+        default=[],
+        metavar="ENGINE=GAMES",
+        help="Games for one engine instead of --games, defaults to "
+        + ", ".join(f"{engine}={games}" for engine, games in DEFAULT_GAMES.items()),
+    )
+    parser.add_argument("--seed", type=int, default=0, help="First seed of the set")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs per benchmark, best is kept"
+    )
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier")
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Also count the mechanics per round under each rule set",
+    )
+    args = parser.parse_args(argv)
+
+    games = dict(DEFAULT_GAMES)
+    for option in args.games_for:
+        engine, _, count = option.partition("=")
+        if engine not in ENGINES or not count.isdigit():
+            parser.error(f"--games-for expects ENGINE=GAMES, got {option!r}")
+        games[engine] = int(count)
+
+    seeds = range(args.seed, args.seed + args.games)
+    results = run_benchmarks(args.engines, seeds, repeat=args.repeat, games=games)
+    document = results_to_json(results, args.seed)
+
+    print(
+        f"{'engine':<12} {'rules':<24} {'games':>6} {'games/s':>10} "
+        f"{'rounds/s':>12} {'ns/round':>10}"
+    )
+    for result in results:
+        print(
+            f"{result.engine:<12} "
+            f"{rules_name(result.suit_up, result.battle_advantage):<24} "
+            f"{result.games:>6} {result.games_per_sec:>10.1f} "
+            f"{result.rounds_per_sec:>12.0f} {result.ns_per_round:>10.0f}"
+        )
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            comparisons = compare_to_baseline(document, json.load(baseline_file))
+        print(f"\nAgainst {args.baseline}:")
+        for comparison in comparisons:
+            rules = rules_name(comparison["suit_up"], comparison["battle_advantage"])
+            print(
+                f"{comparison['engine']:<12} {rules:<24} "
+                f"{comparison['baseline_ns_per_round']:>10.0f} -> "
+                f"{comparison['ns_per_round']:>10.0f} ns/round "
+                f"({comparison['speedup']:.2f}x)"
+            )
+        document["baseline"] = {"path": args.baseline, "comparisons": comparisons}
+
+    if args.metrics:
+        print(
+            f"\n{'rules':<24} {'draws':>8} {'refills':>8} {'refilled':>9} "
+            f"{'wars':>8} {'suit ups':>9} {'battles':>8}   per round"
+        )
+        document["metrics"] = []
+        for suit_up, battle_advantage in RULE_SETS:
+            metrics = collect_metrics(seeds, suit_up, battle_advantage)
+            per_round = max(metrics.rounds, 1)
+            print(
+                f"{rules_name(suit_up, battle_advantage):<24} "
+                f"{metrics.draws / per_round:>8.3f} "
+                f"{metrics.refills / per_round:>8.3f} "
+                f"{metrics.refill_cards / per_round:>9.3f} "
+                f"{metrics.wars / per_round:>8.3f} "
+                f"{metrics.suit_ups / per_round:>9.3f} "
+                f"{metrics.battles / per_round:>8.3f}"
+            )
+            document["metrics"].append(
+                {
+                    "suit_up": suit_up,
+                    "battle_advantage": battle_advantage,
+                    **metrics.as_dict(),
+                }
+            )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(document, output_file, indent=2)
+            output_file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Streaming, mergeable statistics over many games.
+
+``GameStats`` summarizes a sweep without keeping its results: outcome rates,
+Welford mean and variance of the round counts, a quantile sketch and a
+fixed-width histogram of them, cycle length percentiles and war chain
+depths. Every part takes a
+fixed amount of memory however many games are added, and merges exactly
+(up to float rounding of the mean and variance), so shards and worker
+processes each fill their own and the totals are merged at the end:
+
+    stats = GameStats(suit_up=True)
+    run_seed_range(0, 1_000_000, suit_up=True, stats=stats)
+    stats.summary()["rounds_p99"]
+
+War chain depths come from ``GameMetrics`` (see ``add_metrics``), so they
+only count games that were played with metrics, not ones taken from an
+outcome cache.
+"""
+
+import math
+from typing import Dict, Optional
+
+from helper_functions import CYCLE, DRAW, ROUND_LIMIT
+
+
+class RunningMoments:
+    """Count, mean, variance, minimum and maximum by Welford's algorithm"""
+
+    __slots__ = ("count", "mean", "_m2", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared differences from the mean
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value: float):
+        """Add one value"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other: "RunningMoments"):
+        """Add the values summarized by other (Chan et al.'s parallel update)"""
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self._m2 = other.count, other.mean, other._m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance, 0 for fewer than two values"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        """Sample standard deviation"""
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """
+    Quantiles of positive values to within relative_accuracy, DDSketch
+    style: values are counted in logarithmic buckets, so merging two
+    sketches only adds bucket counts. Past max_buckets the lowest buckets
+    are folded together, which only costs accuracy at the low end.
+    """
+
+    __slots__ = ("relative_accuracy", "max_buckets", "_gamma", "buckets", "count")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.buckets: Dict[int, int] = {}  # Bucket index -> values in it
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        """Add value count times, values below 1 share the lowest bucket"""
+        index = math.ceil(math.log(value, self._gamma)) if value > 1 else 0
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "QuantileSketch"):
+        """Add the values counted by other, a sketch of the same accuracy"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches of the same accuracy can be merged")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Value at fraction (0 to 1) of the way through the values, None if empty"""
+        if not self.count:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                break
+        if index == 0:
+            return 1.0
+        # Midpoint of the bucket (gamma^(i-1), gamma^i], within the accuracy of both ends
+        return 2 * self._gamma**index / (self._gamma + 1)
+
+    def _collapse(self):
+        indexes = sorted(self.buckets)
+        excess = len(indexes) - self.max_buckets
+        folded = sum(self.buckets.pop(index) for index in indexes[:excess])
+        lowest = indexes[excess]
+        self.buckets[lowest] += folded
+
+
+class Histogram:
+    """Counts in bucket_count buckets of bucket_width, plus one for larger values"""
+
+    __slots__ = ("bucket_width", "counts")
+
+    def __init__(self, bucket_width: int = 50, bucket_count: int = 200):
+        self.bucket_width = bucket_width
+        self.counts = [0] * (bucket_count + 1)
+
+    def add(self, value: int):
+        """Count a value, values of bucket_width * bucket_count and up overflow"""
+        self.counts[min(value // self.bucket_width, len(self.counts) - 1)] += 1
+
+    def merge(self, other: "Histogram"):
+        """Add the counts of other, a histogram with the same buckets"""
+        if (other.bucket_width, len(other.counts)) != (
+            self.bucket_width,
+            len(self.counts),
+        ):
+            raise ValueError("Only histograms with the same buckets can be merged")
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+
+    def as_dict(self) -> dict:
+        """Non-empty buckets by their lower bound, the overflow as "<bound>+" """
+        last = len(self.counts) - 1
+        return {
+            (
+                f"{index * self.bucket_width}+"
+                if index == last
+                else index * self.bucket_width
+            ): count
+            for index, count in enumerate(self.counts)
+            if count
+        }
+
+
+class GameStats:
+    """Outcome rates, round count distribution and war chains of one rule set's games"""
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(
+        self,
+        suit_up: bool = False,
+        battle_advantage: bool = False,
+        relative_accuracy: float = 0.01,
+        bucket_width: int = 50,
+        bucket_count: int = 200,
+    ):
+        self.suit_up = suit_up
+        self.battle_advantage = battle_advantage
+        self.outcomes: Dict[int, int] = {}  # GameResult.winner -> games
+        self.rounds = RunningMoments()
+        self.round_quantiles = QuantileSketch(relative_accuracy)
+        self.round_histogram = Histogram(bucket_width, bucket_count)
+        self.cycle_lengths = QuantileSketch(relative_accuracy)
+        self.war_chains: Dict[int, int] = {}  # Wars in a row -> rounds
+
+    @property
+    def games(self) -> int:
+        return self.rounds.count
+
+    def add(self, winner: int, rounds: int, cycle_length: int = 0):
+        """Add one finished game, cycle_length being the period of a cycled game"""
+        self.outcomes[winner] = self.outcomes.get(winner, 0) + 1
+        self.rounds.add(rounds)
+        self.round_quantiles.add(rounds)
+        self.round_histogram.add(rounds)
+        if cycle_length:
+            self.cycle_lengths.add(cycle_length)
+
+    def add_result(self, result):
+        """Add a simulation.GameResult"""
+        self.add(result.winner, result.rounds, result.cycle_length)
+
+    def add_metrics(self, metrics):
+        """Add the war chain depths counted by a helper_functions.GameMetrics"""
+        for depth, rounds in metrics.war_chains.items():
+            self.war_chains[depth] = self.war_chains.get(depth, 0) + rounds
+
+    def merge(self, other: "GameStats"):
+        """Add the games of other, e.g. another shard of the same rule set"""
+        if (other.suit_up, other.battle_advantage) != (
+            self.suit_up,
+            self.battle_advantage,
+        ):
+            raise ValueError("Only stats of the same house rules can be merged")
+        for winner, games in other.outcomes.items():
+            self.outcomes[winner] = self.outcomes.get(winner, 0) + games
+        self.rounds.merge(other.rounds)
+        self.round_quantiles.merge(other.round_quantiles)
+        self.round_histogram.merge(other.round_histogram)
+        self.cycle_lengths.merge(other.cycle_lengths)
+        for depth, rounds in other.war_chains.items():
+            self.war_chains[depth] = self.war_chains.get(depth, 0) + rounds
+
+    def rate(self, winner: int) -> float:
+        """Fraction of the games that ended with winner (1, 2, or a simulation code)"""
+        return self.outcomes.get(winner, 0) / self.games if self.games else 0.0
+
+    def summary(self) -> dict:
+        """Rates, round count and cycle length percentiles, histogram and war chains"""
+        summary = {
+            "suit_up": self.suit_up,
+            "battle_advantage": self.battle_advantage,
+            "games": self.games,
+            "player1_win_rate": self.rate(1),
+            "player2_win_rate": self.rate(2),
+            "draw_rate": self.rate(DRAW),
+            "cycle_rate": self.rate(CYCLE),
+            "round_limit_rate": self.rate(ROUND_LIMIT),
+            "rounds_mean": self.rounds.mean,
+            "rounds_stdev": self.rounds.stdev,
+            "rounds_min": self.rounds.minimum,
+            "rounds_max": self.rounds.maximum,
+        }
+        for fraction in self.QUANTILES:
+            percent = round(fraction * 100)
+            summary[f"rounds_p{percent}"] = self.round_quantiles.quantile(fraction)
+            summary[f"cycle_length_p{percent}"] = self.cycle_lengths.quantile(fraction)
+        summary["rounds_histogram"] = self.round_histogram.as_dict()
+        summary["war_chains"] = dict(sorted(self.war_chains.items()))
+        return summary
@@ -0,0 +1,322 @@
+"""
+Compact binary traces of War games, and a renderer back to the text log.
+
+A trace file starts with ``MAGIC`` and a version byte, followed by any number
+of games back-to-back. Each game is:
+
+- a flags byte (house rules, whether a seed follows and how the start is
+  stored), the seed as a varint if there is one, then for a freshly dealt
+  game its deal ID (see ``helper_functions.rank_deal``) as a varint, and
+  for any other starting position the four piles (player 1 hand and
+  discard, player 2 hand and discard), each a length byte followed by
+  card codes
+- the event stream, one byte per event:
+    - 0-51: a card drawn, alternating player 1 then player 2 within each draw
+    - OUTCOME_BASE + comparison: the comparison ending a draw (win, war, suit up)
+    - BATTLE_BASE + n: a battle with advantage, followed by its n extra cards
+- END_GAME, the winner + 2 as a byte, the final round number as a varint and,
+  for cycles, the cycle start and length as varints
+
+A plain round is three bytes. Everything else in the text log (pile sizes,
+round numbers, battle messages) is rebuilt by ``render_trace`` while reading.
+Traces are written one whole game at a time, so files can be concatenated
+(after their first header) to merge them.
+"""
+
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from helper_functions import (
+    CYCLE,
+    KING_RANK,
+    ROUND_LIMIT,
+    Card,
+    GameState,
+    unrank_deal,
+)
+
+MAGIC = b"WART"
+VERSION = 2  # Version 1 traces, without deal IDs, are still read
+
+DECK_SIZE = 52
+OUTCOME_BASE = 52
+BATTLE_BASE = OUTCOME_BASE + 4
+END_GAME = BATTLE_BASE + 4
+
+SUIT_UP_FLAG = 1
+BATTLE_ADVANTAGE_FLAG = 2
+SEED_FLAG = 4
+DEAL_ID_FLAG = 8
+
+
+def _varint(value: int) -> bytes:
+    """Unsigned LEB128 encoding of value"""
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(data: Iterator[int]) -> int:
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value
+        shift += 7
+    raise ValueError("Trace ended inside a number")
+
+
+def _read_byte(data: Iterator[int]) -> int:
+    byte = next(data, None)
+    if byte is None:
+        raise ValueError("Trace ended inside a game")
+    return byte
+
+
+class TraceWriter:
+    """
+    Records games played by ``simulation.play_game`` into a binary trace file.
+    Events are buffered per game and written out when the game ends.
+    """
+
+    def __init__(self, file: BinaryIO, write_header: bool = True):
+        self.file = file
+        self._events = bytearray()
+        if write_header:
+            file.write(MAGIC + bytes([VERSION]))
+
+    def begin_game(
+        self,
+        game_state: GameState,
+        suit_up: bool = False,
+        battle_advantage: bool = False,
+        seed: Optional[int] = None,
+    ):
+        """Start a game, recording the rules, seed and deal or starting piles"""
+        deal_id = game_state.deal_id()
+        flags = (
+            SUIT_UP_FLAG * suit_up
+            | BATTLE_ADVANTAGE_FLAG * battle_advantage
+            | SEED_FLAG * (seed is not None)
+            | DEAL_ID_FLAG * (deal_id is not None)
+        )
+        events = self._events
+        events.append(flags)
+        if seed is not None:
+            events += _varint(seed)
+        if deal_id is not None:
+            events += _varint(deal_id)
+            return
+        for pile in game_state.position():
+            events.append(len(pile))
+            events += bytes(pile)
+
+    def record_draw(self, player_1_played_cards, player_2_played_cards, start: int):
+        """Record the cards drawn since index start of the played card lists"""
+        events = self._events
+        for index in range(start, len(player_1_played_cards)):
+            events.append(player_1_played_cards[index])
+            if index < len(player_2_played_cards):
+                events.append(player_2_played_cards[index])
+
+    def record_outcome(self, comparison: int):
+        """Record a comparison other than a battle with advantage"""
+        self._events.append(OUTCOME_BASE + comparison)
+
+    def record_battle(self, cards):
+        """Record a battle with advantage and the extra cards drawn for it"""
+        self._events.append(BATTLE_BASE + len(cards))
+        self._events += bytes(cards)
+
+    def end_game(
+        self, winner: int, rounds: int, cycle_start: int = 0, cycle_length: int = 0
+    ):
+        """Finish the game and write it out"""
+        events = self._events
+        events.append(END_GAME)
+        events.append(winner + 2)
+        events += _varint(rounds)
+        if winner == CYCLE:
+            events += _varint(cycle_start) + _varint(cycle_length)
+        self.file.write(events)
+        events.clear()
+
+
+def concatenate_traces(paths: Iterable[str], output: BinaryIO):
+    """Append the games of every trace file in paths, in order, to output"""
+    for path in paths:
+        with open(path, "rb") as part:
+            _read_header(part)
+            while chunk := part.read(1 << 20):
+                output.write(chunk)
+
+
+def _read_header(file: BinaryIO):
+    header = file.read(len(MAGIC) + 1)
+    if header[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a War game trace")
+    if header[-1] not in (1, VERSION):
+        raise ValueError(f"Unsupported trace version {header[-1]}")
+
+
+def _iter_bytes(file: BinaryIO, chunk_size: int = 1 << 16) -> Iterator[int]:
+    while chunk := file.read(chunk_size):
+        yield from chunk
+
+
+def render_trace(file: BinaryIO) -> Iterator[str]:
+    """
+    Stream the log lines ``war_game.play_war`` writes at "rounds" verbosity
+    for every game in a trace, one game after another
+    """
+    _read_header(file)
+    data = _iter_bytes(file)
+    for flags in data:
+        yield from _render_game(flags, data)
+
+
+def _render_game(flags: int, data: Iterator[int]) -> Iterator[str]:
+    if flags & SEED_FLAG:
+        _read_varint(data)
+    if flags & DEAL_ID_FLAG:
+        deck = unrank_deal(_read_varint(data))
+        piles = [deck[0::2], (), deck[1::2], ()]
+    else:
+        piles = []
+        for _ in range(4):
+            size = _read_byte(data)
+            piles.append(bytes(islice(data, size)))
+    hand = [len(piles[0]), len(piles[2])]
+    discard = [len(piles[1]), len(piles[3])]
+
+    def draw(player):
+        # Same as Player.draw_card, an empty hand picks up the discard pile
+        if not hand[player]:
+            hand[player], discard[player] = discard[player], 0
+        hand[player] -= 1
+
+    round_number, header_pending = 1, True
+    played = ([], [])
+    next_player = 0
+
+    for byte in data:
+        if header_pending and byte != END_GAME:
+            yield f"---- Round {round_number} ----"
+            header_pending = False
+
+        if byte < DECK_SIZE:
+            draw(next_player)
+            played[next_player].append(Card.from_code(byte))
+            next_player ^= 1
+            continue
+        if byte == END_GAME:
+            yield from _render_end(data, round_number, header_pending)
+            return
+
+        next_player = 0
+        comparison = 4 if byte >= BATTLE_BASE else byte - OUTCOME_BASE
+        for player, label in enumerate(("P1", "P2")):
+            yield "%s: H:%-2d | D:%-2d | %s%s" % (
+                label,
+                hand[player],
+                discard[player],
+                played[player],
+                "*" if comparison == player + 1 else " ",
+            )
+
+        if comparison == 0:
+            yield "War!"
+            continue
+        if comparison == 3:
+            yield "Suit Up!"
+            continue
+
+        extra_cards = []
+        if comparison == 4:
+            yield "Battle with Advantage Triggered!"
+            extra_cards = [
+                Card.from_code(_read_byte(data)) for _ in range(byte - BATTLE_BASE)
+            ]
+            king = 0 if played[0][-1] >> 2 == KING_RANK else 1
+            for player in (1 - king, king, king)[: len(extra_cards)]:
+                draw(player)
+            king_wins = yield from _render_battle(extra_cards)
+            winner = king if king_wins else 1 - king
+        else:
+            winner = comparison - 1
+
+        discard[winner] += len(played[0]) + len(played[1]) + len(extra_cards)
+        played[0].clear()
+        played[1].clear()
+        round_number += 1
+        header_pending = True
+
+    raise ValueError("Trace ended inside a game")
+
+
+def _render_battle(extra_cards) -> Iterator[str]:
+    """Lines logged by GameState.battle_with_advantage, returns True if the King won"""
+    yield "Battle with Advantage!"
+    if len(extra_cards) < 2:
+        return not extra_cards  # Queen or King had no cards left
+
+    queen_second, king_second = extra_cards[:2]
+    yield f"Queen's second card: {queen_second}, King's second card: {king_second}"
+    if king_second >> 2 > queen_second >> 2:
+        yield "King's card is higher - King wins all 4 cards!"
+        return True
+    if len(extra_cards) < 3:
+        return False  # King had no third card
+
+    king_third = extra_cards[2]
+    yield f"King's third card: {king_third}"
+    if king_third >> 2 > queen_second >> 2:
+        yield "King's third card is higher - King wins all 5 cards!"
+        return True
+    yield "King's third card is still lower - Queen wins all 5 cards!"
+    return False
+
+
+def _render_end(
+    data: Iterator[int], round_number: int, header_pending: bool
+) -> Iterator[str]:
+    winner = _read_byte(data) - 2
+    rounds = _read_varint(data)
+    if header_pending and rounds == round_number:
+        # The game ended before any card of this round was drawn
+        yield f"---- Round {round_number} ----"
+
+    if winner in (1, 2):
+        yield f"Player {winner} Wins in {rounds} rounds!"
+    elif winner == CYCLE:
+        cycle_start = _read_varint(data)
+        cycle_length = _read_varint(data)
+        yield (
+            f"Cycle detected in round {rounds}: the game repeats every "
+            f"{cycle_length} rounds from round {cycle_start}"
+        )
+    elif winner == ROUND_LIMIT:
+        yield f"Stopped after {rounds} rounds without a winner"
+    else:
+        yield "Draw!"
+
+
+def main(argv=None):
+    """Print a trace file as text"""
+    # Only the command line needs these, keep them out of every engine import
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Render a binary game trace as text")
+    parser.add_argument("trace", help="Trace file written with --trace")
+    args = parser.parse_args(argv)
+    with open(args.trace, "rb") as trace_file:
+        for line in render_trace(trace_file):
+            sys.stdout.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
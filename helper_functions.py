@@ -1,12 +1,20 @@
+import copy
+import math
+import os
 import random
 import logging
-from dataclasses import dataclass
 from enum import Enum
 from collections import deque
-from typing import List, Optional
+from itertools import islice
+from typing import Callable, Iterable, List, Optional, Sequence
 
 logger = logging.getLogger()
 
+# GameResult.winner values besides the player numbers 1 and 2
+DRAW = 0
+CYCLE = -1  # The game returned to an earlier position and would never end
+ROUND_LIMIT = -2  # Stopped after max_rounds without a winner or a detected cycle
+
 
 class Suit(Enum):
     CLUBS = "c"
@@ -15,55 +23,386 @@ class Suit(Enum):
     SPADES = "s"
 
 
-@dataclass
-class Card:
-    value: int  # 2-14, where 14 = Ace (high)
-    suit: Suit
+# Cards are encoded as small ints, (value - 2) * 4 + suit_index, so that
+# card >> 2 is the rank (0 = two ... 12 = ace) and card & 3 the suit index
+SUITS = tuple(Suit)
+_SUIT_INDEX = {suit: index for index, suit in enumerate(SUITS)}
+_FACE_NAMES = {11: "J", 12: "Q", 13: "K", 14: "A"}  # Ace represented as A
+QUEEN_RANK = 12 - 2
+KING_RANK = 13 - 2
+
+
+def encode_card(value: int, suit: Suit) -> int:
+    """Compact integer code for a card, value 2-14 where 14 = Ace"""
+    if not 2 <= value <= 14:
+        raise ValueError(f"Card value must be between 2 and 14, got {value}")
+    return (value - 2) * 4 + _SUIT_INDEX[suit]
+
+
+class Card(int):
+    """
+    A card is its compact integer code. Only 52 instances ever exist:
+    Card(value, suit) returns the shared flyweight for that card, so dealing
+    allocates nothing and cards work anywhere a plain card code is expected.
+    The Card type only adds display on top: cards compare and hash as their
+    codes, so two cards are only equal if their suits match too. Compare
+    ranks with ``rank`` or the comparison tables.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, value: int, suit: Suit):
+        return _CARDS[encode_card(value, suit)]
+
+    @classmethod
+    def from_code(cls, code: int) -> "Card":
+        """Interned Card for an integer card code"""
+        return _CARDS[code]
+
+    @property
+    def value(self) -> int:
+        """2-14, where 14 = Ace (high)"""
+        return (self >> 2) + 2
+
+    @property
+    def rank(self) -> int:
+        """0-12, the value less 2, as compared in play"""
+        return self >> 2
+
+    @property
+    def suit(self) -> Suit:
+        return SUITS[self & 3]
 
     def __str__(self):
         """String representation for display/logging compatibility"""
-        if self.value == 11:
-            value_str = "J"
-        elif self.value == 12:
-            value_str = "Q"
-        elif self.value == 13:
-            value_str = "K"
-        elif self.value == 14:
-            value_str = "A"  # Ace represented as A in original format
-        else:
-            value_str = str(self.value)
-        return f"{value_str}{self.suit.value}"
+        return _CARD_NAMES[self]
 
     def __repr__(self):
         """Use string representation for lists/debugging to maintain clean output"""
-        return self.__str__()
+        return _CARD_NAMES[self]
 
-    def __lt__(self, other):
-        """Enable direct comparison between cards"""
-        return self.value < other.value
+    def __bool__(self):
+        """Every card is truthy, including the 2 of clubs encoded as 0"""
+        return True
 
-    def __eq__(self, other):
-        """Cards are equal if they have the same value (suit doesn't matter for War)"""
-        return self.value == other.value
+    def __reduce__(self):
+        return (Card.from_code, (int(self),))
 
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+_CARDS = tuple(int.__new__(Card, code) for code in range(52))
+_CARD_NAMES = tuple(
+    f"{_FACE_NAMES.get((code >> 2) + 2, str((code >> 2) + 2))}{SUITS[code & 3].value}"
+    for code in range(52)
+)
+
+# Standard 52 card deck in the order it is built before shuffling
+ORDERED_DECK = tuple(Card(value, suit) for suit in Suit for value in range(2, 15))
+
+
+def _is_king_vs_queen(card_1: int, card_2: int) -> bool:
+    """Check if one card is King and the other is Queen"""
+    ranks = (card_1 >> 2, card_2 >> 2)
+    return ranks == (KING_RANK, QUEEN_RANK) or ranks == (QUEEN_RANK, KING_RANK)
+
+
+def _compare_card_codes(
+    card_1: int, card_2: int, suit_up_active: bool, battle_advantage_active: bool
+) -> int:
+    """Rule chain behind the comparison tables, see GameState.compare_cards"""
+    rank_1 = card_1 >> 2
+    rank_2 = card_2 >> 2
+    if rank_1 == rank_2:
+        return 0
+    elif battle_advantage_active and _is_king_vs_queen(card_1, card_2):
+        return 4
+    elif suit_up_active and (card_1 & 3 == card_2 & 3):
+        return 3
+    elif rank_1 > rank_2:
+        return 1
+    elif rank_1 < rank_2:
+        return 2
+
+    raise Exception(f"Comparison detected something unexpected: {card_1} vs. {card_2}")
+
+
+def _rule_index(suit_up_active: bool, battle_advantage_active: bool) -> int:
+    return (2 if battle_advantage_active else 0) + (1 if suit_up_active else 0)
 
-class Player:
-    """Represents a player in the War game"""
 
-    def __init__(self, name: str, cards: Optional[List[Card]] = None):
+# Outcome of every (card_1, card_2) pair, flattened as card_1 * 52 + card_2,
+# with one table per combination of house rules, see comparison_table
+COMPARISON_TABLES = tuple(
+    bytes(
+        _compare_card_codes(card_1, card_2, bool(rules & 1), bool(rules & 2))
+        for card_1 in range(52)
+        for card_2 in range(52)
+    )
+    for rules in range(4)
+)
+
+
+def comparison_table(
+    suit_up_active: bool = False, battle_advantage_active: bool = False
+) -> bytes:
+    """
+    Precomputed compare_cards outcomes for one rule set.
+    table[card_1 * 52 + card_2] is the outcome for that pair of card codes.
+    """
+    return COMPARISON_TABLES[_rule_index(suit_up_active, battle_advantage_active)]
+
+
+# (suit_up, battle_advantage) of every rule set, the plain game first
+RULE_SETS = ((False, False), (True, False), (False, True), (True, True))
+
+
+def rules_name(suit_up: bool = False, battle_advantage: bool = False) -> str:
+    """Short name of a rule set, e.g. suit-up+battle-advantage, or plain"""
+    names = [
+        name
+        for name, active in (
+            ("suit-up", suit_up),
+            ("battle-advantage", battle_advantage),
+        )
+        if active
+    ]
+    return "+".join(names) or "plain"
+
+
+# Deal IDs number every ordering of the deck, 0 is the deck in card code order
+DEAL_COUNT = math.factorial(52)
+# Bytes of a deal ID as a fixed-width key, 29 for its 226 bits
+DEAL_ID_BYTES = ((DEAL_COUNT - 1).bit_length() + 7) // 8
+
+SNAPSHOT_VERSION = 1
+
+
+def rank_deal(deck: Sequence[int]) -> int:
+    """
+    Deal ID of a deck: its Lehmer code, the number of orderings of the 52
+    card codes that sort before it. Fits in 226 bits.
+    """
+    if sorted(map(int, deck)) != list(range(52)):
+        raise ValueError("A deal must hold each of the 52 cards once")
+    deal_id = 0
+    used = 0
+    for position, card in enumerate(deck):
+        # Cards still to come that sort before this one
+        smaller = card - (used & ((1 << card) - 1)).bit_count()
+        deal_id = deal_id * (52 - position) + smaller
+        used |= 1 << card
+    return deal_id
+
+
+def unrank_deal(deal_id: int) -> List[Card]:
+    """The deck with the given deal ID, the inverse of rank_deal"""
+    if not 0 <= deal_id < DEAL_COUNT:
+        raise ValueError(f"Deal IDs run from 0 to 52! - 1, got {deal_id}")
+    digits = []
+    for radix in range(1, 53):
+        deal_id, digit = divmod(deal_id, radix)
+        digits.append(digit)
+    remaining = list(range(52))
+    return [_CARDS[remaining.pop(digit)] for digit in reversed(digits)]
+
+
+def canonical_deal(cards: Iterable[int], suit_up: bool = False) -> List[Card]:
+    """
+    Representative of every deal that plays out exactly like cards.
+    Without suit up only card values matter, so the nth card of each value
+    gets the nth suit (24**13 deals share a representative). With suit up
+    only which cards share a suit matters, so suits are renamed in the order
+    they first appear (24 deals share one). A representative is its own.
+    """
+    if suit_up:
+        renamed = {}
+        return [
+            _CARDS[card & ~3 | renamed.setdefault(card & 3, len(renamed))]
+            for card in cards
+        ]
+    seen = [0] * 13
+    canonical = []
+    for card in cards:
+        rank = card >> 2
+        canonical.append(_CARDS[rank * 4 + seen[rank]])
+        seen[rank] += 1
+    return canonical
+
+
+def is_canonical_deal(cards: Iterable[int], suit_up: bool = False) -> bool:
+    """True if cards is the representative canonical_deal picks, see there"""
+    # Compare codes, Card equality ignores suits
+    codes = list(map(int, cards))
+    return codes == list(map(int, canonical_deal(codes, suit_up)))
+
+
+class GameMetrics:
+    """
+    Counters for the mechanics that make up the cost of a round.
+    Attach one to a game with GameState.enable_metrics, games without one skip
+    all counting. One instance can be shared by many games to total them.
+    """
+
+    __slots__ = (
+        "games",
+        "rounds",
+        "draws",
+        "refills",
+        "refill_cards",
+        "wars",
+        "suit_ups",
+        "battles",
+        "empty_hand_endings",
+        "war_chains",
+        "_round_wars",
+    )
+
+    # Exported counters, with the help text used for Prometheus output
+    COUNTERS = {
+        "games": "Games finished",
+        "rounds": "Rounds played",
+        "draws": "Cards drawn from a hand",
+        "refills": "Times a discard pile was picked up into an empty hand",
+        "refill_cards": "Cards moved from discard piles into hands",
+        "wars": "Wars, including each war of a chain",
+        "suit_ups": "Suit ups",
+        "battles": "Battles with advantage",
+        "empty_hand_endings": "Games ended by a player unable to draw mid-round",
+    }
+
+    def __init__(self):
+        self.games = 0
+        self.rounds = 0
+        self.draws = 0
+        self.refills = 0
+        self.refill_cards = 0
+        self.wars = 0
+        self.suit_ups = 0
+        self.battles = 0
+        self.empty_hand_endings = 0
+        self.war_chains = {}  # Wars in a row within one round -> rounds
+        self._round_wars = 0
+
+    def record_war(self):
+        """Count a war, chained wars in the same round add to its chain depth"""
+        self.wars += 1
+        self._round_wars += 1
+
+    def end_round(self):
+        """Count a finished round and the depth of its war chain"""
+        self.rounds += 1
+        if self._round_wars:
+            depth = self._round_wars
+            self.war_chains[depth] = self.war_chains.get(depth, 0) + 1
+            self._round_wars = 0
+
+    def end_game(self, empty_hand: bool = False):
+        """Count a finished game, empty_hand if a player couldn't draw mid-round"""
+        self.games += 1
+        if empty_hand:
+            self.empty_hand_endings += 1
+
+    def merge(self, other: "GameMetrics"):
+        """Add another set of counters, e.g. from a different worker, into this one"""
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for depth, rounds in other.war_chains.items():
+            self.war_chains[depth] = self.war_chains.get(depth, 0) + rounds
+
+    def as_dict(self) -> dict:
+        """All counters, with war chain depths in increasing order"""
+        counters = {name: getattr(self, name) for name in self.COUNTERS}
+        counters["war_chains"] = dict(sorted(self.war_chains.items()))
+        return counters
+
+    def to_prometheus(self, prefix: str = "war", labels: Optional[dict] = None) -> str:
+        """Counters in the Prometheus text exposition format"""
+
+        def sample(name, value, extra=None):
+            all_labels = {**(labels or {}), **(extra or {})}
+            label_text = ",".join(f'{key}="{val}"' for key, val in all_labels.items())
+            if label_text:
+                label_text = "{" + label_text + "}"
+            return f"{prefix}_{name}_total{label_text} {value}"
+
+        lines = []
+        for name, help_text in self.COUNTERS.items():
+            lines.append(f"# HELP {prefix}_{name}_total {help_text}")
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(sample(name, getattr(self, name)))
+        lines.append(f"# HELP {prefix}_war_chains_total Rounds by wars in a row")
+        lines.append(f"# TYPE {prefix}_war_chains_total counter")
+        for depth, rounds in sorted(self.war_chains.items()):
+            lines.append(sample("war_chains", rounds, {"depth": depth}))
+        return "\n".join(lines) + "\n"
+
+
+def _snapshot_piles(snapshot: bytes, start: int) -> tuple:
+    """
+    The hand and discard deques of the player snapshot at start in snapshot,
+    and the offset just past it
+    """
+    try:
+        hand_end = start + 1 + snapshot[start]
+        end = hand_end + 1 + snapshot[hand_end]
+        if end > len(snapshot):
+            raise IndexError
+        return (
+            deque(map(_CARDS.__getitem__, snapshot[start + 1 : hand_end])),
+            deque(map(_CARDS.__getitem__, snapshot[hand_end + 1 : end])),
+            end,
+        )
+    except IndexError:
+        raise ValueError("Snapshot piles are cut short or hold unknown cards")
+
+
+class Player:
+    """
+    Represents a player in the War game.
+    Piles hold integer card codes, normally the shared Card instances.
+    The hand is bottom card first when dealt, but a hand picked up from the
+    discard pile is that same deque kept top card first, so picking up moves
+    no cards. ``hand`` always shows it bottom card first.
+    """
+
+    def __init__(self, name: str, cards: Optional[List[int]] = None):
         self.name = name
-        self.hand = deque(
+        self._hand = deque(
             cards or []
         )  # Use deque for efficient operations at both ends
+        self._hand_top_first = False
         self.discard = deque()
+        self.metrics: Optional[GameMetrics] = None  # Set by GameState.enable_metrics
+
+    @property
+    def hand(self) -> deque:
+        """
+        The hand, bottom card first, for setting up and inspecting games.
+        Turns a picked up hand around in place, so keep it out of the game loop.
+        """
+        if self._hand_top_first:
+            self._hand.reverse()
+            self._hand_top_first = False
+        return self._hand
+
+    def hand_cards(self) -> tuple:
+        """The hand bottom card first, without turning the stored hand around"""
+        if self._hand_top_first:
+            return tuple(reversed(self._hand))
+        return tuple(self._hand)
 
     def has_cards(self) -> bool:
         """Check if player has any cards available"""
-        return len(self.hand) > 0 or len(self.discard) > 0
+        return bool(self._hand or self.discard)
 
     def hand_size(self) -> int:
         """Get current hand size"""
-        return len(self.hand)
+        return len(self._hand)
 
     def discard_size(self) -> int:
         """Get current discard pile size"""
@@ -71,34 +410,74 @@ class Player:
 
     def total_cards(self) -> int:
         """Get total cards owned by player"""
-        return len(self.hand) + len(self.discard)
+        return len(self._hand) + len(self.discard)
 
-    def draw_card(self, from_bottom: bool = False) -> Optional[Card]:
+    def draw_card(self, from_bottom: bool = False) -> Optional[int]:
         """
         Draw a card from hand. If hand is empty, refill from discard pile.
         Returns None if player has no cards left (loses).
         """
         # Refill hand if empty
-        if not self.hand:
+        if not self._hand:
             if not self.discard:
                 return None  # Player loses - no cards left
+            if self.metrics is not None:
+                self.metrics.refills += 1
+                self.metrics.refill_cards += len(self.discard)
             self._refill_hand_from_discard()
 
-        # Draw from appropriate end
-        if from_bottom:
-            return self.hand.popleft()  # Bottom of hand
-        else:
-            return self.hand.pop()  # Top of hand (default)
+        if self.metrics is not None:
+            self.metrics.draws += 1
+        # Draw from appropriate end, the left end is the top once picked up
+        if from_bottom == self._hand_top_first:
+            return self._hand.pop()  # Top of hand (default), bottom of a picked up one
+        return self._hand.popleft()
 
-    def add_cards_to_discard(self, cards: List[Card]):
-        """Add cards to discard pile"""
-        self.discard.extend(cards)
+    def add_cards_to_discard(self, *card_lists: Iterable[int]):
+        """Add cards to discard pile, each list in turn, without joining them first"""
+        for cards in card_lists:
+            self.discard.extend(cards)
 
     def _refill_hand_from_discard(self):
-        """Move all cards from discard pile to hand, reversing order"""
-        # Reverse the discard pile and move to hand
-        while self.discard:
-            self.hand.append(self.discard.pop())
+        """
+        Pick up the discard pile as the hand, reversing order: the first card
+        discarded becomes the top card. The discard deque is already in that
+        order top card first, so it becomes the hand as is, and the empty hand
+        becomes the discard pile.
+        """
+        self._hand, self.discard = self.discard, self._hand
+        self._hand_top_first = True
+
+    def snapshot(self) -> bytes:
+        """
+        The hand and discard pile as bytes, each pile's length followed by its
+        card codes, hand bottom card first. Read back with restore.
+        """
+        hand = reversed(self._hand) if self._hand_top_first else self._hand
+        return bytes((len(self._hand), *hand, len(self.discard))) + bytes(self.discard)
+
+    def restore(self, snapshot: bytes):
+        """Replace the hand and discard pile with the ones in a snapshot"""
+        hand, discard, end = _snapshot_piles(snapshot, 0)
+        if end != len(snapshot):
+            raise ValueError("Not a player snapshot")
+        self._set_piles(hand, discard)
+
+    def _set_piles(self, hand: deque, discard: deque):
+        self._hand = hand
+        self._hand_top_first = False
+        self.discard = discard
+
+    def fork(self) -> "Player":
+        """
+        Independent copy of the player to play on from here. Cards are shared
+        immutable ints, so only the two deques are copied. Metrics aren't.
+        """
+        player = copy.copy(self)
+        player._hand = self._hand.copy()
+        player.discard = self.discard.copy()
+        player.metrics = None
+        return player
 
 
 class GameState:
@@ -109,47 +488,61 @@ class GameState:
         self.player2 = Player(player2_name)
         self.round_number = 1
         self.suit_up_active = False
+        self.metrics: Optional[GameMetrics] = None
+        # Where this game logs, games running side by side can each have their own
+        self.logger: logging.Logger = logger
 
-    def setup_game(self, shuffle_deck: bool = True):
-        """Initialize the game with a shuffled deck"""
-        deck = (
-            self._get_shuffled_deck() if shuffle_deck else self._create_ordered_deck()
-        )
+    def enable_metrics(self, metrics: Optional[GameMetrics] = None) -> GameMetrics:
+        """
+        Start counting this game's mechanics, into metrics if given so several
+        games can share one set of counters. Returns the counters in use.
+        """
+        if metrics is None:
+            metrics = GameMetrics()
+        self.metrics = self.player1.metrics = self.player2.metrics = metrics
+        return metrics
+
+    def setup_game(
+        self,
+        shuffle_deck: bool = True,
+        rng: Optional[random.Random] = None,
+        deal_id: Optional[int] = None,
+    ):
+        """
+        Initialize the game with a shuffled deck.
+        Pass a seeded ``random.Random`` as rng for a reproducible deal,
+        otherwise the global ``random`` module is used, which games running
+        in several threads at once should avoid.
+        Pass a deal_id (see rank_deal) to deal that exact deck instead.
+        """
+        if deal_id is not None:
+            deck = unrank_deal(deal_id)
+        elif shuffle_deck:
+            deck = self._get_shuffled_deck(rng)
+        else:
+            deck = self._create_ordered_deck()
         player1_cards, player2_cards = self._split_deck(deck)
 
         self.player1.hand.extend(player1_cards)
         self.player2.hand.extend(player2_cards)
 
-    def _get_shuffled_deck(self) -> List[Card]:
-        """Generate and shuffle a standard 52 card deck"""
-        deck = []
-        for suit in Suit:
-            for value in range(2, 15):  # 2-14, where 14 = Ace
-                deck.append(Card(value, suit))
-        random.shuffle(deck)
+    def _get_shuffled_deck(self, rng: Optional[random.Random] = None) -> List[Card]:
+        """Shuffle a standard 52 card deck of the shared Card instances"""
+        deck = list(ORDERED_DECK)
+        if rng is None:
+            random.shuffle(deck)
+        else:
+            rng.shuffle(deck)
         return deck
 
-    def _split_deck(self, deck: List[Card]):
+    def _split_deck(self, deck: List[int]):
         """Deal cards the way you would in an actual card game"""
-        player_1_hand = []
-        player_2_hand = []
-
         # Alternate dealing cards to each player
-        for i, card in enumerate(deck):
-            if i % 2 == 0:
-                player_1_hand.append(card)
-            else:
-                player_2_hand.append(card)
-
-        return player_1_hand, player_2_hand
+        return deck[0::2], deck[1::2]
 
     def _create_ordered_deck(self) -> List[Card]:
         """Create an ordered deck for testing purposes"""
-        deck = []
-        for suit in Suit:
-            for value in range(2, 15):
-                deck.append(Card(value, suit))
-        return deck
+        return list(ORDERED_DECK)
 
     def check_game_over(self) -> Optional[str]:
         """Check if game is over and return winner name, or None if game continues"""
@@ -159,15 +552,162 @@ class GameState:
             return self.player1.name
         return None
 
+    def pile_sizes(self) -> tuple:
+        """Hand and discard sizes of both players"""
+        return (
+            len(self.player1._hand),
+            len(self.player1.discard),
+            len(self.player2._hand),
+            len(self.player2.discard),
+        )
+
+    def position(self) -> tuple:
+        """
+        Both players' hands and discard piles, everything the rest of the game
+        depends on. Cards compare by code, so equal positions hold the same
+        cards down to their suits and play out identically under any rules.
+        """
+        return (
+            self.player1.hand_cards(),
+            tuple(self.player1.discard),
+            self.player2.hand_cards(),
+            tuple(self.player2.discard),
+        )
+
+    def position_key(self) -> bytes:
+        """
+        The position as bytes, each pile's length followed by its card codes.
+        Equal exactly when the positions are, and cheaper to keep and compare.
+        """
+        return _piles_key(self.position())
+
+    def deal_id(self) -> Optional[int]:
+        """
+        Deal ID (see rank_deal) of the deck setup_game deals this position
+        from, or None if it isn't a freshly dealt game
+        """
+        deck = self._dealt_deck()
+        return None if deck is None else rank_deal(deck)
+
+    def _dealt_deck(self) -> Optional[list]:
+        """The deck dealt into this position, undoing _split_deck, if it is a deal"""
+        hand1, discard1, hand2, discard2 = self.position()
+        if discard1 or discard2 or len(hand1) != 26 or len(hand2) != 26:
+            return None
+        deck = [card for pair in zip(hand1, hand2) for card in pair]
+        if len(set(deck)) != 52:
+            return None
+        return deck
+
+    def deal_key(self, canonical: bool = False, suit_up: bool = False) -> bytes:
+        """
+        Key of the deal this game starts from, taken before the first round:
+        its deal ID as DEAL_ID_BYTES big-endian bytes. With canonical, the ID
+        of canonical_deal for the suit_up rule, so every deal that plays out
+        the same way has the same key. Positions that aren't a fresh deal are
+        keyed by their piles, each pile's length followed by its card codes.
+        """
+        deck = self._dealt_deck()
+        if deck is None:
+            if not canonical:
+                return self.position_key()
+            piles = self.position()
+            cards = iter(
+                canonical_deal([card for pile in piles for card in pile], suit_up)
+            )
+            return _piles_key([list(islice(cards, len(pile))) for pile in piles])
+        if canonical:
+            deck = canonical_deal(deck, suit_up)
+        return rank_deal(deck).to_bytes(DEAL_ID_BYTES, "big")
+
+    @classmethod
+    def from_position(cls, position: tuple) -> "GameState":
+        """New game state with the piles from ``position``"""
+        game_state = cls()
+        hand1, discard1, hand2, discard2 = position
+        game_state.player1.hand.extend(hand1)
+        game_state.player1.discard.extend(discard1)
+        game_state.player2.hand.extend(hand2)
+        game_state.player2.discard.extend(discard2)
+        return game_state
+
+    def snapshot(self) -> bytes:
+        """
+        Everything needed to carry on with this game, as bytes: the version,
+        the round number, the suit up flag, then both players' snapshots.
+        62 bytes for any position. Take it between rounds, once round_number
+        is the next round to play, as play_game leaves a game it stopped.
+        """
+        return (
+            bytes((SNAPSHOT_VERSION,))
+            + self.round_number.to_bytes(4, "little")
+            + bytes((self.suit_up_active,))
+            + self.player1.snapshot()
+            + self.player2.snapshot()
+        )
+
+    def restore(self, snapshot: bytes):
+        """
+        Go back to the position of a snapshot, keeping the player names and
+        metrics of this game
+        """
+        if len(snapshot) < 6 or snapshot[0] != SNAPSHOT_VERSION:
+            raise ValueError("Not a game state snapshot")
+        hand1, discard1, player2_start = _snapshot_piles(snapshot, 6)
+        hand2, discard2, end = _snapshot_piles(snapshot, player2_start)
+        if end != len(snapshot):
+            raise ValueError("Not a game state snapshot")
+        self.player1._set_piles(hand1, discard1)
+        self.player2._set_piles(hand2, discard2)
+        self.round_number = int.from_bytes(snapshot[1:5], "little")
+        self.suit_up_active = bool(snapshot[5])
+
+    @classmethod
+    def from_snapshot(cls, snapshot: bytes) -> "GameState":
+        """New game state at the position of a snapshot"""
+        game_state = cls()
+        game_state.restore(snapshot)
+        return game_state
+
+    def fork(self) -> "GameState":
+        """
+        Independent copy of the game to branch from this position, e.g. to
+        play it on under other house rules. Metrics aren't carried over.
+        """
+        game_state = copy.copy(self)
+        game_state.player1 = self.player1.fork()
+        game_state.player2 = self.player2.fork()
+        game_state.metrics = None
+        return game_state
+
+    def save_checkpoint(self, path: str):
+        """
+        Write a snapshot to path, replacing the file in one step so an
+        interrupted save leaves the previous checkpoint intact
+        """
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as checkpoint:
+            checkpoint.write(self.snapshot())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load_checkpoint(cls, path: str) -> "GameState":
+        """Game state saved by save_checkpoint, ready to play on"""
+        with open(path, "rb") as checkpoint:
+            return cls.from_snapshot(checkpoint.read())
+
     def get_game_status(self) -> dict:
-        """Get current game status for logging/display"""
-        return {
+        """Get current game status for logging/display, with metrics if enabled"""
+        status = {
             "round": self.round_number,
             "player1_hand": self.player1.hand_size(),
             "player1_discard": self.player1.discard_size(),
             "player2_hand": self.player2.hand_size(),
             "player2_discard": self.player2.discard_size(),
         }
+        if self.metrics is not None:
+            status["metrics"] = self.metrics.as_dict()
+        return status
 
     def increment_round(self):
         """Increment the round counter"""
@@ -175,8 +715,8 @@ class GameState:
 
     def compare_cards(
         self,
-        card_1: Card,
-        card_2: Card,
+        card_1: int,
+        card_2: int,
         suit_up_active: bool = False,
         battle_advantage_active: bool = False,
     ) -> int:
@@ -188,98 +728,162 @@ class GameState:
             3 if cards are the same suit, and playing 'suit_up'
             4 if King vs Queen battle with advantage is triggered
         """
-        if card_1.value == card_2.value:
-            return 0
-        elif battle_advantage_active and self._is_king_vs_queen(card_1, card_2):
-            return 4
-        elif suit_up_active and (card_1.suit == card_2.suit):
-            return 3
-        elif card_1.value > card_2.value:
-            return 1
-        elif card_1.value < card_2.value:
-            return 2
-
-        raise Exception(
-            f"Comparison detected something unexpected: {card_1} vs. {card_2}"
-        )
+        table = COMPARISON_TABLES[_rule_index(suit_up_active, battle_advantage_active)]
+        return table[card_1 * 52 + card_2]
 
-    def _is_king_vs_queen(self, card_1: Card, card_2: Card) -> bool:
+    def _is_king_vs_queen(self, card_1: int, card_2: int) -> bool:
         """Check if one card is King and the other is Queen"""
-        values = {card_1.value, card_2.value}
-        return values == {13, 12}  # King=13, Queen=12
+        return _is_king_vs_queen(card_1, card_2)
 
     def battle_with_advantage(
         self,
-        queen_card: Card,
-        king_card: Card,
+        queen_card: int,
+        king_card: int,
         queen_player: Player,
         king_player: Player,
+        verbose: bool = True,
+        from_bottom: bool = False,
     ) -> tuple:
         """
         Handle battle with advantage when King vs Queen is played.
         Returns (winner_number, all_cards_played)
         winner_number: 1 if queen_player wins, 2 if king_player wins
+        Set verbose=False to skip logging the battle, e.g. for headless simulation.
+        from_bottom draws the battle's cards from the bottom of the hands,
+        for battles during a suit up.
         """
         all_cards = [queen_card, king_card]
 
-        logger.info("Battle with Advantage!")
+        if verbose:
+            self.logger.info("Battle with Advantage!")
 
         # Queen plays one card
-        queen_second = queen_player.draw_card()
+        queen_second = queen_player.draw_card(from_bottom)
         if queen_second is None:
             # Queen has no cards left, King wins by default
             return (2, all_cards)
         all_cards.append(queen_second)
 
         # King plays one card
-        king_second = king_player.draw_card()
+        king_second = king_player.draw_card(from_bottom)
         if king_second is None:
             # King has no cards left, Queen wins by default
             return (1, all_cards)
         all_cards.append(king_second)
 
-        logger.info(
-            f"Queen's second card: {queen_second}, King's second card: {king_second}"
-        )
+        if verbose:
+            self.logger.info(
+                "Queen's second card: %s, King's second card: %s",
+                queen_second,
+                king_second,
+            )
 
         # Compare second cards
-        if king_second.value > queen_second.value:
+        if king_second >> 2 > queen_second >> 2:
             # King wins all 4 cards
-            logger.info("King's card is higher - King wins all 4 cards!")
+            if verbose:
+                self.logger.info("King's card is higher - King wins all 4 cards!")
             return (2, all_cards)
         else:
             # King's card is lower, King plays a third card
-            king_third = king_player.draw_card()
+            king_third = king_player.draw_card(from_bottom)
             if king_third is None:
                 # King has no cards left, Queen wins
                 return (1, all_cards)
             all_cards.append(king_third)
 
-            logger.info(f"King's third card: {king_third}")
+            if verbose:
+                self.logger.info("King's third card: %s", king_third)
 
-            if king_third.value > queen_second.value:
+            if king_third >> 2 > queen_second >> 2:
                 # King wins all 5 cards
-                logger.info("King's third card is higher - King wins all 5 cards!")
+                if verbose:
+                    self.logger.info(
+                        "King's third card is higher - King wins all 5 cards!"
+                    )
                 return (2, all_cards)
             else:
                 # Queen wins all 5 cards
-                logger.info(
-                    "King's third card is still lower - Queen wins all 5 cards!"
-                )
+                if verbose:
+                    self.logger.info(
+                        "King's third card is still lower - Queen wins all 5 cards!"
+                    )
                 return (1, all_cards)
 
-    def check_and_refill_hand(self, hand: List[Card], discard: List[Card]) -> bool:
+    def check_and_refill_hand(self, hand: List[int], discard: List[int]) -> bool:
         """
         If hand is empty, move discard pile to hand
         return True if the player loses
         """
-        if not any(hand):  # need to refill hand or see if the game ends
-            if not any(
-                discard
+        # Card codes can be 0, so check for emptiness rather than any()
+        if not hand:  # need to refill hand or see if the game ends
+            if (
+                not discard
             ):  # out of cards, we know player 2 has cards so player 1 loses
                 return True
             else:  # pick up discard pile
                 discard.reverse()
-                while any(discard):
+                while discard:
                     hand.append(discard.pop())
         return False
+
+
+def _piles_key(piles) -> bytes:
+    """Each pile's length followed by its card codes"""
+    key = bytearray()
+    for pile in piles:
+        key.append(len(pile))
+        key += bytes(pile)
+    return bytes(key)
+
+
+class CycleDetector:
+    """
+    Detects a game returning to an earlier position using Brent's algorithm.
+    Only one saved position is kept, and pile sizes are compared first, so
+    most rounds never build a position at all.
+    """
+
+    def __init__(self, game_state: GameState):
+        self.initial_position = game_state.position()
+        self.first_round = game_state.round_number  # Later than 1 for a restored game
+        self.cycle_length = None
+        self._saved_sizes = game_state.pile_sizes()
+        self._saved_position = game_state.position_key()
+        self._power = 1
+        self._length = 0
+
+    def check(self, game_state: GameState) -> bool:
+        """Call after every completed round, returns True once a position repeats"""
+        self._length += 1
+        sizes = game_state.pile_sizes()
+        if (
+            sizes == self._saved_sizes
+            and game_state.position_key() == self._saved_position
+        ):
+            self.cycle_length = self._length
+            return True
+        if self._length == self._power:
+            self._saved_sizes = sizes
+            self._saved_position = game_state.position_key()
+            self._power *= 2
+            self._length = 0
+        return False
+
+    def find_cycle_start(self, play_round: Callable[[GameState], object]) -> int:
+        """
+        Round number whose starting position is the first to repeat, found by
+        replaying the game from its initial position. play_round must play a
+        single round of the same game, without logging.
+        """
+        tortoise = GameState.from_position(self.initial_position)
+        hare = GameState.from_position(self.initial_position)
+        for _ in range(self.cycle_length):
+            play_round(hare)
+
+        cycle_start = self.first_round
+        while tortoise.position_key() != hare.position_key():
+            play_round(tortoise)
+            play_round(hare)
+            cycle_start += 1
+        return cycle_start
@@ -0,0 +1,187 @@
+"""
+Persistent cache of game outcomes, keyed by deal and rule set.
+
+A War game is fully determined by its starting piles, the house rules and
+the round cap, so a result only needs to be simulated once. ``OutcomeCache``
+keeps results in a local SQLite file, behind an in-memory front of recently
+used results (least recently used or first in, first out eviction):
+
+    with OutcomeCache("outcomes.sqlite") as cache:
+        for result in simulation.iter_seeded_games(seeds, cache=cache):
+            ...
+
+Deals are keyed by ``GameState.deal_key``, the 29-byte deal ID of the
+deck, of its canonical deal when it comes from
+``simulation.iter_seeded_games`` so equivalent deals share an entry. New results are written in batches of
+``commit_every``, and several processes can share one file, each opening
+its own ``OutcomeCache``. Every result is stored with the
+``simulation.ENGINE_VERSION`` that played it, and results from other
+versions are treated as missing and replaced.
+"""
+
+import sqlite3
+from collections import OrderedDict
+from typing import Optional
+
+from simulation import ENGINE_VERSION, MAX_ROUNDS, GameResult
+
+EVICTION_POLICIES = ("lru", "fifo")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outcomes (
+    deal BLOB NOT NULL,
+    rules INTEGER NOT NULL,
+    max_rounds INTEGER NOT NULL,
+    winner INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    wars INTEGER NOT NULL,
+    suit_ups INTEGER NOT NULL,
+    battles INTEGER NOT NULL,
+    cycle_start INTEGER NOT NULL,
+    cycle_length INTEGER NOT NULL,
+    engine INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (deal, rules, max_rounds)
+) WITHOUT ROWID
+"""
+
+
+def _rules(suit_up: bool, battle_advantage: bool) -> int:
+    return suit_up | battle_advantage << 1
+
+
+class OutcomeCache:
+    """
+    Game results stored in the SQLite file at path (":memory:" for a cache
+    that lasts as long as the object), with up to lru_size results kept in
+    memory in front of it. eviction is one of EVICTION_POLICIES.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lru_size: int = 65536,
+        eviction: str = "lru",
+        commit_every: int = 1024,
+    ):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"eviction must be one of {EVICTION_POLICIES}")
+        self.lru_size = lru_size
+        self.eviction = eviction
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self._recent = OrderedDict()
+        self._pending = {}  # Stored since the last commit
+        # Several worker processes may write the same file
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(_SCHEMA)
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(outcomes)")
+        ]
+        if "engine" not in columns:
+            # A file from before results were versioned, its rows all miss
+            try:
+                with self._connection:
+                    self._connection.execute(
+                        "ALTER TABLE outcomes ADD COLUMN engine INTEGER NOT NULL "
+                        "DEFAULT 0"
+                    )
+            except sqlite3.OperationalError:
+                pass  # Another process sharing the file added it first
+
+    def get(
+        self,
+        deal: bytes,
+        suit_up: bool = False,
+        battle_advantage: bool = False,
+        max_rounds: int = MAX_ROUNDS,
+    ) -> Optional[GameResult]:
+        """Cached result of the deal under these rules, None if it was never stored"""
+        key = (deal, _rules(suit_up, battle_advantage), max_rounds)
+        result = self._recent.get(key)
+        if result is not None:
+            if self.eviction == "lru":
+                self._recent.move_to_end(key)
+            self.hits += 1
+            return result
+        result = self._pending.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        row = self._connection.execute(
+            "SELECT winner, rounds, wars, suit_ups, battles, cycle_start, cycle_length "
+            "FROM outcomes WHERE deal = ? AND rules = ? AND max_rounds = ? "
+            "AND engine = ?",
+            key + (ENGINE_VERSION,),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        result = GameResult(*row)
+        self._remember(key, result)
+        return result
+
+    def put(
+        self,
+        deal: bytes,
+        result: GameResult,
+        suit_up: bool = False,
+        battle_advantage: bool = False,
+        max_rounds: int = MAX_ROUNDS,
+    ):
+        """Store the result of the deal under these rules"""
+        key = (deal, _rules(suit_up, battle_advantage), max_rounds)
+        self._remember(key, result)
+        self._pending[key] = result
+        if len(self._pending) >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        """Write out the results stored since the last commit"""
+        if self._pending:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key
+                        + (
+                            result.winner,
+                            result.rounds,
+                            result.wars,
+                            result.suit_ups,
+                            result.battles,
+                            result.cycle_start,
+                            result.cycle_length,
+                            ENGINE_VERSION,
+                        )
+                        for key, result in self._pending.items()
+                    ),
+                )
+            self._pending.clear()
+
+    def close(self):
+        """Commit pending results and close the file"""
+        self.commit()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        """Results stored, including ones not committed yet"""
+        self.commit()
+        return self._connection.execute("SELECT COUNT(*) FROM outcomes").fetchone()[0]
+
+    def _remember(self, key: tuple, result: GameResult):
+        if self.lru_size <= 0:
+            return
+        self._recent[key] = result
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
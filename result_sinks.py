@@ -0,0 +1,278 @@
+"""
+Streaming per-game result files for batch runs.
+
+A sink writes one record per finished game as it is added: the seed, the
+house rules, the winner, the round count and the mechanic counts of its
+``simulation.GameResult``. Records are buffered and written out in bulk
+every ``buffer_records`` games, so memory use doesn't grow with the batch.
+
+Three formats are available in ``RESULT_SINKS``:
+
+- ``jsonl``: one JSON object per line
+- ``csv``: a header line, then one line of integers per game (rules as 0/1)
+- ``columnar``: ``MAGIC`` and a version byte, then blocks of records, each a
+  little-endian uint32 record count followed by every column of
+  ``COLUMN_TYPES`` in order as a packed little-endian fixed-width array,
+  ready for ``numpy.frombuffer``
+
+Every format can be concatenated after its fixed header, which is how
+``merge_result_shards`` joins the per-worker shard files of a batch.
+"""
+
+import abc
+import sys
+from array import array
+from typing import BinaryIO, Dict, Iterable, Iterator
+
+from game_trace import BATTLE_ADVANTAGE_FLAG, SUIT_UP_FLAG
+
+FIELDS = (
+    "seed",
+    "suit_up",
+    "battle_advantage",
+    "winner",
+    "rounds",
+    "wars",
+    "suit_ups",
+    "battles",
+    "cycle_start",
+    "cycle_length",
+)
+
+# The GameResult fields of each record, after the seed and rules
+_RESULT_FIELDS = FIELDS[3:]
+
+_U32 = "I" if array("I").itemsize == 4 else "L"
+
+# Columnar array typecodes, the rules share one flags byte
+COLUMN_TYPES = {"seed": "q", "flags": "B", "winner": "b"} | {
+    name: _U32 for name in _RESULT_FIELDS[1:]
+}
+
+MAGIC = b"WARR"
+VERSION = 1
+
+
+class ResultSink(abc.ABC):
+    """
+    Base class for the result file formats. Subclasses set HEADER, the bytes
+    every file of the format starts with, and write out buffered records in
+    _write_records.
+    """
+
+    HEADER = b""
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        suit_up: bool = False,
+        battle_advantage: bool = False,
+        buffer_records: int = 4096,
+        write_header: bool = True,
+    ):
+        self.file = file
+        self.suit_up = suit_up
+        self.battle_advantage = battle_advantage
+        self.buffer_records = buffer_records
+        self._pending = 0
+        if write_header:
+            file.write(self.HEADER)
+
+    def add(self, seed: int, result):
+        """Record the GameResult of the game dealt from seed"""
+        self._buffer(seed, result)
+        self._pending += 1
+        if self._pending >= self.buffer_records:
+            self.flush()
+
+    def flush(self):
+        """Write out the buffered records, call once the last game is added"""
+        if self._pending:
+            self._write_records()
+            self._pending = 0
+
+    @abc.abstractmethod
+    def _buffer(self, seed: int, result):
+        """Buffer the record of one game"""
+
+    @abc.abstractmethod
+    def _write_records(self):
+        """Write the buffered records to file and clear them"""
+
+
+class _LineSink(ResultSink):
+    """Text formats with one line per record, formatted from LINE_FORMAT"""
+
+    LINE_FORMAT = ""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lines = []
+        self._rules = (
+            self._rule_text(self.suit_up),
+            self._rule_text(self.battle_advantage),
+        )
+
+    def _buffer(self, seed: int, result):
+        self._lines.append(
+            self.LINE_FORMAT
+            % (
+                seed,
+                *self._rules,
+                result.winner,
+                result.rounds,
+                result.wars,
+                result.suit_ups,
+                result.battles,
+                result.cycle_start,
+                result.cycle_length,
+            )
+        )
+
+    def _write_records(self):
+        self.file.write("".join(self._lines).encode("ascii"))
+        self._lines.clear()
+
+    @staticmethod
+    @abc.abstractmethod
+    def _rule_text(active: bool) -> str:
+        """How the format writes a house rule being on or off"""
+
+
+class JsonLinesSink(_LineSink):
+    """One JSON object per game"""
+
+    LINE_FORMAT = "{%s}\n" % ", ".join(
+        f'"{name}": %{"s" if name in ("suit_up", "battle_advantage") else "d"}'
+        for name in FIELDS
+    )
+
+    @staticmethod
+    def _rule_text(active: bool) -> str:
+        return "true" if active else "false"
+
+
+class CsvSink(_LineSink):
+    """A header line, then one line of integers per game"""
+
+    HEADER = (",".join(FIELDS) + "\n").encode("ascii")
+    LINE_FORMAT = (
+        ",".join(
+            "%s" if name in ("suit_up", "battle_advantage") else "%d" for name in FIELDS
+        )
+        + "\n"
+    )
+
+    @staticmethod
+    def _rule_text(active: bool) -> str:
+        return "1" if active else "0"
+
+
+class ColumnarSink(ResultSink):
+    """Blocks of fixed-width columns, one block per buffer_records games"""
+
+    HEADER = MAGIC + bytes([VERSION])
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._columns = {name: array(code) for name, code in COLUMN_TYPES.items()}
+        self._flags = (
+            SUIT_UP_FLAG * self.suit_up | BATTLE_ADVANTAGE_FLAG * self.battle_advantage
+        )
+
+    def _buffer(self, seed: int, result):
+        columns = self._columns
+        columns["seed"].append(seed)
+        columns["flags"].append(self._flags)
+        for name in _RESULT_FIELDS:
+            columns[name].append(getattr(result, name))
+
+    def _write_records(self):
+        self.file.write(self._pending.to_bytes(4, "little"))
+        for column in self._columns.values():
+            if sys.byteorder == "big":
+                column.byteswap()
+            self.file.write(column.tobytes())
+            del column[:]
+
+
+RESULT_SINKS = {"jsonl": JsonLinesSink, "csv": CsvSink, "columnar": ColumnarSink}
+
+
+def format_for_path(path: str) -> str:
+    """Result format implied by a file name, columnar unless .jsonl or .csv"""
+    if path.endswith(".jsonl"):
+        return "jsonl"
+    if path.endswith(".csv"):
+        return "csv"
+    return "columnar"
+
+
+def merge_result_shards(paths: Iterable[str], output: BinaryIO, result_format: str):
+    """Append the records of every shard file in paths, in order, to output"""
+    header = RESULT_SINKS[result_format].HEADER
+    output.write(header)
+    for path in paths:
+        with open(path, "rb") as part:
+            if part.read(len(header)) != header:
+                raise ValueError(f"{path} is not a {result_format} result file")
+            while chunk := part.read(1 << 20):
+                output.write(chunk)
+
+
+def iter_columnar_blocks(file: BinaryIO) -> Iterator[Dict[str, array]]:
+    """Stream the blocks of a columnar result file as arrays by COLUMN_TYPES name"""
+    if file.read(len(ColumnarSink.HEADER)) != ColumnarSink.HEADER:
+        raise ValueError("Not a columnar result file")
+    while count_bytes := file.read(4):
+        count = int.from_bytes(count_bytes, "little")
+        block = {}
+        for name, code in COLUMN_TYPES.items():
+            column = array(code)
+            size = column.itemsize * count
+            data = file.read(size)
+            if len(data) != size:
+                raise ValueError("Result file ended inside a block")
+            column.frombytes(data)
+            if sys.byteorder == "big":
+                column.byteswap()
+            block[name] = column
+        yield block
+
+
+def iter_records(file: BinaryIO, result_format: str) -> Iterator[dict]:
+    """Stream the records of a result file as dicts keyed by FIELDS"""
+    if result_format == "columnar":
+        for block in iter_columnar_blocks(file):
+            for row in zip(*block.values()):
+                seed, flags, *result = row
+                yield dict(
+                    zip(
+                        FIELDS,
+                        (
+                            seed,
+                            bool(flags & SUIT_UP_FLAG),
+                            bool(flags & BATTLE_ADVANTAGE_FLAG),
+                            *result,
+                        ),
+                    )
+                )
+        return
+
+    if result_format == "csv":
+        header = file.readline()
+        if header != CsvSink.HEADER:
+            raise ValueError("Not a CSV result file")
+        for line in file:
+            values = [int(value) for value in line.split(b",")]
+            values[1:3] = bool(values[1]), bool(values[2])
+            yield dict(zip(FIELDS, values))
+        return
+
+    if result_format != "jsonl":
+        raise ValueError(f"Unknown result format {result_format!r}")
+    # Only reading JSON needs the json module, writing formats it directly
+    import json
+
+    for line in file:
+        yield json.loads(line)
@@ -0,0 +1,205 @@
+"""
+Paired comparison of house rule sets on common deals.
+
+Comparing rule sets on independent shuffles needs a huge sample to tell
+small effects from the noise between deals. Here every deal is dealt once
+with ``GameState.setup_game`` and played under each rule set from a
+``GameState.fork`` of it, so the variants share the dealt cards instead of
+reshuffling, and their per-deal differences cancel most of that noise:
+
+    comparison = compare_rules(0, 100000)
+    for row in comparison.summary():
+        print(row["rules"], row["win_rate_delta"], row["delta_stderr"])
+
+Each rule set is compared with the first one, the baseline: how often the
+winner flips, the mean change in rounds, and the change in player 1's win
+rate with its paired standard error next to the one independent samples of
+the same size would have.
+"""
+
+import math
+import random
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+from game_stats import RunningMoments
+from helper_functions import RULE_SETS, GameState, rules_name
+from simulation import MAX_ROUNDS, GameResult, play_game, run_shards, seed_shards
+
+
+def play_paired(
+    game_state: GameState,
+    rule_sets: Sequence[Tuple[bool, bool]] = RULE_SETS,
+    max_rounds: int = MAX_ROUNDS,
+) -> Tuple[GameResult, ...]:
+    """
+    Play the set up game once under each rule set, each from its own fork,
+    leaving game_state at its starting position
+    """
+    return tuple(
+        play_game(game_state.fork(), suit_up, battle_advantage, max_rounds)
+        for suit_up, battle_advantage in rule_sets
+    )
+
+
+def iter_paired_games(
+    seeds: Iterable[int],
+    rule_sets: Sequence[Tuple[bool, bool]] = RULE_SETS,
+    max_rounds: int = MAX_ROUNDS,
+) -> Iterator[Tuple[GameResult, ...]]:
+    """
+    Deal one game per seed, as ``simulation.iter_seeded_games`` does, and
+    yield its results under every rule set
+    """
+    for seed in seeds:
+        game_state = GameState()
+        game_state.setup_game(shuffle_deck=True, rng=random.Random(seed))
+        yield play_paired(game_state, rule_sets, max_rounds)
+
+
+class RuleComparison:
+    """
+    Per-deal differences between rule sets and the baseline (the first),
+    in fixed memory and mergeable like ``game_stats.GameStats``
+    """
+
+    def __init__(self, rule_sets: Sequence[Tuple[bool, bool]] = RULE_SETS):
+        self.rule_sets = tuple(
+            (bool(suit_up), bool(battle_advantage))
+            for suit_up, battle_advantage in rule_sets
+        )
+        count = len(self.rule_sets)
+        # Per rule set: player 1 wins (as 1 or 0), rounds, and their paired
+        # differences from the baseline on the same deal
+        self.player1_wins = [RunningMoments() for _ in range(count)]
+        self.rounds = [RunningMoments() for _ in range(count)]
+        self.win_deltas = [RunningMoments() for _ in range(count)]
+        self.round_deltas = [RunningMoments() for _ in range(count)]
+        self.winner_flips = [0] * count
+
+    @property
+    def deals(self) -> int:
+        return self.rounds[0].count
+
+    def add(self, results: Sequence[GameResult]):
+        """Add one deal's results, in the order of rule_sets"""
+        baseline = results[0]
+        baseline_win = baseline.winner == 1
+        for index, result in enumerate(results):
+            player1_win = result.winner == 1
+            self.player1_wins[index].add(player1_win)
+            self.rounds[index].add(result.rounds)
+            self.win_deltas[index].add(player1_win - baseline_win)
+            self.round_deltas[index].add(result.rounds - baseline.rounds)
+            if result.winner != baseline.winner:
+                self.winner_flips[index] += 1
+
+    def merge(self, other: "RuleComparison"):
+        """Add the deals of other, e.g. another shard of the same comparison"""
+        if other.rule_sets != self.rule_sets:
+            raise ValueError("Only comparisons of the same rule sets can be merged")
+        for mine, theirs in (
+            (self.player1_wins, other.player1_wins),
+            (self.rounds, other.rounds),
+            (self.win_deltas, other.win_deltas),
+            (self.round_deltas, other.round_deltas),
+        ):
+            for moments, other_moments in zip(mine, theirs):
+                moments.merge(other_moments)
+        self.winner_flips = [
+            mine + theirs for mine, theirs in zip(self.winner_flips, other.winner_flips)
+        ]
+
+    def summary(self) -> list:
+        """One dict per rule set with its rates and differences from the baseline"""
+        deals = self.deals
+        rows = []
+        for index, (suit_up, battle_advantage) in enumerate(self.rule_sets):
+            paired_variance = self.win_deltas[index].variance
+            # What the deltas' variances would be from two independent samples
+            independent_variance = (
+                self.player1_wins[0].variance + self.player1_wins[index].variance
+            )
+            paired_round_variance = self.round_deltas[index].variance
+            independent_round_variance = (
+                self.rounds[0].variance + self.rounds[index].variance
+            )
+            rows.append(
+                {
+                    "rules": rules_name(suit_up, battle_advantage),
+                    "suit_up": suit_up,
+                    "battle_advantage": battle_advantage,
+                    "deals": deals,
+                    "player1_win_rate": self.player1_wins[index].mean,
+                    "rounds_mean": self.rounds[index].mean,
+                    "winner_flips": self.winner_flips[index],
+                    "flip_rate": self.winner_flips[index] / deals if deals else 0.0,
+                    "win_rate_delta": self.win_deltas[index].mean,
+                    "delta_stderr": _stderr(paired_variance, deals),
+                    "independent_stderr": _stderr(independent_variance, deals),
+                    # How many times fewer deals pairing needs for the same error
+                    "variance_reduction": (
+                        independent_variance / paired_variance
+                        if paired_variance
+                        else None
+                    ),
+                    "rounds_delta_mean": self.round_deltas[index].mean,
+                    "rounds_delta_stdev": self.round_deltas[index].stdev,
+                    "rounds_delta_stderr": _stderr(paired_round_variance, deals),
+                    "rounds_variance_reduction": (
+                        independent_round_variance / paired_round_variance
+                        if paired_round_variance
+                        else None
+                    ),
+                }
+            )
+        return rows
+
+
+def _stderr(variance: float, count: int) -> float:
+    return math.sqrt(variance / count) if count else 0.0
+
+
+def _compare_shard(
+    start_seed: int,
+    stop_seed: int,
+    rule_sets: Tuple[Tuple[bool, bool], ...],
+    max_rounds: int,
+) -> RuleComparison:
+    """Worker entry point: compare the rule sets on seeds [start_seed, stop_seed)"""
+    comparison = RuleComparison(rule_sets)
+    for results in iter_paired_games(
+        range(start_seed, stop_seed), rule_sets, max_rounds
+    ):
+        comparison.add(results)
+    return comparison
+
+
+def compare_rules(
+    start_seed: int,
+    stop_seed: int,
+    rule_sets: Sequence[Tuple[bool, bool]] = RULE_SETS,
+    workers: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    max_rounds: int = MAX_ROUNDS,
+    pool: Optional[str] = None,
+) -> RuleComparison:
+    """
+    Play the deal of every seed in [start_seed, stop_seed) under each rule set
+    and compare them with the first, sharded over workers as
+    ``simulation.run_seed_range`` does. The deals are the ones run_seed_range
+    plays for the same seeds, and the comparison is the same for any pool,
+    number of workers or shard size, up to float rounding.
+    """
+    rule_sets = tuple(
+        (bool(suit_up), bool(battle_advantage))
+        for suit_up, battle_advantage in rule_sets
+    )
+    shard_args = [
+        (shard_start, shard_stop, rule_sets, max_rounds)
+        for shard_start, shard_stop in seed_shards(
+            start_seed, stop_seed, workers, shard_size
+        )
+    ]
+    comparison = RuleComparison(rule_sets)
+    run_shards(_compare_shard, shard_args, comparison.merge, workers, pool)
+    return comparison
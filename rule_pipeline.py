@@ -0,0 +1,295 @@
+"""
+House rules played by one round loop per rule set.
+
+``round_function(suit_up, battle_advantage)`` returns the function that
+plays one round of War, including any wars, suit ups and battles, under
+exactly that rule set:
+
+    play_round = round_function(suit_up=True)
+    winner = play_round(game_state, counts)
+
+Each loop is written out for its rules, so none of them tests a rule flag
+while playing. Without house rules the loop doesn't even look cards up in
+a comparison table: it compares ranks and only ever draws from the top.
+
+Combined house rules follow the README's bonus section:
+
+- Matching values are always a war, of any suit, and no house rule applies
+  to the cards that end a war.
+- King vs Queen starts a battle with advantage, even when they share a suit.
+- With suit up in effect the battle is played from the bottom of the hand
+  if it came up while already playing from the bottom, or if the King and
+  Queen are the same suit (suit up is nullified, its direction isn't).
+"""
+
+from itertools import islice
+from typing import Callable, Optional
+
+from helper_functions import KING_RANK, GameState, comparison_table
+
+# (game_state, counts, trace) -> winner, 0 for a draw, or None to play on.
+# counts has wars, suit_ups and battles attributes to add to.
+RoundFunction = Callable[..., Optional[int]]
+
+_WAR_TABLE = comparison_table()
+_SUIT_UP_TABLE = comparison_table(suit_up_active=True)
+_BATTLE_TABLE = comparison_table(battle_advantage_active=True)
+_COMBINED_TABLE = comparison_table(True, True)
+
+
+def settle_battle(
+    game_state: GameState,
+    player_1_played_cards,
+    player_2_played_cards,
+    from_bottom: bool = False,
+    trace=None,
+    verbose: bool = False,
+):
+    """Resolve a King vs Queen battle and hand the cards to the winner"""
+    card1 = player_1_played_cards[-1]
+    player1, player2 = game_state.player1, game_state.player2
+
+    if card1 >> 2 == KING_RANK:  # Player 1 has King
+        winner, all_cards = game_state.battle_with_advantage(
+            player_2_played_cards[-1], card1, player2, player1, verbose, from_bottom
+        )
+        player_1_wins = winner == 2
+    else:  # Player 2 has King
+        winner, all_cards = game_state.battle_with_advantage(
+            card1, player_2_played_cards[-1], player1, player2, verbose, from_bottom
+        )
+        player_1_wins = winner == 1
+
+    if trace is not None:
+        trace.record_battle(all_cards[2:])
+    if player_1_wins:
+        player1.add_cards_to_discard(
+            player_1_played_cards, player_2_played_cards, islice(all_cards, 2, None)
+        )
+    else:
+        player2.add_cards_to_discard(
+            player_2_played_cards, player_1_played_cards, islice(all_cards, 2, None)
+        )
+
+
+def battle_from_bottom(
+    suit_up: bool, from_bottom: bool, card1: int, card2: int
+) -> bool:
+    """Whether a battle started by card1 vs card2 is played from the bottom"""
+    return suit_up and (from_bottom or card1 & 3 == card2 & 3)
+
+
+def _start_round(player1, player2, played_1, played_2, trace):
+    """
+    Draw the first card each onto the empty played cards, recording them to
+    trace. Returns None to compare them, or the game's result if a player
+    had no card to play.
+    """
+    card_1 = player1.draw_card()
+    if card_1 is None:
+        # Without a previous comparison, both running out together is a draw
+        return 2 if player2.has_cards() else 0
+    played_1.append(card_1)
+    card_2 = player2.draw_card()
+    if card_2 is not None:
+        played_2.append(card_2)
+    if trace is not None:
+        trace.record_draw(played_1, played_2, 0)
+    return None if card_2 is not None else 1
+
+
+def _draw_cards(player1, player2, played_1, played_2, deal, from_bottom, trace):
+    """
+    Draw deal more cards each onto the played cards for a war or suit up,
+    recording them to trace. Returns None to compare the last cards drawn,
+    or the game's result if a player ran out.
+    """
+    drawn_before = len(played_1)
+    result = None
+    for _ in range(deal):
+        card_1 = player1.draw_card(from_bottom)
+        if card_1 is None:
+            if player2.has_cards():
+                result = 2
+            else:
+                # Both ran out together, the last comparison decides
+                result = _WAR_TABLE[played_1[-1] * 52 + played_2[-1]]
+            break
+        played_1.append(card_1)
+        card_2 = player2.draw_card(from_bottom)
+        if card_2 is None:
+            result = 1
+            break
+        played_2.append(card_2)
+    if trace is not None:
+        trace.record_draw(played_1, played_2, drawn_before)
+    return result
+
+
+def _take_played(game_state: GameState, comparison: int, played_1, played_2):
+    """Hand the played cards to the round's winner, their own cards first"""
+    if comparison == 1:
+        discard = game_state.player1.discard
+        discard.extend(played_1)
+        discard.extend(played_2)
+    else:
+        discard = game_state.player2.discard
+        discard.extend(played_2)
+        discard.extend(played_1)
+
+
+def _count_war(game_state: GameState, counts):
+    counts.wars += 1
+    if game_state.metrics is not None:
+        game_state.metrics.record_war()
+
+
+def _count_suit_up(game_state: GameState, counts):
+    counts.suit_ups += 1
+    if game_state.metrics is not None:
+        game_state.metrics.suit_ups += 1
+
+
+def _count_battle(game_state: GameState, counts):
+    counts.battles += 1
+    if game_state.metrics is not None:
+        game_state.metrics.battles += 1
+
+
+# Each loop below plays a round the same way: draw, compare, record the
+# outcome to the trace (a battle records itself in settle_battle), then
+# either hand the cards to the winner or draw again for a war or suit up.
+
+
+def play_plain_round(game_state: GameState, counts, trace=None) -> Optional[int]:
+    """Play one round of War with no house rules"""
+    player1 = game_state.player1
+    player2 = game_state.player2
+    played_1 = []
+    played_2 = []
+    result = _start_round(player1, player2, played_1, played_2, trace)
+    while result is None:
+        # Ranks compared directly, no table needed without house rules
+        rank_1 = played_1[-1] >> 2
+        rank_2 = played_2[-1] >> 2
+        comparison = 0 if rank_1 == rank_2 else 1 if rank_1 > rank_2 else 2
+        if trace is not None:
+            trace.record_outcome(comparison)
+        if comparison:
+            _take_played(game_state, comparison, played_1, played_2)
+            return None
+        _count_war(game_state, counts)
+        result = _draw_cards(player1, player2, played_1, played_2, 4, False, trace)
+    return result
+
+
+def play_suit_up_round(game_state: GameState, counts, trace=None) -> Optional[int]:
+    """Play one round of War with suit up"""
+    player1 = game_state.player1
+    player2 = game_state.player2
+    played_1 = []
+    played_2 = []
+    table = _SUIT_UP_TABLE
+    result = _start_round(player1, player2, played_1, played_2, trace)
+    while result is None:
+        comparison = table[played_1[-1] * 52 + played_2[-1]]
+        if trace is not None:
+            trace.record_outcome(comparison)
+        if comparison == 1 or comparison == 2:
+            _take_played(game_state, comparison, played_1, played_2)
+            return None
+        if comparison == 0:
+            _count_war(game_state, counts)
+            # No house rule applies to the cards that end a war
+            deal, from_bottom, table = 4, False, _WAR_TABLE
+        else:
+            _count_suit_up(game_state, counts)
+            deal, from_bottom, table = 2, True, _SUIT_UP_TABLE
+        result = _draw_cards(
+            player1, player2, played_1, played_2, deal, from_bottom, trace
+        )
+    return result
+
+
+def play_battle_round(game_state: GameState, counts, trace=None) -> Optional[int]:
+    """Play one round of War with battle with advantage"""
+    player1 = game_state.player1
+    player2 = game_state.player2
+    played_1 = []
+    played_2 = []
+    table = _BATTLE_TABLE
+    result = _start_round(player1, player2, played_1, played_2, trace)
+    while result is None:
+        comparison = table[played_1[-1] * 52 + played_2[-1]]
+        if trace is not None and comparison != 4:
+            trace.record_outcome(comparison)
+        if comparison == 1 or comparison == 2:
+            _take_played(game_state, comparison, played_1, played_2)
+            return None
+        if comparison == 4:
+            _count_battle(game_state, counts)
+            settle_battle(game_state, played_1, played_2, False, trace)
+            return None
+        _count_war(game_state, counts)
+        table = _WAR_TABLE
+        result = _draw_cards(player1, player2, played_1, played_2, 4, False, trace)
+    return result
+
+
+def play_combined_round(game_state: GameState, counts, trace=None) -> Optional[int]:
+    """Play one round of War with suit up and battle with advantage"""
+    player1 = game_state.player1
+    player2 = game_state.player2
+    played_1 = []
+    played_2 = []
+    from_bottom, table = False, _COMBINED_TABLE
+    result = _start_round(player1, player2, played_1, played_2, trace)
+    while result is None:
+        card_1 = played_1[-1]
+        card_2 = played_2[-1]
+        comparison = table[card_1 * 52 + card_2]
+        if trace is not None and comparison != 4:
+            trace.record_outcome(comparison)
+        if comparison == 1 or comparison == 2:
+            _take_played(game_state, comparison, played_1, played_2)
+            return None
+        if comparison == 4:
+            _count_battle(game_state, counts)
+            settle_battle(
+                game_state,
+                played_1,
+                played_2,
+                battle_from_bottom(True, from_bottom, card_1, card_2),
+                trace,
+            )
+            return None
+        if comparison == 0:
+            _count_war(game_state, counts)
+            deal, from_bottom, table = 4, False, _WAR_TABLE
+        else:
+            _count_suit_up(game_state, counts)
+            deal, from_bottom, table = 2, True, _COMBINED_TABLE
+        result = _draw_cards(
+            player1, player2, played_1, played_2, deal, from_bottom, trace
+        )
+    return result
+
+
+_ROUND_FUNCTIONS = {
+    (False, False): play_plain_round,
+    (True, False): play_suit_up_round,
+    (False, True): play_battle_round,
+    (True, True): play_combined_round,
+}
+
+
+def round_function(
+    suit_up: bool = False, battle_advantage: bool = False
+) -> RoundFunction:
+    """
+    Round loop for one rule set. play_round(game_state, counts, trace)
+    returns the winning player number, 0 for a draw, or None if the game
+    continues. Pass a TraceWriter as trace to record the round; metrics are
+    counted when the game has them enabled.
+    """
+    return _ROUND_FUNCTIONS[bool(suit_up), bool(battle_advantage)]
@@ -0,0 +1,271 @@
+"""
+asyncio server for many interactive War games at once.
+
+``war_engine.play_war`` waits on ``input()`` between rounds, so a process
+can only serve one player. Here every game is a session: a paused
+``simulation.iter_rounds`` generator over its own ``GameState``, advanced one
+round per request. A paused session holds only its piles and a generator
+frame, with no thread or task behind it, so one process keeps thousands of
+them in memory and serves them all from a single event loop.
+
+Clients connect over TCP or a Unix socket and send one JSON object per line,
+getting one JSON line back for each:
+
+    {"op": "new", "seed": 7, "suit_up": true}  ->  {"session": 1, ...}
+    {"op": "step", "session": 1}  ->  {"event": {...}} for the round played,
+                                      {"result": {...}} once the game is over
+    {"op": "close", "session": 1}  ->  {"closed": 1}
+    {"op": "stats"}  ->  session count, memory and step latency percentiles
+
+Errors come back as {"error": "..."}. Sessions outlive connections, and a
+finished game's session is closed once its result is sent. Serve with:
+
+    python session_server.py --tcp 127.0.0.1:8765
+    python session_server.py --unix /tmp/war.sock
+"""
+
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import deque
+from dataclasses import asdict
+from typing import Dict, Optional
+
+from helper_functions import GameState
+from simulation import MAX_ROUNDS, RoundEvent, iter_rounds
+
+
+class Session:
+    """One game in progress, paused between rounds"""
+
+    __slots__ = ("game_state", "rounds")
+
+    def __init__(self, game_state: GameState, rounds):
+        self.game_state = game_state
+        self.rounds = rounds
+
+    def memory(self) -> int:
+        """
+        Approximate bytes held by this session alone: the session, its game
+        state, players, piles and generator. Cards are shared by every game.
+        """
+        game_state = self.game_state
+        size = sum(
+            map(
+                sys.getsizeof,
+                (self, self.rounds, game_state, vars(game_state)),
+            )
+        )
+        for player in (game_state.player1, game_state.player2):
+            size += sys.getsizeof(player) + sys.getsizeof(vars(player))
+            size += sys.getsizeof(player._hand) + sys.getsizeof(player.discard)
+        return size
+
+
+class SessionManager:
+    """
+    Sessions by ID and the requests that drive them, independent of any
+    connection. The last latency_window step times are kept for stats.
+    """
+
+    def __init__(self, max_sessions: int = 100000, latency_window: int = 10000):
+        self.max_sessions = max_sessions
+        self.sessions: Dict[int, Session] = {}
+        self.steps = 0
+        self._step_times = deque(maxlen=latency_window)  # Nanoseconds
+        self._next_id = 1
+
+    def new_session(
+        self,
+        seed: Optional[int] = None,
+        suit_up: bool = False,
+        battle_advantage: bool = False,
+        max_rounds: int = MAX_ROUNDS,
+    ) -> int:
+        """Deal a new game, from seed if given, and return its session ID"""
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("Too many sessions")
+        game_state = GameState()
+        # Each game has its own generator, never the global random module
+        game_state.setup_game(rng=random.Random(seed))
+        rounds = iter_rounds(game_state, suit_up, battle_advantage, max_rounds)
+        session_id = self._next_id
+        self._next_id += 1
+        self.sessions[session_id] = Session(game_state, rounds)
+        return session_id
+
+    def step(self, session_id: int) -> dict:
+        """
+        Play the next round of a session, returning {"event": ...}, or
+        {"result": ...} and closing the session once the game is over
+        """
+        session = self._session(session_id)
+        start = time.perf_counter_ns()
+        try:
+            event = next(session.rounds)
+        except StopIteration as stop:
+            response = {"result": asdict(stop.value)}
+            del self.sessions[session_id]
+        else:
+            response = {"event": _event_json(event)}
+        self._step_times.append(time.perf_counter_ns() - start)
+        self.steps += 1
+        return response
+
+    def close(self, session_id: int):
+        """Abandon a session"""
+        self._session(session_id).rounds.close()
+        del self.sessions[session_id]
+
+    def stats(self) -> dict:
+        """Session count and memory, and step latency over the recent steps"""
+        memory = sum(session.memory() for session in self.sessions.values())
+        step_times = sorted(self._step_times)
+        return {
+            "sessions": len(self.sessions),
+            "memory_bytes": memory,
+            "memory_per_session": memory // len(self.sessions) if self.sessions else 0,
+            "steps": self.steps,
+            "p50_step_us": _percentile(step_times, 50) / 1000,
+            "p99_step_us": _percentile(step_times, 99) / 1000,
+        }
+
+    def handle(self, request: dict) -> dict:
+        """Response to one decoded request line"""
+        op = request.get("op")
+        try:
+            if op == "new":
+                session_id = self.new_session(
+                    request.get("seed"),
+                    bool(request.get("suit_up")),
+                    bool(request.get("battle_advantage")),
+                    int(request.get("max_rounds", MAX_ROUNDS)),
+                )
+                game_state = self.sessions[session_id].game_state
+                return {
+                    "session": session_id,
+                    "round": game_state.round_number,
+                    "pile_sizes": game_state.pile_sizes(),
+                }
+            if op == "step":
+                return self.step(request.get("session"))
+            if op == "close":
+                self.close(request.get("session"))
+                return {"closed": request.get("session")}
+            if op == "stats":
+                return self.stats()
+        except (KeyError, TypeError, ValueError) as error:
+            return {"error": str(error.args[0]) if error.args else repr(error)}
+        return {"error": f"Unknown op {op!r}"}
+
+    def _session(self, session_id: int) -> Session:
+        try:
+            return self.sessions[session_id]
+        except (KeyError, TypeError):
+            raise KeyError(f"Unknown session {session_id!r}") from None
+
+
+def _event_json(event: RoundEvent) -> dict:
+    return {
+        "round": event.round,
+        "player_1_cards": [str(card) for card in event.player_1_cards],
+        "player_2_cards": [str(card) for card in event.player_2_cards],
+        "battle_cards": [str(card) for card in event.battle_cards],
+        "outcome": event.outcome,
+        "winner": event.winner,
+        "wars": event.wars,
+        "suit_ups": event.suit_ups,
+        "battle": event.battle,
+        "pile_sizes": event.pile_sizes,
+    }
+
+
+def _percentile(sorted_values, percent: float) -> float:
+    """Nearest-rank percentile of an already sorted list, 0 if it is empty"""
+    if not sorted_values:
+        return 0
+    return sorted_values[max(math.ceil(len(sorted_values) * percent / 100) - 1, 0)]
+
+
+async def handle_connection(
+    manager: SessionManager, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+):
+    """Answer request lines from one client until it disconnects"""
+    try:
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"error": "Requests must be one JSON object per line"}
+            else:
+                if isinstance(request, dict):
+                    response = manager.handle(request)
+                else:
+                    response = {"error": "Requests must be JSON objects"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass  # The client went away, its sessions stay for the next connection
+    finally:
+        writer.close()
+        try:
+            # Let the last responses flush before the transport goes
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(
+    manager: SessionManager,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    path: Optional[str] = None,
+) -> asyncio.AbstractServer:
+    """Start serving the manager's sessions on a Unix socket at path, or on host:port"""
+
+    async def client_connected(reader, writer):
+        await handle_connection(manager, reader, writer)
+
+    if path is not None:
+        return await asyncio.start_unix_server(client_connected, path)
+    return await asyncio.start_server(client_connected, host, port)
+
+
+def main(argv=None):
+    """Serve sessions until interrupted"""
+    # Only the command line needs argparse, keep it out of every import
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve interactive War games")
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--tcp", metavar="HOST:PORT", help="Listen on TCP")
+    address.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket")
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=100000,
+        help="Refuse new games beyond this many sessions",
+    )
+    args = parser.parse_args(argv)
+
+    async def run():
+        manager = SessionManager(args.max_sessions)
+        if args.unix:
+            server = await serve(manager, path=args.unix)
+        else:
+            host, _, port = args.tcp.rpartition(":")
+            server = await serve(manager, host or None, int(port))
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,778 @@
+"""
+Headless batch simulation of the War card game.
+
+Games played through this module skip the per-round logging and the
+interactive ``input()`` prompt used by ``war_game.play_war`` and return a
+compact ``GameResult`` per game instead.
+
+Games that return to an earlier position would never end, so they stop as
+soon as the repeat is detected and are reported with winner ``CYCLE``.
+
+Seeded batches give every game its own ``random.Random(seed)``, so a seed
+range always produces the same games and can be sharded across processes
+with ``run_seed_range``. Pass a ``game_trace.TraceWriter`` (or a trace path
+to ``run_seed_range``) to archive every game as a compact binary trace, and
+a results path to stream every game's result to a ``result_sinks`` file.
+"""
+
+import math
+import os
+import random
+import sys
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import (
+    Callable,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from game_trace import TraceWriter, concatenate_traces
+from game_stats import GameStats
+from helper_functions import (
+    CYCLE,
+    DEAL_COUNT,
+    DRAW,
+    ROUND_LIMIT,
+    CycleDetector,
+    GameMetrics,
+    GameState,
+)
+from result_sinks import RESULT_SINKS, merge_result_shards
+from rule_pipeline import round_function
+
+MAX_ROUNDS = 10000
+
+# Bumped whenever a change to the engines changes any rule set's results, so
+# stored results from older engines (see outcome_cache) are not reused.
+# 1: combined house rules battle from the bottom, suit up cycles compare suits
+ENGINE_VERSION = 1
+
+# Pools run_seed_range can spread shards over
+POOLS = ("process", "thread")
+
+
+def default_pool() -> str:
+    """Threads on a free-threaded build running without the GIL, processes otherwise"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    if is_gil_enabled is not None and not is_gil_enabled():
+        return "thread"
+    return "process"
+
+
+@dataclass(frozen=True, slots=True)
+class GameResult:
+    """Compact summary of a single finished game"""
+
+    winner: int  # 1 or 2, DRAW, CYCLE or ROUND_LIMIT
+    rounds: int
+    wars: int
+    suit_ups: int
+    battles: int
+    cycle_start: int = 0  # First round of the repeating positions, for CYCLE
+    cycle_length: int = 0  # Rounds before the position repeats, for CYCLE
+
+
+@dataclass(frozen=True, slots=True)
+class RoundEvent:
+    """One finished round of a game played with ``iter_rounds``"""
+
+    round: int
+    player_1_cards: tuple  # Cards player 1 played, in the order drawn
+    player_2_cards: tuple
+    battle_cards: tuple  # Extra cards of a battle with advantage, Queen's first
+    outcome: Optional[int]  # Last comparison code, None if no cards were compared
+    winner: Optional[int]  # Player who took the cards, None if the game ended first
+    wars: int
+    suit_ups: int
+    pile_sizes: tuple  # Hand and discard sizes of both players after the round
+
+    @property
+    def battle(self) -> bool:
+        """True if the round was settled by a battle with advantage"""
+        return self.outcome == 4
+
+
+@dataclass(slots=True)
+class BatchTotals:
+    """Running totals over many games, cheap to send between processes and merge"""
+
+    games: int = 0
+    player1_wins: int = 0
+    player2_wins: int = 0
+    draws: int = 0
+    cycles: int = 0
+    round_limits: int = 0
+    rounds: int = 0
+    wars: int = 0
+    suit_ups: int = 0
+    battles: int = 0
+
+    def add_result(self, result: GameResult):
+        """Fold a single game result into the totals"""
+        self.games += 1
+        if result.winner == 1:
+            self.player1_wins += 1
+        elif result.winner == 2:
+            self.player2_wins += 1
+        elif result.winner == CYCLE:
+            self.cycles += 1
+        elif result.winner == ROUND_LIMIT:
+            self.round_limits += 1
+        else:
+            self.draws += 1
+        self.rounds += result.rounds
+        self.wars += result.wars
+        self.suit_ups += result.suit_ups
+        self.battles += result.battles
+
+    def merge(self, other: "BatchTotals"):
+        """Add another set of totals, e.g. from a different worker, into this one"""
+        self.games += other.games
+        self.player1_wins += other.player1_wins
+        self.player2_wins += other.player2_wins
+        self.draws += other.draws
+        self.cycles += other.cycles
+        self.round_limits += other.round_limits
+        self.rounds += other.rounds
+        self.wars += other.wars
+        self.suit_ups += other.suit_ups
+        self.battles += other.battles
+
+
+class _MechanicCounts:
+    """Mutable tally of the special mechanics triggered during a game"""
+
+    __slots__ = ("wars", "suit_ups", "battles")
+
+    def __init__(self):
+        self.wars = 0
+        self.suit_ups = 0
+        self.battles = 0
+
+
+def locate_cycle_start(
+    detector: CycleDetector, suit_up: bool = False, battle_advantage: bool = False
+) -> int:
+    """First round of the cycle ``detector`` found, replayed without logging"""
+    play_round = round_function(suit_up, battle_advantage)
+    return detector.find_cycle_start(
+        lambda replay: play_round(replay, _MechanicCounts())
+    )
+
+
+def finish_round(
+    game_state: GameState,
+    winner: Optional[int],
+    detector: CycleDetector,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+) -> Optional[Tuple[int, int, int]]:
+    """
+    Everything after a round that returned winner (None if the game went on):
+    counts the round into the game's metrics and decides whether the game is
+    over, by a player running out of cards, a cycle or max_rounds. Returns
+    None to play another round, otherwise (winner, cycle_start, cycle_length)
+    with the game counted into the metrics too. Every engine's game loop ends
+    its rounds with this, so they stop games the same way.
+    """
+    metrics = game_state.metrics
+    # A result straight from the round means a player couldn't draw
+    empty_hand = winner is not None
+    if metrics is not None:
+        metrics.end_round()
+    if winner is None:
+        game_winner = game_state.check_game_over()
+        if game_winner is not None:
+            winner = 1 if game_winner == game_state.player1.name else 2
+
+    cycle_start = cycle_length = 0
+    if winner is None and detector.check(game_state):
+        winner = CYCLE
+        cycle_length = detector.cycle_length
+        cycle_start = locate_cycle_start(detector, suit_up, battle_advantage)
+    elif winner is None and game_state.round_number >= max_rounds:
+        winner = ROUND_LIMIT
+
+    if winner is None:
+        return None
+    if metrics is not None:
+        metrics.end_game(empty_hand)
+    return winner, cycle_start, cycle_length
+
+
+def _stop_game(
+    game_state: GameState, counts: _MechanicCounts, end: Tuple[int, int, int]
+) -> GameResult:
+    """
+    Result of a game that finish_round ended. A game stopped at max_rounds
+    isn't over, so it moves on to the next round, ready to be played on,
+    snapshotted or forked like any game between rounds.
+    """
+    winner, cycle_start, cycle_length = end
+    result = GameResult(
+        winner=winner,
+        rounds=game_state.round_number,
+        wars=counts.wars,
+        suit_ups=counts.suit_ups,
+        battles=counts.battles,
+        cycle_start=cycle_start,
+        cycle_length=cycle_length,
+    )
+    if winner == ROUND_LIMIT:
+        game_state.increment_round()
+    return result
+
+
+class _RoundRecorder:
+    """
+    Stands in for a TraceWriter to collect what happened in a single round,
+    keeping the played card lists and the last outcome
+    """
+
+    __slots__ = ("played", "outcome", "battle_cards")
+
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.played = ((), ())
+        self.outcome = None
+        self.battle_cards = ()
+
+    def record_draw(self, player_1_played_cards, player_2_played_cards, start: int):
+        self.played = (player_1_played_cards, player_2_played_cards)
+
+    def record_outcome(self, comparison: int):
+        self.outcome = comparison
+
+    def record_battle(self, cards):
+        self.outcome = 4
+        self.battle_cards = tuple(cards)
+
+
+def iter_rounds(
+    game_state: GameState,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+) -> Generator[RoundEvent, None, GameResult]:
+    """
+    Play an already set up game lazily, yielding a ``RoundEvent`` after every
+    round. Stop iterating at any point to abandon the game. A game played to
+    the end returns the same ``GameResult`` as ``play_game``, as the value of
+    ``yield from`` or of the StopIteration.
+    Counts into ``game_state.metrics`` if metrics are enabled.
+    """
+    counts = _MechanicCounts()
+    play_round = round_function(suit_up, battle_advantage)
+    detector = CycleDetector(game_state)
+    recorder = _RoundRecorder()
+    player1 = game_state.player1
+
+    while True:
+        recorder.start()
+        wars, suit_ups = counts.wars, counts.suit_ups
+        player_1_cards_before = player1.total_cards()
+        winner = play_round(game_state, counts, recorder)
+
+        round_winner = None
+        if winner is None:
+            round_winner = 1 if player1.total_cards() > player_1_cards_before else 2
+        end = finish_round(
+            game_state, winner, detector, suit_up, battle_advantage, max_rounds
+        )
+        yield RoundEvent(
+            round=game_state.round_number,
+            player_1_cards=tuple(recorder.played[0]),
+            player_2_cards=tuple(recorder.played[1]),
+            battle_cards=recorder.battle_cards,
+            outcome=recorder.outcome,
+            winner=round_winner,
+            wars=counts.wars - wars,
+            suit_ups=counts.suit_ups - suit_ups,
+            pile_sizes=game_state.pile_sizes(),
+        )
+        if end is not None:
+            return _stop_game(game_state, counts, end)
+        game_state.increment_round()
+
+
+def play_game(
+    game_state: GameState,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+    trace: Optional[TraceWriter] = None,
+) -> GameResult:
+    """
+    Play an already set up game to completion and return its result.
+    Games that cycle stop as soon as a position repeats, and no game
+    plays more than max_rounds rounds. If a trace is given, the game must
+    already have been started with ``trace.begin_game``.
+    Counts into ``game_state.metrics`` if metrics are enabled.
+    """
+    counts = _MechanicCounts()
+    play_round = round_function(suit_up, battle_advantage)
+    detector = CycleDetector(game_state)
+
+    while True:
+        winner = play_round(game_state, counts, trace)
+        end = finish_round(
+            game_state, winner, detector, suit_up, battle_advantage, max_rounds
+        )
+        if end is not None:
+            break
+        game_state.increment_round()
+
+    if trace is not None:
+        trace.end_game(end[0], game_state.round_number, end[1], end[2])
+    return _stop_game(game_state, counts, end)
+
+
+def iter_games(
+    num_games: int,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+) -> Iterator[GameResult]:
+    """Play ``num_games`` freshly shuffled games back-to-back, yielding each result"""
+    for _ in range(num_games):
+        game_state = GameState()
+        game_state.setup_game(shuffle_deck=True)
+        yield play_game(game_state, suit_up, battle_advantage, max_rounds)
+
+
+def iter_seeded_games(
+    seeds: Iterable[int],
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+    trace: Optional[TraceWriter] = None,
+    cache=None,
+    metrics: Optional[GameMetrics] = None,
+) -> Iterator[GameResult]:
+    """
+    Play one game per seed, each dealt from its own ``random.Random(seed)``.
+    With an ``outcome_cache.OutcomeCache``, deals already in it (or deals
+    equivalent to them, see ``helper_functions.canonical_deal``) aren't
+    played again, unless they are being traced.
+    The games played count their mechanics into metrics if it is given.
+    """
+    for seed in seeds:
+        game_state = GameState()
+        game_state.setup_game(shuffle_deck=True, rng=random.Random(seed))
+        if metrics is not None:
+            game_state.enable_metrics(metrics)
+        if cache is None:
+            if trace is not None:
+                trace.begin_game(game_state, suit_up, battle_advantage, seed)
+            yield play_game(game_state, suit_up, battle_advantage, max_rounds, trace)
+            continue
+
+        # Equivalent deals play out the same, so they share one cached result
+        deal = game_state.deal_key(canonical=True, suit_up=suit_up)
+        result = None
+        if trace is None:
+            result = cache.get(deal, suit_up, battle_advantage, max_rounds)
+        else:
+            trace.begin_game(game_state, suit_up, battle_advantage, seed)
+        if result is None:
+            result = play_game(game_state, suit_up, battle_advantage, max_rounds, trace)
+            cache.put(deal, result, suit_up, battle_advantage, max_rounds)
+        yield result
+
+
+def iter_deal_games(
+    deal_ids: Iterable[int],
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+) -> Iterator[GameResult]:
+    """Play the deck with each deal ID (see ``helper_functions.rank_deal``)"""
+    for deal_id in deal_ids:
+        game_state = GameState()
+        game_state.setup_game(deal_id=deal_id)
+        yield play_game(game_state, suit_up, battle_advantage, max_rounds)
+
+
+def stratified_deal_ids(
+    start: int, stop: int, strata: int, seed: int = 0
+) -> Iterator[int]:
+    """
+    One random deal ID from each of strata [start, stop), where the deal IDs
+    are split into strata equal ranges. Every stratum draws from its own
+    random.Random, so workers can each take a range of strata and together
+    sample exactly the deals a single process would, without sharing state.
+    """
+    for stratum in range(start, stop):
+        low = DEAL_COUNT * stratum // strata
+        high = DEAL_COUNT * (stratum + 1) // strata
+        yield random.Random(f"{seed}:{stratum}").randrange(low, high)
+
+
+def simulate_games(
+    num_games: int,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+) -> List[GameResult]:
+    """Play ``num_games`` games and return all of their results"""
+    return list(iter_games(num_games, suit_up, battle_advantage, max_rounds))
+
+
+def _run_seed_shard(
+    start_seed: int,
+    stop_seed: int,
+    suit_up: bool,
+    battle_advantage: bool,
+    max_rounds: int = MAX_ROUNDS,
+    trace_path: Optional[str] = None,
+    results_path: Optional[str] = None,
+    results_format: str = "columnar",
+    cache_path: Optional[str] = None,
+    collect_stats: bool = False,
+) -> Tuple[BatchTotals, Optional[GameStats]]:
+    """
+    Worker entry point: play seeds [start_seed, stop_seed) and return their totals,
+    tracing the games to trace_path, writing their results to results_path and
+    looking them up in the outcome cache at cache_path if they are given.
+    With collect_stats their GameStats are returned too, otherwise None.
+    """
+    totals = BatchTotals()
+    seeds = range(start_seed, stop_seed)
+    stats = metrics = None
+    if collect_stats:
+        stats = GameStats(suit_up, battle_advantage)
+        metrics = GameMetrics()
+    with ExitStack() as files:
+        trace = sink = cache = None
+        if trace_path is not None:
+            trace = TraceWriter(files.enter_context(open(trace_path, "wb")))
+        if cache_path is not None:
+            # Imported here, only cached runs need sqlite3
+            from outcome_cache import OutcomeCache
+
+            cache = files.enter_context(OutcomeCache(cache_path))
+        if results_path is not None:
+            sink = RESULT_SINKS[results_format](
+                files.enter_context(open(results_path, "wb")), suit_up, battle_advantage
+            )
+
+        results = iter_seeded_games(
+            seeds, suit_up, battle_advantage, max_rounds, trace, cache, metrics
+        )
+        if sink is None and stats is None:
+            for result in results:
+                totals.add_result(result)
+            return totals, None
+
+        for seed, result in zip(seeds, results):
+            totals.add_result(result)
+            if stats is not None:
+                stats.add_result(result)
+            if sink is not None:
+                sink.add(seed, result)
+        if sink is not None:
+            sink.flush()
+    if stats is not None:
+        stats.add_metrics(metrics)
+    return totals, stats
+
+
+def seed_shards(
+    start_seed: int,
+    stop_seed: int,
+    workers: Optional[int] = None,
+    shard_size: Optional[int] = None,
+) -> list:
+    """
+    [start, stop) seed bounds of each shard of a seed range, shard_size seeds
+    each, by default a few shards per worker (workers defaulting to the CPU count)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if shard_size is None:
+        # A few shards per worker keeps the pool busy when some games run long
+        num_games = max(stop_seed - start_seed, 0)
+        shard_size = max(1, -(-num_games // (workers * 4)))
+    return [
+        (seed, min(seed + shard_size, stop_seed))
+        for seed in range(start_seed, stop_seed, shard_size)
+    ]
+
+
+def run_shards(
+    worker: Callable,
+    shard_args: Sequence[tuple],
+    merge: Callable,
+    workers: Optional[int] = None,
+    pool: Optional[str] = None,
+):
+    """
+    Call worker(*args) for every shard's args, in the calling thread if there
+    is one worker or one shard, otherwise across a pool of worker processes or
+    threads, pool being one of POOLS (default_pool() if not given). merge is
+    called in the calling thread with each shard's return value, in the order
+    the shards finish.
+    """
+    if pool is None:
+        pool = default_pool()
+    if pool not in POOLS:
+        raise ValueError(f"pool must be one of {POOLS}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(shard_args) <= 1:
+        for args in shard_args:
+            merge(worker(*args))
+        return
+
+    # Imported here, multiprocessing is the bulk of this module's import time
+    # and is not needed by single-process runs or the worker processes' games
+    from concurrent import futures
+
+    executor_class = (
+        futures.ThreadPoolExecutor if pool == "thread" else futures.ProcessPoolExecutor
+    )
+    with executor_class(max_workers=workers) as executor:
+        shard_futures = [executor.submit(worker, *args) for args in shard_args]
+        for future in futures.as_completed(shard_futures):
+            merge(future.result())
+
+
+def run_seed_range(
+    start_seed: int,
+    stop_seed: int,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    workers: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    max_rounds: int = MAX_ROUNDS,
+    trace_path: Optional[str] = None,
+    results_path: Optional[str] = None,
+    results_format: str = "columnar",
+    cache_path: Optional[str] = None,
+    pool: Optional[str] = None,
+    stats: Optional[GameStats] = None,
+) -> BatchTotals:
+    """
+    Play one game for every seed in [start_seed, stop_seed) across a pool of
+    worker processes or threads, pool being one of POOLS (default_pool() if
+    not given). Each game is dealt from its own seed, so the totals are the
+    same for any pool, number of workers or shard size. workers defaults to
+    the CPU count, workers=1 runs everything in the calling thread.
+    With trace_path, every game is also written to that trace file in seed order,
+    and with results_path every game's result is written to that file in
+    results_format (one of ``result_sinks.RESULT_SINKS``). Each shard writes
+    its own part files and the parts are joined in seed order at the end.
+    With cache_path, results are looked up in and added to that
+    ``outcome_cache.OutcomeCache`` file.
+    With stats, a ``game_stats.GameStats`` for the same house rules, every
+    game is added to it as well, each shard filling its own to be merged in.
+    """
+    if stats is not None and (stats.suit_up, stats.battle_advantage) != (
+        suit_up,
+        battle_advantage,
+    ):
+        raise ValueError("stats must be for the same house rules")
+    shards = seed_shards(start_seed, stop_seed, workers, shard_size)
+    trace_parts = _part_paths(trace_path, shards)
+    results_parts = _part_paths(results_path, shards)
+    shard_args = [
+        (
+            shard_start,
+            shard_stop,
+            suit_up,
+            battle_advantage,
+            max_rounds,
+            trace_part,
+            results_part,
+            results_format,
+            cache_path,
+            stats is not None,
+        )
+        for (shard_start, shard_stop), trace_part, results_part in zip(
+            shards, trace_parts, results_parts
+        )
+    ]
+    totals = BatchTotals()
+    # Shards share nothing but the outcome cache file, each with its own
+    # connection, so threads need no locking
+    run_shards(
+        _run_seed_shard,
+        shard_args,
+        lambda shard: _merge_shard(totals, stats, *shard),
+        workers,
+        pool,
+    )
+
+    if trace_path is not None:
+        with open(trace_path, "wb") as trace_file:
+            TraceWriter(trace_file)  # Writes the file header
+            concatenate_traces(trace_parts, trace_file)
+    if results_path is not None:
+        with open(results_path, "wb") as results_file:
+            merge_result_shards(results_parts, results_file, results_format)
+    for part_path in trace_parts + results_parts:
+        if part_path is not None:
+            os.remove(part_path)
+    return totals
+
+
+@dataclass(frozen=True, slots=True)
+class RateEstimate:
+    """How often games ended with one outcome, from ``estimate_rate``"""
+
+    winner: int  # The outcome counted: 1 or 2, DRAW, CYCLE or ROUND_LIMIT
+    rate: float
+    low: float  # Wilson score interval at the requested confidence
+    high: float
+    confidence: float
+    converged: bool  # False if max_games ran out before the interval was narrow enough
+    totals: BatchTotals  # Of all the games played
+    batches: int
+    seconds: float  # Wall time
+
+    @property
+    def games(self) -> int:
+        return self.totals.games
+
+    @property
+    def margin(self) -> float:
+        """Half the width of the interval"""
+        return (self.high - self.low) / 2
+
+
+def wilson_interval(successes: int, trials: int, z: float) -> Tuple[float, float]:
+    """Wilson score interval for a proportion, z standard errors wide on each side"""
+    if not trials:
+        return 0.0, 1.0
+    rate = successes / trials
+    scale = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / scale
+    spread = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials**2)) / scale
+    return max(center - spread, 0.0), min(center + spread, 1.0)
+
+
+def estimate_rate(
+    margin: float,
+    confidence: float = 0.99,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    winner: int = 1,
+    start_seed: int = 0,
+    batch_size: int = 10000,
+    max_games: int = 10000000,
+    workers: Optional[int] = None,
+    max_rounds: int = MAX_ROUNDS,
+    pool: Optional[str] = None,
+    stats: Optional[GameStats] = None,
+    cache_path: Optional[str] = None,
+) -> RateEstimate:
+    """
+    Play batches of consecutive seeds from start_seed with ``run_seed_range``
+    until the rate of games ending with winner is known to within margin at
+    the given confidence, or max_games have been played. The first batch is
+    batch_size games, or fewer if a 50% rate (the widest interval) would
+    already be within the margin, and every later batch is sized from the rate
+    so far to just reach the margin. Loose margins stop after a few hundred
+    games, and a rate far from 50% well before max_games. The games played
+    are the same for the same arguments, and are added to stats if it is given.
+    cache_path is an ``outcome_cache.OutcomeCache`` file, as for run_seed_range.
+    """
+    if not 0 < margin < 1 or not 0 < confidence < 1:
+        raise ValueError("margin and confidence must be between 0 and 1")
+    if max_games < 1 or batch_size < 1:
+        raise ValueError("max_games and batch_size must be positive")
+    if winner not in (1, 2, DRAW, CYCLE, ROUND_LIMIT):
+        raise ValueError("winner must be 1, 2, DRAW, CYCLE or ROUND_LIMIT")
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    totals = BatchTotals()
+    batches = 0
+    next_batch = min(batch_size, _games_needed(0.5, z, margin), max_games)
+    start = time.perf_counter()
+    while True:
+        seed = start_seed + totals.games
+        totals.merge(
+            run_seed_range(
+                seed,
+                seed + next_batch,
+                suit_up=suit_up,
+                battle_advantage=battle_advantage,
+                workers=workers,
+                max_rounds=max_rounds,
+                pool=pool,
+                stats=stats,
+                cache_path=cache_path,
+            )
+        )
+        batches += 1
+        low, high = wilson_interval(_outcome_count(totals, winner), totals.games, z)
+        converged = (high - low) / 2 <= margin
+        if converged or totals.games >= max_games:
+            break
+        rate = _outcome_count(totals, winner) / totals.games
+        # With 10% to spare, and growing by at least a tenth so a rate that
+        # keeps falling just short doesn't take many tiny batches
+        needed = math.ceil(1.1 * _games_needed(rate, z, margin))
+        next_batch = min(
+            max(needed - totals.games, -(-totals.games // 10)),
+            max_games - totals.games,
+        )
+    return RateEstimate(
+        winner,
+        _outcome_count(totals, winner) / totals.games,
+        low,
+        high,
+        confidence,
+        converged,
+        totals,
+        batches,
+        time.perf_counter() - start,
+    )
+
+
+def _games_needed(rate: float, z: float, margin: float) -> int:
+    """Games the normal approximation needs to get a rate within margin"""
+    return math.ceil(z * z * max(rate * (1 - rate), 1e-4) / margin**2)
+
+
+def _outcome_count(totals: BatchTotals, winner: int) -> int:
+    """Games in totals that ended with winner"""
+    if winner == 1:
+        return totals.player1_wins
+    if winner == 2:
+        return totals.player2_wins
+    if winner == CYCLE:
+        return totals.cycles
+    if winner == ROUND_LIMIT:
+        return totals.round_limits
+    return totals.draws
+
+
+def _merge_shard(
+    totals: BatchTotals,
+    stats: Optional[GameStats],
+    shard_totals: BatchTotals,
+    shard_stats: Optional[GameStats],
+):
+    totals.merge(shard_totals)
+    if stats is not None:
+        stats.merge(shard_stats)
+
+
+def _part_paths(path: Optional[str], shards: List[tuple]) -> List[Optional[str]]:
+    """Per-shard part file names for an output file, None for every shard if no path"""
+    return [
+        None if path is None else f"{path}.{shard_start}.part"
+        for shard_start, _ in shards
+    ]
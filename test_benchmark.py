@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the engine benchmark suite.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from benchmark import (
+    ENGINES,
+    benchmark_engine,
+    collect_metrics,
+    compare_to_baseline,
+    main,
+    results_to_json,
+    run_benchmarks,
+)
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Test timing engines on fixed seed sets"""
+
+    def test_engines_registered(self):
+        """Test the legacy, refactored and faster engines are all benchmarked"""
+        self.assertEqual(
+            list(ENGINES), ["legacy", "war_engine", "simulation", "vector"]
+        )
+
+    def test_result_rates(self):
+        """Test the reported rates agree with the games, rounds and time"""
+        result = benchmark_engine("simulation", range(5), suit_up=True, repeat=2)
+
+        self.assertEqual(result.games, 5)
+        self.assertGreater(result.rounds, 0)
+        self.assertAlmostEqual(result.games_per_sec, 5 / result.seconds)
+        self.assertAlmostEqual(result.rounds_per_sec, result.rounds / result.seconds)
+        self.assertAlmostEqual(
+            result.ns_per_round, result.seconds / result.rounds * 1e9
+        )
+
+    def test_same_seeds_same_rounds(self):
+        """Test the engines sharing a dealer play the same number of rounds"""
+        rounds = {
+            engine: benchmark_engine(
+                engine, range(8), battle_advantage=True, repeat=1
+            ).rounds
+            for engine in ("war_engine", "simulation", "vector")
+        }
+
+        self.assertEqual(len(set(rounds.values())), 1)
+
+    def test_metrics_cover_benchmarked_rounds(self):
+        """Test the mechanic counts are for the same games that were timed"""
+        result = benchmark_engine("simulation", range(8), suit_up=True, repeat=1)
+        metrics = collect_metrics(range(8), suit_up=True)
+
+        self.assertEqual(metrics.rounds, result.rounds)
+        self.assertGreater(metrics.suit_ups, 0)
+
+    def test_legacy_skips_battle_with_advantage(self):
+        """Test rule sets an engine can't play are left out"""
+        results = run_benchmarks(["legacy"], range(3), repeat=1)
+
+        self.assertEqual(
+            [(r.suit_up, r.battle_advantage) for r in results],
+            [(False, False), (True, False)],
+        )
+        self.assertTrue(all(r.rounds > 0 for r in results))
+
+    def test_games_per_engine(self):
+        """Test an engine can play a different number of games from the same first seed"""
+        results = run_benchmarks(
+            ["simulation"], range(10, 14), [(False, False)], 1, {"simulation": 2}
+        )
+
+        self.assertEqual(results[0].games, 2)
+
+
+class TestBaselines(unittest.TestCase):
+    """Test saving runs and comparing them"""
+
+    def test_compare_to_baseline(self):
+        """Test matching results by engine and rules"""
+        result = {
+            "engine": "simulation",
+            "suit_up": False,
+            "battle_advantage": True,
+            "ns_per_round": 1000.0,
+        }
+        baseline = {"results": [dict(result, ns_per_round=3000.0)]}
+        current = {"results": [result, dict(result, engine="vector")]}
+
+        comparisons = compare_to_baseline(current, baseline)
+
+        self.assertEqual(len(comparisons), 1)
+        self.assertEqual(comparisons[0]["speedup"], 3.0)
+
+    def test_json_round_trip(self):
+        """Test a run saved with --output can be used as a --baseline"""
+        with tempfile.TemporaryDirectory() as directory:
+            first = os.path.join(directory, "first.json")
+            second = os.path.join(directory, "second.json")
+            options = ["--engines", "simulation", "--games", "3", "--repeat", "1"]
+            main(options + ["--output", first])
+            main(options + ["--output", second, "--baseline", first])
+
+            with open(second) as second_file:
+                document = json.load(second_file)
+
+        self.assertEqual(len(document["results"]), 4)
+        self.assertEqual(len(document["baseline"]["comparisons"]), 4)
+        self.assertEqual(results_to_json([], 7)["first_seed"], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
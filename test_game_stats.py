@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming, mergeable game statistics.
+"""
+
+import pickle
+import random
+import statistics
+import unittest
+from game_stats import GameStats, Histogram, QuantileSketch, RunningMoments
+from helper_functions import GameMetrics
+from simulation import CYCLE, DRAW, iter_seeded_games, run_seed_range
+from war_engine import play_war
+
+
+class TestRunningMoments(unittest.TestCase):
+    """Test Welford mean and variance"""
+
+    def test_matches_statistics(self):
+        """Test the moments of added values match the statistics module"""
+        rng = random.Random(1)
+        values = [rng.gauss(200, 80) for _ in range(500)]
+        moments = RunningMoments()
+        for value in values:
+            moments.add(value)
+
+        self.assertAlmostEqual(moments.mean, statistics.fmean(values))
+        self.assertAlmostEqual(moments.variance, statistics.variance(values))
+        self.assertEqual((moments.minimum, moments.maximum), (min(values), max(values)))
+
+    def test_merge(self):
+        """Test merging shards gives the moments of all their values"""
+        values = list(range(1, 1001))
+        whole = RunningMoments()
+        for value in values:
+            whole.add(value)
+        merged = RunningMoments()
+        for start in range(0, 1000, 300):
+            shard = RunningMoments()
+            for value in values[start : start + 300]:
+                shard.add(value)
+            merged.merge(shard)
+        merged.merge(RunningMoments())
+
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.mean, whole.mean)
+        self.assertAlmostEqual(merged.variance, whole.variance)
+        self.assertEqual((merged.minimum, merged.maximum), (1, 1000))
+
+
+class TestQuantileSketch(unittest.TestCase):
+    """Test quantiles are within the sketch's relative accuracy"""
+
+    def test_relative_accuracy(self):
+        """Test quantiles of skewed values against the exact ones"""
+        rng = random.Random(2)
+        values = sorted(int(rng.lognormvariate(5, 0.8)) + 1 for _ in range(5000))
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+
+        for fraction in (0.01, 0.5, 0.9, 0.99, 1):
+            with self.subTest(fraction=fraction):
+                exact = values[round(fraction * (len(values) - 1))]
+                self.assertLessEqual(
+                    abs(sketch.quantile(fraction) - exact), 0.01 * exact + 1e-9
+                )
+
+    def test_merge_is_exact(self):
+        """Test merged sketches are the sketch of all the values"""
+        whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in range(1, 3000):
+            whole.add(value)
+            (first if value % 3 else second).add(value)
+        first.merge(second)
+
+        self.assertEqual(first.buckets, whole.buckets)
+        self.assertEqual(first.count, whole.count)
+        with self.assertRaises(ValueError):
+            first.merge(QuantileSketch(relative_accuracy=0.05))
+
+    def test_fixed_memory(self):
+        """Test the bucket count is capped, folding the lowest values together"""
+        sketch = QuantileSketch(max_buckets=50)
+        for value in range(1, 100000, 7):
+            sketch.add(value)
+
+        self.assertEqual(len(sketch.buckets), 50)
+        self.assertAlmostEqual(sketch.quantile(1), 99996, delta=1000)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+
+class TestHistogram(unittest.TestCase):
+    """Test fixed-width buckets"""
+
+    def test_buckets_and_overflow(self):
+        """Test values land in their bucket, large ones in the overflow"""
+        histogram = Histogram(bucket_width=10, bucket_count=3)
+        for value in (0, 9, 10, 25, 30, 5000):
+            histogram.add(value)
+        other = Histogram(bucket_width=10, bucket_count=3)
+        other.add(12)
+        histogram.merge(other)
+
+        self.assertEqual(histogram.as_dict(), {0: 2, 10: 2, 20: 1, "30+": 2})
+        with self.assertRaises(ValueError):
+            histogram.merge(Histogram(bucket_width=10, bucket_count=4))
+
+
+class TestGameStats(unittest.TestCase):
+    """Test game statistics and where they plug in"""
+
+    def test_summary(self):
+        """Test rates and cycle lengths of added games"""
+        stats = GameStats(suit_up=True)
+        for winner, rounds, cycle_length in (
+            (1, 100, 0),
+            (1, 200, 0),
+            (2, 300, 0),
+            (DRAW, 50, 0),
+            (CYCLE, 400, 40),
+        ):
+            stats.add(winner, rounds, cycle_length)
+
+        summary = stats.summary()
+        self.assertEqual(summary["games"], 5)
+        self.assertEqual(
+            (
+                summary["player1_win_rate"],
+                summary["draw_rate"],
+                summary["cycle_rate"],
+            ),
+            (0.4, 0.2, 0.2),
+        )
+        self.assertAlmostEqual(summary["cycle_length_p50"], 40, delta=0.4)
+        self.assertAlmostEqual(summary["rounds_p50"], 200, delta=2)
+        self.assertEqual(summary["rounds_mean"], 210)
+        self.assertEqual((summary["rounds_min"], summary["rounds_max"]), (50, 400))
+
+    def test_batch_runner_shards(self):
+        """Test stats from any number of shards and pools agree with one pass"""
+        seeds = range(300)
+        expected = GameStats(True, True)
+        metrics = GameMetrics()
+        for result in iter_seeded_games(seeds, True, True, metrics=metrics):
+            expected.add_result(result)
+        expected.add_metrics(metrics)
+        expected = expected.summary()
+
+        for workers, pool in ((1, "thread"), (3, "thread"), (2, "process")):
+            with self.subTest(workers=workers, pool=pool):
+                stats = GameStats(True, True)
+                run_seed_range(
+                    0,
+                    300,
+                    True,
+                    True,
+                    workers=workers,
+                    shard_size=70,
+                    pool=pool,
+                    stats=stats,
+                )
+                summary = stats.summary()
+                for key in ("rounds_mean", "rounds_stdev"):
+                    self.assertAlmostEqual(summary.pop(key), expected[key])
+                self.assertEqual(
+                    summary,
+                    {
+                        key: value
+                        for key, value in expected.items()
+                        if key not in ("rounds_mean", "rounds_stdev")
+                    },
+                )
+        self.assertGreater(len(expected["war_chains"]), 1)
+        with self.assertRaises(ValueError):
+            run_seed_range(0, 10, suit_up=True, stats=GameStats())
+
+    def test_pickles(self):
+        """Test stats survive the trip back from a worker process"""
+        stats = GameStats()
+        for rounds in (10, 20, 5000):
+            stats.add(1, rounds)
+
+        copy = pickle.loads(pickle.dumps(stats))
+        self.assertEqual(copy.summary(), stats.summary())
+
+    def test_play_war(self):
+        """Test play_war adds each game's outcome and war chains"""
+        stats = GameStats(suit_up=True)
+        metrics = GameMetrics()
+        for seed in range(5):
+            play_war(
+                suit_up=True, verbosity="none", rng=random.Random(seed), stats=stats
+            )
+            play_war(
+                suit_up=True,
+                verbosity="none",
+                rng=random.Random(seed),
+                metrics=metrics,
+            )
+
+        expected = GameStats(suit_up=True)
+        for result in iter_seeded_games(range(5), suit_up=True):
+            expected.add_result(result)
+        expected.add_metrics(metrics)
+        self.assertEqual(stats.summary(), expected.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests for binary game traces and the text renderer.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from helper_functions import Card, Suit, GameState, unrank_deal
+from game_trace import DEAL_ID_FLAG, MAGIC, TraceWriter, _varint, render_trace
+from simulation import iter_seeded_games, play_game, run_seed_range
+
+
+def _trace_games(seeds, suit_up=False, battle_advantage=False):
+    trace_file = io.BytesIO()
+    results = list(
+        iter_seeded_games(
+            seeds, suit_up, battle_advantage, trace=TraceWriter(trace_file)
+        )
+    )
+    return trace_file.getvalue(), results
+
+
+class TestTraceRendering(unittest.TestCase):
+    """Test traces render back to the per-round text log"""
+
+    def test_forced_war(self):
+        """Test a short game renders exactly like the round log"""
+        game = GameState()
+        game.player1.hand.extend(
+            [Card(14, Suit.CLUBS), Card(4, Suit.CLUBS), Card(3, Suit.CLUBS)]
+            + [Card(2, Suit.CLUBS), Card(9, Suit.CLUBS)]
+        )
+        game.player2.hand.extend(
+            [Card(5, Suit.HEARTS), Card(6, Suit.HEARTS), Card(7, Suit.HEARTS)]
+            + [Card(8, Suit.HEARTS), Card(9, Suit.HEARTS)]
+        )
+        trace_file = io.BytesIO()
+        trace = TraceWriter(trace_file)
+        trace.begin_game(game)
+        play_game(game, trace=trace)
+        trace_file.seek(0)
+
+        self.assertEqual(
+            list(render_trace(trace_file)),
+            [
+                "---- Round 1 ----",
+                "P1: H:4  | D:0  | [9c] ",
+                "P2: H:4  | D:0  | [9h] ",
+                "War!",
+                "P1: H:0  | D:0  | [9c, 2c, 3c, 4c, Ac]*",
+                "P2: H:0  | D:0  | [9h, 8h, 7h, 6h, 5h] ",
+                "Player 1 Wins in 1 rounds!",
+            ],
+        )
+
+    def test_one_block_per_round(self):
+        """Test every game renders one round header per round and its result"""
+        data, results = _trace_games(range(20), suit_up=True, battle_advantage=True)
+        lines = list(render_trace(io.BytesIO(data)))
+
+        headers = [line for line in lines if line.startswith("---- Round")]
+        self.assertEqual(len(headers), sum(result.rounds for result in results))
+        endings = [line for line in lines if line.endswith("rounds!")]
+        self.assertEqual(
+            endings,
+            [f"Player {r.winner} Wins in {r.rounds} rounds!" for r in results],
+        )
+
+    def test_battles_render(self):
+        """Test battle with advantage messages are rebuilt from the trace"""
+        data, results = _trace_games(range(20), battle_advantage=True)
+        lines = list(render_trace(io.BytesIO(data)))
+
+        self.assertEqual(
+            lines.count("Battle with Advantage!"), sum(r.battles for r in results)
+        )
+
+    def test_trace_is_compact(self):
+        """Test a plain round takes a few bytes rather than a log line"""
+        data, results = _trace_games(range(20))
+
+        self.assertLess(len(data), 5 * sum(result.rounds for result in results))
+
+    def test_deal_stored_as_id(self):
+        """Test a dealt game is stored by deal ID and renders like its piles"""
+        game = GameState()
+        game.setup_game(deal_id=123456789)
+        trace_file = io.BytesIO()
+        trace = TraceWriter(trace_file)
+        trace.begin_game(game)
+        play_game(game, trace=trace)
+        data = trace_file.getvalue()
+        id_size = len(_varint(123456789))
+
+        # The same game as a version 1 trace, with the four piles spelled out
+        deck = unrank_deal(123456789)
+        piles = bytes([26, *deck[0::2], 0, 26, *deck[1::2], 0])
+        old_data = MAGIC + bytes([1, 0]) + piles + data[6 + id_size :]
+
+        self.assertEqual(data[5], DEAL_ID_FLAG)
+        self.assertLess(len(data), len(old_data))
+        self.assertEqual(
+            list(render_trace(io.BytesIO(data))),
+            list(render_trace(io.BytesIO(old_data))),
+        )
+
+    def test_rejects_other_files(self):
+        """Test rendering a file that is not a trace fails clearly"""
+        with self.assertRaises(ValueError):
+            list(render_trace(io.BytesIO(b"P1: H:25")))
+
+
+class TestShardedTraces(unittest.TestCase):
+    """Test traces written by the process pool runner"""
+
+    def test_trace_independent_of_worker_count(self):
+        """Test shard traces are joined back in seed order"""
+        with tempfile.TemporaryDirectory() as directory:
+            serial = os.path.join(directory, "serial.trace")
+            parallel = os.path.join(directory, "parallel.trace")
+            run_seed_range(0, 30, suit_up=True, workers=1, trace_path=serial)
+            run_seed_range(
+                0, 30, suit_up=True, workers=3, shard_size=4, trace_path=parallel
+            )
+
+            with open(serial, "rb") as first, open(parallel, "rb") as second:
+                self.assertEqual(first.read(), second.read())
+            self.assertEqual(
+                sorted(os.listdir(directory)), ["parallel.trace", "serial.trace"]
+            )
+
+    def test_trace_matches_games(self):
+        """Test the joined trace holds every game of the seed range"""
+        expected, _ = _trace_games(range(10), suit_up=True)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.trace")
+            run_seed_range(
+                0, 10, suit_up=True, workers=1, shard_size=3, trace_path=path
+            )
+
+            with open(path, "rb") as trace_file:
+                self.assertEqual(trace_file.read(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
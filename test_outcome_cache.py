@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent outcome cache.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from outcome_cache import OutcomeCache
+from simulation import MAX_ROUNDS, GameResult, iter_seeded_games, run_seed_range
+
+RESULT = GameResult(1, 120, 9, 0, 1)
+
+
+class TestOutcomeCache(unittest.TestCase):
+    """Test storing and looking up results"""
+
+    def test_results_keyed_by_rules_and_round_cap(self):
+        """Test a deal's result is only found under the rules it was played with"""
+        with OutcomeCache(":memory:") as cache:
+            cache.put(b"deal", RESULT, suit_up=True)
+
+            self.assertEqual(cache.get(b"deal", suit_up=True), RESULT)
+            self.assertIsNone(cache.get(b"deal"))
+            self.assertIsNone(cache.get(b"deal", suit_up=True, max_rounds=50))
+            self.assertIsNone(cache.get(b"other", suit_up=True))
+            self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_results_persist(self):
+        """Test results are read back from the file by a new cache"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outcomes.sqlite")
+            with OutcomeCache(path) as cache:
+                cache.put(b"deal", RESULT, battle_advantage=True)
+            with OutcomeCache(path) as cache:
+                self.assertEqual(cache.get(b"deal", battle_advantage=True), RESULT)
+                self.assertEqual(len(cache), 1)
+
+    def test_results_of_other_engines_miss(self):
+        """Test results stored by another engine version are not reused"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outcomes.sqlite")
+            with mock.patch("outcome_cache.ENGINE_VERSION", 0):
+                with OutcomeCache(path) as cache:
+                    cache.put(b"deal", RESULT, suit_up=True)
+            with OutcomeCache(path) as cache:
+                self.assertIsNone(cache.get(b"deal", suit_up=True))
+                cache.put(b"deal", RESULT, suit_up=True)
+            with OutcomeCache(path) as cache:
+                self.assertEqual(cache.get(b"deal", suit_up=True), RESULT)
+                self.assertEqual(len(cache), 1)
+
+    def test_unversioned_file_misses(self):
+        """Test a file from before results were versioned is upgraded, its rows missing"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outcomes.sqlite")
+            connection = sqlite3.connect(path)
+            with connection:
+                connection.execute(
+                    "CREATE TABLE outcomes (deal BLOB NOT NULL, rules INTEGER NOT NULL, "
+                    "max_rounds INTEGER NOT NULL, winner INTEGER NOT NULL, "
+                    "rounds INTEGER NOT NULL, wars INTEGER NOT NULL, "
+                    "suit_ups INTEGER NOT NULL, battles INTEGER NOT NULL, "
+                    "cycle_start INTEGER NOT NULL, cycle_length INTEGER NOT NULL, "
+                    "PRIMARY KEY (deal, rules, max_rounds)) WITHOUT ROWID"
+                )
+                connection.execute(
+                    "INSERT INTO outcomes VALUES (?, 3, ?, 2, 50, 1, 1, 1, 0, 0)",
+                    (b"deal", MAX_ROUNDS),
+                )
+            connection.close()
+
+            with OutcomeCache(path) as cache:
+                self.assertIsNone(cache.get(b"deal", True, True))
+                cache.put(b"deal", RESULT, True, True)
+            with OutcomeCache(path) as cache:
+                self.assertEqual(cache.get(b"deal", True, True), RESULT)
+
+    def test_lru_eviction(self):
+        """Test the in-memory front drops the least recently used result"""
+        with OutcomeCache(":memory:", lru_size=2) as cache:
+            cache.put(b"a", RESULT)
+            cache.put(b"b", RESULT)
+            cache.get(b"a")
+            cache.put(b"c", RESULT)
+
+            self.assertEqual([key[0] for key in cache._recent], [b"a", b"c"])
+            self.assertEqual(cache.get(b"b"), RESULT)  # Still in the file
+
+    def test_fifo_eviction(self):
+        """Test first in, first out eviction ignores lookups"""
+        with OutcomeCache(":memory:", lru_size=2, eviction="fifo") as cache:
+            cache.put(b"a", RESULT)
+            cache.put(b"b", RESULT)
+            cache.get(b"a")
+            cache.put(b"c", RESULT)
+
+            self.assertEqual([key[0] for key in cache._recent], [b"b", b"c"])
+
+    def test_unknown_eviction_policy(self):
+        """Test an unknown eviction policy is rejected"""
+        with self.assertRaises(ValueError):
+            OutcomeCache(":memory:", eviction="random")
+
+
+class TestCachedGames(unittest.TestCase):
+    """Test batches skipping deals that are already cached"""
+
+    def test_cached_deals_not_replayed(self):
+        """Test a second run takes every result from the cache"""
+        expected = list(iter_seeded_games(range(20), suit_up=True))
+        with OutcomeCache(":memory:") as cache:
+            first = list(iter_seeded_games(range(20), suit_up=True, cache=cache))
+            with mock.patch("simulation.play_game") as play_game:
+                second = list(iter_seeded_games(range(20), suit_up=True, cache=cache))
+
+        self.assertEqual(first, expected)
+        self.assertEqual(second, expected)
+        play_game.assert_not_called()
+
+    def test_seed_range_with_cache(self):
+        """Test pool runs share one cache file and give the same totals"""
+        expected = run_seed_range(0, 30, workers=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outcomes.sqlite")
+            first = run_seed_range(0, 30, workers=3, shard_size=4, cache_path=path)
+            second = run_seed_range(0, 30, workers=1, cache_path=path)
+            with OutcomeCache(path) as cache:
+                self.assertEqual(len(cache), 30)
+
+        self.assertEqual(first, expected)
+        self.assertEqual(second, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
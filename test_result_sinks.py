@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming per-game result files.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from result_sinks import (
+    FIELDS,
+    RESULT_SINKS,
+    CsvSink,
+    ResultSink,
+    format_for_path,
+    iter_columnar_blocks,
+    iter_records,
+    merge_result_shards,
+)
+from simulation import GameResult, iter_seeded_games, run_seed_range
+
+
+def _write(result_format, seeds, suit_up=False, battle_advantage=False, **options):
+    sink_file = io.BytesIO()
+    sink = RESULT_SINKS[result_format](sink_file, suit_up, battle_advantage, **options)
+    for seed, result in zip(seeds, iter_seeded_games(seeds, suit_up, battle_advantage)):
+        sink.add(seed, result)
+    sink.flush()
+    return sink_file.getvalue()
+
+
+class TestResultSinks(unittest.TestCase):
+    """Test writing and reading back each result format"""
+
+    def test_formats_hold_the_same_records(self):
+        """Test every format reads back to the seeds, rules and results"""
+        seeds = range(10, 40)
+        results = iter_seeded_games(seeds, suit_up=True, battle_advantage=True)
+        expected = [
+            dict(zip(FIELDS, (seed, True, True)))
+            | {name: getattr(result, name) for name in FIELDS[3:]}
+            for seed, result in zip(seeds, results)
+        ]
+        for result_format in RESULT_SINKS:
+            with self.subTest(result_format):
+                data = _write(result_format, seeds, True, True, buffer_records=7)
+                records = list(iter_records(io.BytesIO(data), result_format))
+                self.assertEqual(records, expected)
+
+    def test_records_buffered_until_flush(self):
+        """Test records are written in bulk, not one write per game"""
+        sink_file = io.BytesIO()
+        sink = CsvSink(sink_file, buffer_records=3)
+        result = GameResult(1, 10, 1, 0, 0)
+        sink.add(0, result)
+        sink.add(1, result)
+        self.assertEqual(sink_file.getvalue(), CsvSink.HEADER)
+
+        sink.add(2, result)
+        self.assertEqual(sink_file.getvalue().count(b"\n"), 4)
+
+    def test_columnar_blocks(self):
+        """Test columnar files hold one fixed-width block per buffer of records"""
+        data = _write("columnar", range(10), buffer_records=4)
+        blocks = list(iter_columnar_blocks(io.BytesIO(data)))
+
+        self.assertEqual([len(block["seed"]) for block in blocks], [4, 4, 2])
+        self.assertEqual(list(blocks[1]["seed"]), [4, 5, 6, 7])
+        self.assertEqual(set(blocks[0]["flags"]), {0})
+
+    def test_cycle_recorded(self):
+        """Test a cycling game keeps its cycle start and length"""
+        sink_file = io.BytesIO()
+        sink = RESULT_SINKS["columnar"](sink_file)
+        sink.add(3, GameResult(-1, 25, 2, 0, 0, cycle_start=13, cycle_length=12))
+        sink.flush()
+        sink_file.seek(0)
+
+        (record,) = iter_records(sink_file, "columnar")
+        self.assertEqual((record["winner"], record["cycle_start"]), (-1, 13))
+        self.assertEqual(record["cycle_length"], 12)
+
+    def test_incomplete_sink_not_created(self):
+        """Test a sink missing a hook fails when created, not when first flushed"""
+
+        class BufferOnly(ResultSink):
+            def _buffer(self, seed, result):
+                pass
+
+        with self.assertRaises(TypeError):
+            BufferOnly(io.BytesIO())
+
+    def test_format_for_path(self):
+        """Test the format is picked from the file extension"""
+        self.assertEqual(format_for_path("games.jsonl"), "jsonl")
+        self.assertEqual(format_for_path("games.csv"), "csv")
+        self.assertEqual(format_for_path("games.bin"), "columnar")
+
+    def test_rejects_other_files(self):
+        """Test reading a file of another format fails clearly"""
+        data = _write("csv", range(3))
+        with self.assertRaises(ValueError):
+            list(iter_records(io.BytesIO(data), "columnar"))
+
+
+class TestResultShards(unittest.TestCase):
+    """Test result files written by the process pool runner"""
+
+    def test_merge_result_shards(self):
+        """Test shard files are joined under a single header"""
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for start in (0, 5):
+                path = os.path.join(directory, f"{start}.part")
+                with open(path, "wb") as part:
+                    part.write(_write("csv", range(start, start + 5)))
+                paths.append(path)
+            merged = io.BytesIO()
+            merge_result_shards(paths, merged, "csv")
+
+        self.assertEqual(merged.getvalue(), _write("csv", range(10)))
+
+    def test_results_independent_of_worker_count(self):
+        """Test every format holds the same records for any number of workers"""
+        expected = list(iter_records(io.BytesIO(_write("csv", range(30))), "csv"))
+        for result_format in RESULT_SINKS:
+            with self.subTest(result_format), tempfile.TemporaryDirectory() as dir_:
+                serial = os.path.join(dir_, "serial")
+                parallel = os.path.join(dir_, "parallel")
+                run_seed_range(
+                    0, 30, workers=1, results_path=serial, results_format=result_format
+                )
+                run_seed_range(
+                    0,
+                    30,
+                    workers=3,
+                    shard_size=4,
+                    results_path=parallel,
+                    results_format=result_format,
+                )
+
+                self.assertEqual(sorted(os.listdir(dir_)), ["parallel", "serial"])
+                for path in (serial, parallel):
+                    with open(path, "rb") as results_file:
+                        records = list(iter_records(results_file, result_format))
+                    self.assertEqual(records, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
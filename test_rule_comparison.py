@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for comparing rule sets on common deals.
+"""
+
+import random
+import unittest
+from helper_functions import GameState
+from rule_comparison import (
+    RULE_SETS,
+    RuleComparison,
+    compare_rules,
+    iter_paired_games,
+    play_paired,
+)
+from simulation import iter_seeded_games
+
+
+class TestPairedGames(unittest.TestCase):
+    """Test one deal played under every rule set"""
+
+    def test_same_games_as_seeded_batches(self):
+        """Test each variant plays the game its own seeded batch would"""
+        seeds = range(30)
+        paired = list(iter_paired_games(seeds))
+        for index, (suit_up, battle_advantage) in enumerate(RULE_SETS):
+            with self.subTest(suit_up=suit_up, battle_advantage=battle_advantage):
+                self.assertEqual(
+                    [results[index] for results in paired],
+                    list(iter_seeded_games(seeds, suit_up, battle_advantage)),
+                )
+
+    def test_deal_is_shared_not_played(self):
+        """Test the dealt game is only forked, its cards shared by every variant"""
+        game = GameState()
+        game.setup_game(rng=random.Random(5))
+        snapshot = game.snapshot()
+
+        first = play_paired(game)
+        self.assertEqual(game.snapshot(), snapshot)
+        self.assertEqual(play_paired(game), first)
+
+
+class TestRuleComparison(unittest.TestCase):
+    """Test paired differences and their estimates"""
+
+    def test_differences_from_baseline(self):
+        """Test flips, deltas and paired errors against the per-deal results"""
+        seeds = range(200)
+        paired = list(iter_paired_games(seeds))
+        comparison = compare_rules(0, 200, workers=1)
+        baseline, *variants = comparison.summary()
+
+        self.assertEqual(comparison.deals, 200)
+        self.assertEqual(baseline["winner_flips"], 0)
+        self.assertEqual(baseline["delta_stderr"], 0)
+        self.assertIsNone(baseline["variance_reduction"])
+        for index, row in enumerate(variants, 1):
+            with self.subTest(rules=row["rules"]):
+                self.assertEqual(
+                    row["winner_flips"],
+                    sum(
+                        results[index].winner != results[0].winner for results in paired
+                    ),
+                )
+                self.assertAlmostEqual(
+                    row["rounds_delta_mean"],
+                    sum(results[index].rounds - results[0].rounds for results in paired)
+                    / 200,
+                )
+                self.assertAlmostEqual(
+                    row["win_rate_delta"],
+                    row["player1_win_rate"] - baseline["player1_win_rate"],
+                )
+                # The same deals move together, so pairing narrows the error
+                self.assertLess(row["delta_stderr"], row["independent_stderr"])
+                self.assertGreater(row["variance_reduction"], 1)
+
+    def test_independent_of_sharding(self):
+        """Test any split of the seeds gives the same comparison"""
+        serial = compare_rules(10, 70, workers=1).summary()
+        for pool in ("thread", "process"):
+            with self.subTest(pool=pool):
+                sharded = compare_rules(
+                    10, 70, workers=3, shard_size=7, pool=pool
+                ).summary()
+                for serial_row, sharded_row in zip(serial, sharded):
+                    for key, value in serial_row.items():
+                        if isinstance(value, float):
+                            self.assertAlmostEqual(sharded_row[key], value)
+                        else:
+                            self.assertEqual(sharded_row[key], value)
+
+    def test_merge_needs_same_rule_sets(self):
+        """Test comparisons of other rule sets aren't merged"""
+        with self.assertRaises(ValueError):
+            RuleComparison().merge(RuleComparison(RULE_SETS[:2]))
+        with self.assertRaises(ValueError):
+            compare_rules(0, 10, pool="fiber")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Tests for the round loops of each rule set.
+"""
+
+import unittest
+from types import SimpleNamespace
+from helper_functions import RULE_SETS, Card, Suit, GameState
+from rule_pipeline import (
+    play_battle_round,
+    play_combined_round,
+    play_plain_round,
+    play_suit_up_round,
+    round_function,
+)
+
+
+def _game(player_1_hand, player_2_hand):
+    """Game with these hands, bottom card first"""
+    return GameState.from_position((player_1_hand, (), player_2_hand, ()))
+
+
+def _counts():
+    return SimpleNamespace(wars=0, suit_ups=0, battles=0)
+
+
+def _codes(cards):
+    return [int(card) for card in cards]
+
+
+class _CallLog:
+    """Stands in for a TraceWriter, logging every call with copies of its cards"""
+
+    def __init__(self):
+        self.calls = []
+
+    def record_draw(self, player_1_played_cards, player_2_played_cards, start):
+        self.calls.append(
+            (
+                "draw",
+                _codes(player_1_played_cards),
+                _codes(player_2_played_cards),
+                start,
+            )
+        )
+
+    def record_outcome(self, comparison):
+        self.calls.append(("outcome", comparison))
+
+
+class TestCombinedRules(unittest.TestCase):
+    """Test suit up and battle with advantage played together"""
+
+    def test_same_suit_battle_from_bottom(self):
+        """Test a King and Queen of one suit battle from the bottom of the hands"""
+        player_1_hand = [
+            Card(14, Suit.HEARTS),
+            Card(3, Suit.DIAMONDS),
+            Card(9, Suit.SPADES),
+            Card(13, Suit.CLUBS),
+        ]
+        player_2_hand = [
+            Card(5, Suit.HEARTS),
+            Card(7, Suit.DIAMONDS),
+            Card(2, Suit.SPADES),
+            Card(12, Suit.CLUBS),
+        ]
+        game = _game(player_1_hand, player_2_hand)
+        counts = _counts()
+
+        self.assertIsNone(play_combined_round(game, counts))
+
+        self.assertEqual((counts.suit_ups, counts.battles), (0, 1))
+        self.assertEqual(
+            _codes(game.player1.discard),
+            _codes([player_1_hand[3], player_2_hand[3], player_2_hand[0]])
+            + _codes(player_1_hand[:1]),
+        )
+
+        # Without suit up the same battle is played from the top
+        game = _game(player_1_hand, player_2_hand)
+        play_battle_round(game, _counts())
+        self.assertEqual(
+            _codes(game.player1.discard),
+            _codes([player_1_hand[3], player_2_hand[3], player_2_hand[2]])
+            + _codes(player_1_hand[2:3]),
+        )
+
+    def test_battle_during_suit_up_from_bottom(self):
+        """Test a King vs Queen drawn in a suit up battles on from the bottom"""
+        player_1_hand = [
+            Card(3, Suit.DIAMONDS),
+            Card(13, Suit.HEARTS),
+            Card(14, Suit.SPADES),
+            Card(4, Suit.HEARTS),
+            Card(5, Suit.CLUBS),
+        ]
+        player_2_hand = [
+            Card(6, Suit.DIAMONDS),
+            Card(12, Suit.SPADES),
+            Card(8, Suit.HEARTS),
+            Card(2, Suit.HEARTS),
+            Card(9, Suit.CLUBS),
+        ]
+        game = _game(player_1_hand, player_2_hand)
+        counts = _counts()
+
+        play_combined_round(game, counts)
+
+        self.assertEqual((counts.suit_ups, counts.battles), (1, 1))
+        self.assertEqual(
+            _codes(game.player1.discard),
+            _codes(player_1_hand[4:] + player_1_hand[:2])
+            + _codes(player_2_hand[4:] + player_2_hand[:2])
+            + _codes([player_2_hand[2], player_1_hand[2]]),
+        )
+        self.assertEqual(_codes(game.player1.hand), _codes(player_1_hand[3:4]))
+        self.assertEqual(_codes(game.player2.hand), _codes(player_2_hand[3:4]))
+
+
+class TestRoundFunctions(unittest.TestCase):
+    """Test each rule set is played by its own loop"""
+
+    def test_one_loop_per_rule_set(self):
+        """Test the rule flags pick the loop written for them"""
+        self.assertIs(round_function(), play_plain_round)
+        self.assertIs(round_function(suit_up=True), play_suit_up_round)
+        self.assertIs(round_function(battle_advantage=True), play_battle_round)
+        self.assertIs(round_function(1, 1), play_combined_round)
+
+    def test_plain_loop_compares_ranks(self):
+        """Test plain War compares ranks only, whatever the suits"""
+        for player_1_card, player_2_card, winner_discard in [
+            (Card(10, Suit.CLUBS), Card(9, Suit.SPADES), 1),
+            (Card(9, Suit.SPADES), Card(10, Suit.CLUBS), 2),
+        ]:
+            game = _game([player_1_card], [player_2_card])
+            self.assertIsNone(play_plain_round(game, _counts()))
+            winner = game.player1 if winner_discard == 1 else game.player2
+            self.assertEqual(len(winner.discard), 2)
+
+        # Same rank, different suits: a war the player out of cards loses
+        game = _game(
+            [Card(7, Suit.CLUBS)], [Card(2, Suit.HEARTS), Card(7, Suit.SPADES)]
+        )
+        counts = _counts()
+        self.assertEqual(play_plain_round(game, counts), 2)
+        self.assertEqual(counts.wars, 1)
+
+    def test_same_trace_for_every_rule_set(self):
+        """Test a round no house rule changes is traced the same by every loop"""
+        # A war on the sevens, then the 9 beats the 4, no suits matching
+        player_1_hand = [
+            Card(9, Suit.CLUBS),
+            Card(2, Suit.HEARTS),
+            Card(3, Suit.HEARTS),
+            Card(5, Suit.CLUBS),
+            Card(7, Suit.CLUBS),
+        ]
+        player_2_hand = [
+            Card(4, Suit.SPADES),
+            Card(2, Suit.DIAMONDS),
+            Card(3, Suit.DIAMONDS),
+            Card(6, Suit.SPADES),
+            Card(7, Suit.SPADES),
+        ]
+        traces = []
+        for suit_up, battle_advantage in RULE_SETS:
+            trace = _CallLog()
+            winner = round_function(suit_up, battle_advantage)(
+                _game(player_1_hand, player_2_hand), _counts(), trace
+            )
+            self.assertIsNone(winner)
+            traces.append(trace.calls)
+
+        self.assertEqual(
+            traces[0],
+            [
+                ("draw", [int(Card(7, Suit.CLUBS))], [int(Card(7, Suit.SPADES))], 0),
+                ("outcome", 0),
+                ("draw", _codes(player_1_hand[::-1]), _codes(player_2_hand[::-1]), 1),
+                ("outcome", 1),
+            ],
+        )
+        for trace in traces[1:]:
+            self.assertEqual(trace, traces[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Tests for the asyncio session server, driven by a stand-in client.
+"""
+
+import asyncio
+import json
+import os
+import random
+import tempfile
+import unittest
+from dataclasses import asdict
+from unittest import mock
+from helper_functions import GameState
+from session_server import SessionManager, handle_connection, serve
+from simulation import play_game
+
+
+def _expected_result(seed, suit_up=False, battle_advantage=False):
+    game = GameState()
+    game.setup_game(rng=random.Random(seed))
+    return asdict(play_game(game, suit_up, battle_advantage))
+
+
+class _Client:
+    """Stand-in client sending one JSON request per line"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def play(self, seed, suit_up=False, battle_advantage=False):
+        """Play a game one step at a time, returning its events and result"""
+        response = await self.request(
+            op="new", seed=seed, suit_up=suit_up, battle_advantage=battle_advantage
+        )
+        session = response["session"]
+        events = []
+        while True:
+            response = await self.request(op="step", session=session)
+            if "result" in response:
+                return events, response["result"]
+            events.append(response["event"])
+            await asyncio.sleep(0)  # Let the other clients' games interleave
+
+    def close(self):
+        self.writer.close()
+
+
+class TestSessionManager(unittest.TestCase):
+    """Test sessions without a connection"""
+
+    def test_steps_play_the_whole_game(self):
+        """Test stepping a session plays the same game as play_game"""
+        manager = SessionManager()
+        session = manager.new_session(seed=4, suit_up=True, battle_advantage=True)
+        events = []
+        while "result" not in (response := manager.step(session)):
+            events.append(response["event"])
+
+        expected = _expected_result(4, True, True)
+        self.assertEqual(response["result"], expected)
+        self.assertEqual(len(events), expected["rounds"])
+        self.assertEqual(sum(event["wars"] for event in events), expected["wars"])
+        self.assertEqual(manager.sessions, {})
+
+    def test_thousands_of_paused_sessions(self):
+        """Test many games stay paused in memory, each stepped independently"""
+        manager = SessionManager()
+        sessions = [manager.new_session(seed) for seed in range(2000)]
+        for session in sessions[::2]:
+            manager.step(session)
+
+        stats = manager.stats()
+        self.assertEqual((stats["sessions"], stats["steps"]), (2000, 1000))
+        self.assertLess(stats["memory_per_session"], 16384)
+        self.assertGreater(stats["p99_step_us"], 0)
+        self.assertLessEqual(stats["p50_step_us"], stats["p99_step_us"])
+        self.assertEqual(
+            manager.sessions[sessions[1]].game_state.round_number,
+            manager.sessions[sessions[0]].game_state.round_number,
+        )
+
+    def test_errors(self):
+        """Test bad requests get an error response, not an exception"""
+        manager = SessionManager(max_sessions=1)
+        manager.handle({"op": "new"})
+
+        for request in (
+            {"op": "step", "session": 99},
+            {"op": "step"},
+            {"op": "close", "session": [1]},
+            {"op": "new"},
+            {"op": "fold"},
+        ):
+            with self.subTest(request=request):
+                self.assertIn("error", manager.handle(request))
+
+
+class TestSessionServer(unittest.IsolatedAsyncioTestCase):
+    """Test serving many clients at once over TCP and a Unix socket"""
+
+    async def _play_concurrently(self, connect):
+        games = [(seed, seed % 2 == 0, seed % 3 == 0) for seed in range(12)]
+        clients = [_Client(*await connect()) for _ in range(4)]
+
+        async def play_games(client, client_games):
+            return [await client.play(*game) for game in client_games]
+
+        played = await asyncio.gather(
+            *(
+                play_games(client, games[index :: len(clients)])
+                for index, client in enumerate(clients)
+            )
+        )
+        stats = await clients[0].request(op="stats")
+        for client in clients:
+            client.close()
+
+        for index, client_games in enumerate(played):
+            for game, (events, result) in zip(
+                games[index :: len(clients)], client_games
+            ):
+                self.assertEqual(result, _expected_result(*game))
+                self.assertEqual(len(events), result["rounds"])
+        self.assertEqual(stats["sessions"], 0)
+        self.assertEqual(
+            stats["steps"], sum(_expected_result(*game)["rounds"] + 1 for game in games)
+        )
+
+    async def test_tcp(self):
+        """Test concurrent clients over TCP each get their own games"""
+        server = await serve(SessionManager(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            await self._play_concurrently(
+                lambda: asyncio.open_connection("127.0.0.1", port)
+            )
+
+    @unittest.skipUnless(hasattr(asyncio, "open_unix_connection"), "No Unix sockets")
+    async def test_unix_socket(self):
+        """Test concurrent clients over a Unix socket each get their own games"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "war.sock")
+            server = await serve(SessionManager(), path=path)
+            async with server:
+                await self._play_concurrently(
+                    lambda: asyncio.open_unix_connection(path)
+                )
+
+    async def test_sessions_outlive_connections(self):
+        """Test a game can be carried on from a new connection"""
+        server = await serve(SessionManager(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            first = _Client(*await asyncio.open_connection("127.0.0.1", port))
+            session = (await first.request(op="new", seed=2))["session"]
+            await first.request(op="step", session=session)
+            first.close()
+
+            second = _Client(*await asyncio.open_connection("127.0.0.1", port))
+            response = await second.request(op="step", session=session)
+            invalid = await second.request(op="step", session="x")
+            second.writer.write(b"not json\n")
+            not_json = json.loads(await second.reader.readline())
+            second.close()
+
+        self.assertEqual(response["event"]["round"], 2)
+        self.assertIn("error", invalid)
+        self.assertIn("error", not_json)
+
+    async def test_connection_closed_after_flushing(self):
+        """Test a finished connection waits for its transport to close"""
+        for close_error in (None, ConnectionResetError()):
+            with self.subTest(close_error=close_error):
+                reader = asyncio.StreamReader()
+                reader.feed_data(b'{"op": "stats"}\n')
+                reader.feed_eof()
+                writer = mock.Mock(
+                    drain=mock.AsyncMock(),
+                    wait_closed=mock.AsyncMock(side_effect=close_error),
+                )
+
+                await handle_connection(SessionManager(), reader, writer)
+
+                self.assertEqual(writer.write.call_count, 1)
+                writer.close.assert_called_once_with()
+                writer.wait_closed.assert_awaited_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
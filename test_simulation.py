@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""
+Tests for the headless batch simulation API.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from helper_functions import (
+    DEAL_COUNT,
+    ORDERED_DECK,
+    RULE_SETS,
+    Card,
+    Suit,
+    GameMetrics,
+    GameState,
+    canonical_deal,
+    rank_deal,
+)
+from simulation import (
+    CYCLE,
+    ROUND_LIMIT,
+    BatchTotals,
+    GameResult,
+    estimate_rate,
+    iter_deal_games,
+    iter_rounds,
+    iter_seeded_games,
+    play_game,
+    run_seed_range,
+    simulate_games,
+    stratified_deal_ids,
+    wilson_interval,
+)
+
+
+class TestPlayGame(unittest.TestCase):
+    """Test playing a single headless game"""
+
+    def test_ordered_deck_game_finishes(self):
+        """Test an ordered deck plays to completion with a consistent result"""
+        game = GameState()
+        game.setup_game(shuffle_deck=False)
+
+        result = play_game(game)
+
+        self.assertIn(result.winner, (0, 1, 2))
+        self.assertEqual(result.rounds, game.round_number)
+        self.assertEqual(result.suit_ups, 0)  # Suit up is off
+        self.assertEqual(result.battles, 0)  # Battle with advantage is off
+
+    def test_loser_is_out_of_cards(self):
+        """Test the losing player has no cards left when the game ends"""
+        random.seed(7)
+        game = GameState()
+        game.setup_game(shuffle_deck=True)
+
+        result = play_game(game, suit_up=True, battle_advantage=True)
+
+        if result.winner in (1, 2):
+            loser = game.player2 if result.winner == 1 else game.player1
+            self.assertFalse(loser.has_cards())
+
+    def test_war_is_counted(self):
+        """Test a single forced war shows up in the mechanic counts"""
+        game = GameState()
+        # Top card is the last card in the hand
+        game.player1.hand.extend(
+            [Card(14, Suit.CLUBS), Card(4, Suit.CLUBS), Card(3, Suit.CLUBS)]
+            + [Card(2, Suit.CLUBS), Card(9, Suit.CLUBS)]
+        )
+        game.player2.hand.extend(
+            [Card(5, Suit.HEARTS), Card(6, Suit.HEARTS), Card(7, Suit.HEARTS)]
+            + [Card(8, Suit.HEARTS), Card(9, Suit.HEARTS)]
+        )
+
+        metrics = game.enable_metrics()
+
+        result = play_game(game)
+
+        self.assertEqual(result, GameResult(1, 1, 1, 0, 0))
+        self.assertEqual(metrics.draws, 10)
+        self.assertEqual(metrics.war_chains, {1: 1})
+        self.assertEqual((metrics.games, metrics.empty_hand_endings), (1, 0))
+
+    def test_metrics_match_results(self):
+        """Test shared metrics total the mechanic counts of every game"""
+        metrics = GameMetrics()
+        results = []
+        for seed in range(30):
+            game = GameState()
+            game.setup_game(shuffle_deck=True, rng=random.Random(seed))
+            game.enable_metrics(metrics)
+            results.append(play_game(game, suit_up=True, battle_advantage=True))
+
+        self.assertEqual(metrics.games, 30)
+        self.assertEqual(metrics.rounds, sum(r.rounds for r in results))
+        self.assertEqual(metrics.wars, sum(r.wars for r in results))
+        self.assertEqual(metrics.suit_ups, sum(r.suit_ups for r in results))
+        self.assertEqual(metrics.battles, sum(r.battles for r in results))
+        self.assertEqual(
+            sum(depth * rounds for depth, rounds in metrics.war_chains.items()),
+            metrics.wars,
+        )
+
+
+class TestIterRounds(unittest.TestCase):
+    """Test playing a game lazily, one round event at a time"""
+
+    def _seeded_game(self, seed):
+        game = GameState()
+        game.setup_game(shuffle_deck=True, rng=random.Random(seed))
+        return game
+
+    def test_war_round_event(self):
+        """Test a forced war is reported as one round with every card played"""
+        game = GameState()
+        game.player1.hand.extend(
+            [Card(14, Suit.CLUBS), Card(4, Suit.CLUBS), Card(3, Suit.CLUBS)]
+            + [Card(2, Suit.CLUBS), Card(9, Suit.CLUBS)]
+        )
+        game.player2.hand.extend(
+            [Card(5, Suit.HEARTS), Card(6, Suit.HEARTS), Card(7, Suit.HEARTS)]
+            + [Card(8, Suit.HEARTS), Card(9, Suit.HEARTS)]
+        )
+
+        (event,) = iter_rounds(game)
+
+        self.assertEqual(
+            [str(card) for card in event.player_1_cards],
+            ["9c", "2c", "3c", "4c", "Ac"],
+        )
+        self.assertEqual((event.round, event.outcome, event.winner), (1, 1, 1))
+        self.assertEqual((event.wars, event.suit_ups, event.battle), (1, 0, False))
+        self.assertEqual(event.pile_sizes, (0, 10, 0, 0))
+
+    def test_events_add_up_to_result(self):
+        """Test the events and returned result match play_game"""
+        for seed in range(10):
+            rounds = iter_rounds(self._seeded_game(seed), True, True)
+            events = []
+            while True:
+                try:
+                    events.append(next(rounds))
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+
+            expected = play_game(self._seeded_game(seed), True, True)
+            self.assertEqual(result, expected)
+            self.assertEqual(
+                [event.round for event in events], list(range(1, expected.rounds + 1))
+            )
+            self.assertEqual(sum(event.wars for event in events), expected.wars)
+            self.assertEqual(sum(event.suit_ups for event in events), expected.suit_ups)
+            self.assertEqual(sum(event.battle for event in events), expected.battles)
+
+    def test_metrics_match_play_game(self):
+        """Test a game played round by round counts the same metrics as play_game"""
+        lazy, eager = GameMetrics(), GameMetrics()
+        for seed in range(10):
+            game = self._seeded_game(seed)
+            game.enable_metrics(lazy)
+            for _ in iter_rounds(game, True, True):
+                pass
+            game = self._seeded_game(seed)
+            game.enable_metrics(eager)
+            play_game(game, True, True)
+
+        self.assertEqual(lazy.as_dict(), eager.as_dict())
+        self.assertEqual(lazy.games, 10)
+        self.assertTrue(lazy.war_chains)
+
+    def test_stop_early(self):
+        """Test a consumer can stop after any round, leaving the game where it was"""
+        game = self._seeded_game(0)
+        for event in iter_rounds(game):
+            if event.round == 5:
+                break
+
+        self.assertEqual(game.round_number, 5)
+        self.assertEqual(game.pile_sizes(), event.pile_sizes)
+
+
+class TestSnapshots(unittest.TestCase):
+    """Test branching and resuming games from the middle"""
+
+    def _game_after(self, seed, rounds):
+        game = GameState()
+        game.setup_game(rng=random.Random(seed))
+        self.assertEqual(play_game(game, max_rounds=rounds).winner, ROUND_LIMIT)
+        self.assertEqual(game.round_number, rounds + 1)
+        return game
+
+    def test_fork_under_other_rules(self):
+        """Test forks of one position play on under their own rules"""
+        game = self._game_after(3, 40)
+        snapshot = game.snapshot()
+        with_suit_up = play_game(game.fork(), suit_up=True)
+        without_rules = play_game(game.fork())
+
+        self.assertEqual(
+            with_suit_up, play_game(GameState.from_snapshot(snapshot), True)
+        )
+        self.assertEqual(without_rules, play_game(game))
+        self.assertNotEqual(with_suit_up.rounds, without_rules.rounds)
+
+    def test_play_on_after_round_limit(self):
+        """Test a game stopped at max_rounds plays on to the result it would have had"""
+        game = GameState()
+        game.setup_game(rng=random.Random(1))
+        expected = play_game(game.fork(), suit_up=True)
+
+        for max_rounds in (30, 60):
+            stopped = play_game(game, suit_up=True, max_rounds=max_rounds)
+            self.assertEqual(
+                (stopped.winner, stopped.rounds), (ROUND_LIMIT, max_rounds)
+            )
+        result = play_game(game, suit_up=True)
+
+        self.assertEqual(
+            (result.winner, result.rounds), (expected.winner, expected.rounds)
+        )
+
+    def test_checkpoint_resume(self):
+        """Test a game resumed from a checkpoint finishes like the original"""
+        game = GameState()
+        game.setup_game(rng=random.Random(1))
+        expected = play_game(game)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.checkpoint")
+            self._game_after(1, 100).save_checkpoint(path)
+            self.assertEqual(os.listdir(directory), ["game.checkpoint"])
+            result = play_game(GameState.load_checkpoint(path))
+
+        self.assertEqual(
+            (result.winner, result.rounds), (expected.winner, expected.rounds)
+        )
+
+
+class TestCanonicalDeals(unittest.TestCase):
+    """Test equivalent deals play out the same"""
+
+    def test_canonical_deal_same_result(self):
+        """Test a deal and its representative give the same result under every rule set"""
+        for seed in range(15):
+            deck = list(ORDERED_DECK)
+            random.Random(seed).shuffle(deck)
+            for suit_up in (False, True):
+                for battle_advantage in (False, True):
+                    results = []
+                    for cards in (deck, canonical_deal(deck, suit_up)):
+                        game = GameState()
+                        game.player1.hand.extend(cards[0::2])
+                        game.player2.hand.extend(cards[1::2])
+                        results.append(play_game(game, suit_up, battle_advantage))
+                    self.assertEqual(results[0], results[1])
+
+
+class TestDealIds(unittest.TestCase):
+    """Test playing and sampling deals by ID"""
+
+    def test_deal_ids_play_the_seeded_games(self):
+        """Test a seeded deal played by its ID gives the same result"""
+        ids = []
+        for seed in range(10):
+            deck = list(ORDERED_DECK)
+            random.Random(seed).shuffle(deck)
+            ids.append(rank_deal(deck))
+
+        self.assertEqual(
+            list(iter_deal_games(ids, suit_up=True)),
+            list(iter_seeded_games(range(10), suit_up=True)),
+        )
+
+    def test_stratified_deal_ids(self):
+        """Test one reproducible ID per stratum, however the strata are split"""
+        ids = list(stratified_deal_ids(0, 8, strata=8, seed=3))
+
+        for stratum, deal_id in enumerate(ids):
+            self.assertGreaterEqual(deal_id, DEAL_COUNT * stratum // 8)
+            self.assertLess(deal_id, DEAL_COUNT * (stratum + 1) // 8)
+        split = list(stratified_deal_ids(0, 5, 8, seed=3))
+        split += list(stratified_deal_ids(5, 8, 8, seed=3))
+        self.assertEqual(split, ids)
+        self.assertNotEqual(list(stratified_deal_ids(0, 8, 8, seed=4)), ids)
+
+
+class TestCycles(unittest.TestCase):
+    """Test games that would never end"""
+
+    # Repeats every 12 rounds from round 13 with no house rules
+    PLAYER_1_HAND = [
+        Card(8, Suit.HEARTS),
+        Card(14, Suit.DIAMONDS),
+        Card(13, Suit.HEARTS),
+        Card(4, Suit.CLUBS),
+        Card(6, Suit.HEARTS),
+        Card(4, Suit.DIAMONDS),
+        Card(13, Suit.SPADES),
+        Card(2, Suit.HEARTS),
+        Card(5, Suit.SPADES),
+    ]
+    PLAYER_2_HAND = [Card(13, Suit.CLUBS), Card(12, Suit.DIAMONDS)]
+
+    def _new_game(self):
+        return GameState.from_position((self.PLAYER_1_HAND, (), self.PLAYER_2_HAND, ()))
+
+    def _position_after(self, rounds):
+        game = self._new_game()
+        result = play_game(game, max_rounds=rounds)
+        self.assertEqual(result.winner, ROUND_LIMIT)
+        return game.position_key()
+
+    def test_cycle_is_reported(self):
+        """Test a cycling game stops early with its cycle start and length"""
+        result = play_game(self._new_game())
+
+        self.assertEqual(result.winner, CYCLE)
+        self.assertEqual((result.cycle_start, result.cycle_length), (13, 12))
+        self.assertLess(result.rounds, 13 + 2 * 12)
+
+    def test_cycle_start_and_length_match_replay(self):
+        """Test the position before round 13 is the first one to come back 12 rounds later"""
+        self.assertEqual(self._position_after(12), self._position_after(24))
+        self.assertNotEqual(self._position_after(11), self._position_after(23))
+        for rounds in range(13, 24):
+            self.assertNotEqual(self._position_after(12), self._position_after(rounds))
+
+    def test_cycle_found_after_resuming(self):
+        """Test a game resumed before its cycle reports the cycle in game rounds"""
+        game = self._new_game()
+        play_game(game, max_rounds=5)
+
+        result = play_game(GameState.from_snapshot(game.snapshot()))
+
+        self.assertEqual(result.winner, CYCLE)
+        self.assertEqual((result.cycle_start, result.cycle_length), (13, 12))
+
+    def test_suit_up_cycles_compare_suits(self):
+        """Test suit up positions only repeat if every card's suit matches too"""
+        # Comparing cards by value alone saw a cycle from round 4 every 4 rounds
+        player_1_hand = [
+            Card(11, Suit.CLUBS),
+            Card(3, Suit.CLUBS),
+            Card(10, Suit.SPADES),
+        ]
+        player_2_hand = [
+            Card(3, Suit.HEARTS),
+            Card(10, Suit.DIAMONDS),
+            Card(5, Suit.DIAMONDS),
+            Card(12, Suit.HEARTS),
+        ]
+        result = play_game(
+            GameState.from_position((player_1_hand, (), player_2_hand, ())),
+            suit_up=True,
+        )
+        self.assertEqual((result.winner, result.rounds), (2, 8))
+
+        # Repeats every 8 rounds from round 2, by value every 4
+        position = (
+            [Card(10, Suit.HEARTS), Card(14, Suit.SPADES), Card(3, Suit.CLUBS)],
+            (),
+            [
+                Card(3, Suit.DIAMONDS),
+                Card(11, Suit.HEARTS),
+                Card(13, Suit.HEARTS),
+                Card(9, Suit.SPADES),
+                Card(2, Suit.CLUBS),
+            ],
+            (),
+        )
+        result = play_game(GameState.from_position(position), suit_up=True)
+        self.assertEqual(result.winner, CYCLE)
+        self.assertEqual((result.cycle_start, result.cycle_length), (2, 8))
+
+        def key_after(rounds):
+            game = GameState.from_position(position)
+            play_game(game, suit_up=True, max_rounds=rounds)
+            return game.position_key()
+
+        self.assertEqual(key_after(1), key_after(9))
+        self.assertNotEqual(key_after(1), key_after(5))
+
+    def test_round_limit(self):
+        """Test max_rounds stops a game that has not finished"""
+        game = GameState()
+        game.setup_game(shuffle_deck=False)
+
+        result = play_game(game, max_rounds=5)
+
+        self.assertEqual(result.winner, ROUND_LIMIT)
+        self.assertEqual(result.rounds, 5)
+
+    def test_totals_count_cycles_and_round_limits(self):
+        """Test cycles and stopped games are not counted as draws"""
+        totals = BatchTotals()
+        totals.add_result(play_game(self._new_game()))
+        totals.add_result(GameResult(ROUND_LIMIT, 10, 0, 0, 0))
+
+        self.assertEqual((totals.cycles, totals.round_limits, totals.draws), (1, 1, 0))
+
+
+class TestSimulateGames(unittest.TestCase):
+    """Test running games in batches"""
+
+    def test_returns_one_result_per_game(self):
+        """Test the batch API returns a result for every game played"""
+        random.seed(42)
+        results = simulate_games(25, suit_up=True, battle_advantage=True)
+
+        self.assertEqual(len(results), 25)
+        for result in results:
+            self.assertIsInstance(result, GameResult)
+            self.assertGreater(result.rounds, 0)
+
+    def test_batches_are_reproducible_with_seeded_random(self):
+        """Test the same global seed produces the same batch"""
+        random.seed(3)
+        first = simulate_games(10)
+        random.seed(3)
+        second = simulate_games(10)
+
+        self.assertEqual(first, second)
+
+
+class TestThreadPool(unittest.TestCase):
+    """Stress the thread pool runner against serial runs"""
+
+    def setUp(self):
+        # Switch threads as often as possible to shake out any shared state
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+
+    def test_totals_match_serial(self):
+        """Test one game per shard across many threads gives the serial totals"""
+        for rules in RULE_SETS:
+            with self.subTest(rules=rules):
+                serial = run_seed_range(0, 120, *rules, workers=1)
+                threaded = run_seed_range(
+                    0, 120, *rules, workers=8, shard_size=1, pool="thread"
+                )
+                self.assertEqual(threaded, serial)
+
+    def test_files_match_serial(self):
+        """Test traces, results and the cache written by threads match a serial run"""
+        outputs = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, options in (
+                ("serial", dict(workers=1)),
+                ("threaded", dict(workers=6, shard_size=2, pool="thread")),
+            ):
+                path = os.path.join(directory, name)
+                totals = run_seed_range(
+                    0,
+                    60,
+                    True,
+                    True,
+                    trace_path=path + ".trace",
+                    results_path=path + ".csv",
+                    results_format="csv",
+                    cache_path=path + ".sqlite",
+                    **options,
+                )
+                files = []
+                for extension in (".trace", ".csv"):
+                    with open(path + extension, "rb") as output:
+                        files.append(output.read())
+                outputs[name] = totals, files
+
+        self.assertEqual(outputs["threaded"], outputs["serial"])
+
+    def test_unknown_pool(self):
+        """Test asking for a pool that doesn't exist fails"""
+        with self.assertRaises(ValueError):
+            run_seed_range(0, 10, pool="fiber")
+
+
+class TestSeededBatches(unittest.TestCase):
+    """Test seeded batches and the process pool runner"""
+
+    def test_seeded_games_ignore_global_random(self):
+        """Test a game's deal depends only on its own seed"""
+        random.seed(1)
+        first = list(iter_seeded_games([10, 11, 12]))
+        random.seed(2)
+        second = list(iter_seeded_games([10, 11, 12]))
+
+        self.assertEqual(first, second)
+
+    def test_totals_match_individual_results(self):
+        """Test the totals add up the per-game results"""
+        results = list(iter_seeded_games(range(20), suit_up=True))
+        totals = run_seed_range(0, 20, suit_up=True, workers=1)
+
+        self.assertEqual(totals.games, 20)
+        self.assertEqual(
+            totals.player1_wins + totals.player2_wins + totals.draws, totals.games
+        )
+        self.assertEqual(totals.rounds, sum(r.rounds for r in results))
+        self.assertEqual(totals.suit_ups, sum(r.suit_ups for r in results))
+
+    def test_totals_independent_of_worker_count(self):
+        """Test the same seed range gives the same totals however it is split"""
+        serial = run_seed_range(100, 160, battle_advantage=True, workers=1)
+        parallel = run_seed_range(
+            100, 160, battle_advantage=True, workers=3, shard_size=7
+        )
+
+        self.assertEqual(serial, parallel)
+
+    def test_merge(self):
+        """Test merging totals from two shards"""
+        first = BatchTotals(games=2, player1_wins=1, player2_wins=1, rounds=30)
+        second = BatchTotals(games=1, draws=1, rounds=5, wars=2)
+
+        first.merge(second)
+
+        self.assertEqual(
+            first,
+            BatchTotals(
+                games=3, player1_wins=1, player2_wins=1, draws=1, rounds=35, wars=2
+            ),
+        )
+
+
+class TestEstimateRate(unittest.TestCase):
+    """Test playing batches until a rate's confidence interval is narrow enough"""
+
+    def test_stops_once_precise(self):
+        """Test the estimate stops at the margin, reproducibly from its seeds"""
+        estimate = estimate_rate(
+            0.05, 0.95, suit_up=True, start_seed=50, batch_size=100, workers=1
+        )
+
+        self.assertTrue(estimate.converged)
+        self.assertLessEqual(estimate.margin, 0.05)
+        self.assertGreater(estimate.batches, 1)
+        # Sized from the rate, not run out 100 games at a time
+        self.assertLess(estimate.batches, 5)
+        self.assertLess(estimate.games, 1000)
+        totals = run_seed_range(50, 50 + estimate.games, suit_up=True, workers=1)
+        self.assertEqual(estimate.totals, totals)
+        self.assertEqual(estimate.rate, totals.player1_wins / totals.games)
+        self.assertLessEqual(estimate.low, estimate.rate)
+        self.assertLessEqual(estimate.rate, estimate.high)
+        self.assertGreater(estimate.seconds, 0)
+
+    def test_loose_margin_stops_early(self):
+        """Test the first batch is no bigger than the widest interval needs"""
+        estimate = estimate_rate(0.1, 0.95, workers=1)
+
+        # 1.96² * 0.5² / 0.1² games get a 50% rate to within ±10%
+        self.assertEqual((estimate.games, estimate.batches), (97, 1))
+        self.assertTrue(estimate.converged)
+
+    def test_stops_at_max_games(self):
+        """Test max_games caps a margin that would take too many games"""
+        estimate = estimate_rate(
+            0.001, winner=2, batch_size=30, max_games=50, workers=1
+        )
+
+        self.assertFalse(estimate.converged)
+        self.assertEqual((estimate.games, estimate.batches), (50, 2))
+        self.assertEqual(estimate.rate, estimate.totals.player2_wins / 50)
+        with self.assertRaises(ValueError):
+            estimate_rate(0.01, winner=3)
+        with self.assertRaises(ValueError):
+            estimate_rate(0.01, confidence=1)
+        with self.assertRaises(ValueError):
+            estimate_rate(0.01, max_games=0)
+
+    def test_wilson_interval(self):
+        """Test the interval against a known value and at the edges"""
+        low, high = wilson_interval(50, 100, 1.959964)
+        self.assertAlmostEqual(low, 0.4038, places=4)
+        self.assertAlmostEqual(high, 0.5962, places=4)
+        low, high = wilson_interval(0, 100, 1.959964)
+        self.assertEqual(low, 0)
+        self.assertGreater(high, 0)
+        self.assertEqual(wilson_interval(0, 0, 2), (0.0, 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the NumPy lockstep engine, checked against the object engine.
+"""
+
+import random
+import unittest
+from helper_functions import DEAL_COUNT, GameState, rank_deal, unrank_deal
+from simulation import iter_seeded_games, run_seed_range
+from vector_engine import (
+    LockstepBatch,
+    deal_ids,
+    deals_from_ids,
+    deals_from_seeds,
+    simulate_deals,
+    simulate_seed_range,
+)
+
+
+class TestDeals(unittest.TestCase):
+    """Test deals are built the same way as GameState.setup_game"""
+
+    def test_deals_match_seeded_setup(self):
+        """Test each seeded deal gives both players the same hands"""
+        deals = deals_from_seeds([5, 6])
+        for seed, deal in zip([5, 6], deals):
+            game = GameState()
+            game.setup_game(shuffle_deck=True, rng=random.Random(seed))
+
+            self.assertEqual(list(game.player1.hand), list(deal[0::2]))
+            self.assertEqual(list(game.player2.hand), list(deal[1::2]))
+
+    def test_batched_deal_ids_match_scalar(self):
+        """Test batched ranking and unranking agree with the one-deck versions"""
+        deals = deals_from_seeds(range(20))
+        ids = deal_ids(deals)
+
+        self.assertEqual(ids, [rank_deal(deal.tolist()) for deal in deals])
+        self.assertTrue((deals_from_ids(ids) == deals).all())
+        edges = deals_from_ids([0, DEAL_COUNT - 1])
+        self.assertEqual(edges.tolist(), [unrank_deal(0), unrank_deal(DEAL_COUNT - 1)])
+        self.assertEqual(deals_from_ids([]).shape, (0, 52))
+
+
+class TestLockstepEngine(unittest.TestCase):
+    """Test the lockstep engine plays exactly the same games as play_game"""
+
+    def assert_matches_object_engine(self, seeds, suit_up, battle_advantage):
+        expected = list(iter_seeded_games(seeds, suit_up, battle_advantage))
+        results = simulate_deals(deals_from_seeds(seeds), suit_up, battle_advantage)
+
+        self.assertEqual(results.to_game_results(), expected)
+
+    def test_no_house_rules(self):
+        """Test plain War games match"""
+        self.assert_matches_object_engine(range(200), False, False)
+
+    def test_suit_up(self):
+        """Test games with suit up match"""
+        self.assert_matches_object_engine(range(200), True, False)
+
+    def test_battle_with_advantage(self):
+        """Test games with battle with advantage match"""
+        self.assert_matches_object_engine(range(200), False, True)
+
+    def test_both_house_rules(self):
+        """Test games with both house rules match"""
+        self.assert_matches_object_engine(range(200), True, True)
+
+    def test_round_limit(self):
+        """Test games stopped by max_rounds match"""
+        seeds = range(50)
+        expected = list(iter_seeded_games(seeds, max_rounds=40))
+        results = simulate_deals(deals_from_seeds(seeds), max_rounds=40)
+
+        self.assertEqual(results.to_game_results(), expected)
+        self.assertGreater(results.totals().round_limits, 0)
+
+    def test_step_advances_one_round(self):
+        """Test a single step plays exactly one round of every game"""
+        batch = LockstepBatch(deals_from_seeds(range(10)))
+        batch.step()
+
+        self.assertTrue(batch.active.all())  # No game ends in round 1
+        self.assertEqual(list(batch.rounds), [2] * 10)
+
+    def test_seed_range_totals(self):
+        """Test seed range totals match the process pool runner"""
+        self.assertEqual(
+            simulate_seed_range(0, 50, suit_up=True, batch_size=16),
+            run_seed_range(0, 50, suit_up=True, workers=1),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
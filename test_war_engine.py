@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Tests for the logging game engine and the command line entry point.
+"""
+
+import io
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from game_trace import TraceWriter, render_trace
+from helper_functions import GameMetrics, GameState
+from outcome_cache import OutcomeCache
+from simulation import iter_seeded_games, play_game
+from war_engine import play_war
+import war_game
+
+
+def _messages(logs):
+    """Logged messages as formatted when emitted, the played card lists change later"""
+    return [line.split(":", 2)[2] for line in logs.output]
+
+
+class TestPlayWar(unittest.TestCase):
+    """Test playing a logged game with explicit rules"""
+
+    def test_same_games_as_simulation(self):
+        """Test play_war plays the same game as the headless engine for a seed"""
+        for suit_up, battle_advantage in [(False, False), (True, True)]:
+            expected = iter_seeded_games(range(10), suit_up, battle_advantage)
+            for seed, result in zip(range(10), expected):
+                winner = play_war(
+                    suit_up=suit_up,
+                    battle_advantage=battle_advantage,
+                    verbosity="none",
+                    rng=random.Random(seed),
+                )
+                self.assertEqual(winner, result.winner)
+
+    def test_metrics_match_simulation(self):
+        """Test play_war counts the same mechanics as the headless engine"""
+        logged, headless = GameMetrics(), GameMetrics()
+        for seed in range(10):
+            play_war(
+                suit_up=True,
+                battle_advantage=True,
+                verbosity="none",
+                rng=random.Random(seed),
+                metrics=logged,
+            )
+            game = GameState()
+            game.setup_game(shuffle_deck=True, rng=random.Random(seed))
+            game.enable_metrics(headless)
+            play_game(game, suit_up=True, battle_advantage=True)
+
+        self.assertEqual(logged.as_dict(), headless.as_dict())
+        self.assertEqual(logged.games, 10)
+
+    def test_round_log(self):
+        """Test every round is logged followed by the result"""
+        result = next(iter_seeded_games([3]))
+        with self.assertLogs(level=logging.INFO) as logs:
+            play_war(rng=random.Random(3))
+
+        lines = _messages(logs)
+        self.assertEqual(lines[0], "---- Round 1 ----")
+        self.assertEqual(lines.count("---- Round 2 ----"), 1)
+        self.assertEqual(
+            lines[-1], f"Player {result.winner} Wins in {result.rounds} rounds!"
+        )
+
+    def test_summary_verbosity(self):
+        """Test summary verbosity only logs the result"""
+        with self.assertLogs(level=logging.INFO) as logs:
+            play_war(verbosity="summary", rng=random.Random(3))
+
+        self.assertEqual(len(logs.records), 1)
+
+    def test_trace_renders_as_log(self):
+        """Test a traced game renders back to exactly the lines it logged"""
+        trace_file = io.BytesIO()
+        with self.assertLogs(level=logging.INFO) as logs:
+            play_war(
+                suit_up=True,
+                battle_advantage=True,
+                trace=TraceWriter(trace_file),
+                rng=random.Random(11),
+            )
+        trace_file.seek(0)
+
+        self.assertEqual(
+            list(render_trace(trace_file)),
+            _messages(logs),
+        )
+
+
+class _MessageList(logging.Handler):
+    """Collects the messages of one game's logger"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _logged_game(seed):
+    """Winner and log lines of a game logged to its own logger"""
+    log = logging.getLogger(f"test_war_engine.game{seed}")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    handler = _MessageList()
+    log.addHandler(handler)
+    try:
+        winner = play_war(True, True, rng=random.Random(seed), log=log)
+    finally:
+        log.removeHandler(handler)
+    return winner, handler.messages
+
+
+class TestConcurrentGames(unittest.TestCase):
+    """Test logged games played in several threads at once"""
+
+    def test_games_log_separately(self):
+        """Test every game logs exactly its own rounds while others play"""
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+        seeds = range(24)
+        serial = [_logged_game(seed) for seed in seeds]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            threaded = list(executor.map(_logged_game, seeds))
+
+        self.assertEqual(threaded, serial)
+        for (winner, messages), result in zip(
+            serial, iter_seeded_games(seeds, True, True)
+        ):
+            self.assertEqual(winner, result.winner)
+            self.assertEqual(messages.count("---- Round 1 ----"), 1)
+
+
+class TestCommandLine(unittest.TestCase):
+    """Test the war_game entry point"""
+
+    def test_import_has_no_side_effects(self):
+        """Test importing war_game neither parses sys.argv nor configures logging"""
+        code = (
+            "import logging, sys; sys.argv = ['war_game.py', '--bogus']; "
+            "import war_game; root = logging.getLogger(); "
+            "print(root.level, root.handlers)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout
+
+        self.assertEqual(output.strip(), f"{logging.WARNING} []")
+
+    def test_batch_summary_to_output_file(self):
+        """Test a batch run writes its summary to the --output log"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "batch.log")
+            war_game.main(
+                ["--games", "20", "--seed", "0", "--workers", "1", "--output", path]
+            )
+
+            with open(path) as log_file:
+                lines = log_file.read().splitlines()
+        self.assertEqual(lines[0], "Played 20 games (seeds 0-19)")
+
+    def test_margin_summary_to_output_file(self):
+        """Test --margin logs the estimate and the games it took"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "estimate.log")
+            war_game.main(["--margin", "0.2", "--seed", "0", "--output", path])
+
+            with open(path) as log_file:
+                lines = log_file.read().splitlines()
+        self.assertTrue(lines[0].startswith("Player 1 win rate: "))
+        self.assertIn("at 99% confidence", lines[0])
+        # A 50% rate needs 42 games for ±20% at 99% confidence, no more are played
+        self.assertRegex(lines[1], r"^Played 42 games \(seeds 0-41\) in .*, 1 batch$")
+
+    def test_compare_rules_to_output_file(self):
+        """Test --compare-rules logs one line per rule set"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "compare.log")
+            war_game.main(
+                ["--compare-rules", "--games", "20", "--seed", "0", "--output", path]
+            )
+
+            with open(path) as log_file:
+                lines = log_file.read().splitlines()
+        self.assertEqual(lines[0], "Played 20 deals (seeds 0-19) under each rule set")
+        self.assertEqual(
+            [line.split(":")[0] for line in lines[1:]],
+            ["plain", "suit-up", "battle-advantage", "suit-up+battle-advantage"],
+        )
+        self.assertIn("winner flips", lines[-1])
+
+    def test_unsupported_options_rejected(self):
+        """Test options a mode can't honour are refused instead of ignored"""
+        for argv in [
+            ["--margin", "0.2", "--trace", "games.trace"],
+            ["--margin", "0.2", "--results", "games.results"],
+            ["--compare-rules", "--trace", "games.trace"],
+            ["--compare-rules", "--results", "games.results"],
+            ["--compare-rules", "--cache", "outcomes.sqlite"],
+            ["--compare-rules", "--stats"],
+        ]:
+            with self.subTest(argv=argv):
+                with (
+                    mock.patch("sys.stderr", io.StringIO()),
+                    self.assertRaises(SystemExit),
+                ):
+                    war_game.main(argv)
+
+    def test_margin_with_cache(self):
+        """Test --margin adds the games it plays to the --cache file"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, "outcomes.sqlite")
+            war_game.main(
+                [
+                    "--margin",
+                    "0.2",
+                    "--seed",
+                    "0",
+                    "--cache",
+                    cache_path,
+                    "--verbosity",
+                    "none",
+                ]
+            )
+
+            with OutcomeCache(cache_path) as cache:
+                self.assertEqual(len(cache), 42)
+
+    def test_single_game_trace(self):
+        """Test --trace records a single auto-played game"""
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, "game.log")
+            trace_path = os.path.join(directory, "game.trace")
+            war_game.main(["--output", log_path, "--trace", trace_path])
+
+            with open(log_path) as log_file, open(trace_path, "rb") as trace_file:
+                self.assertEqual(
+                    list(render_trace(trace_file)), log_file.read().splitlines()
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
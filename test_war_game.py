@@ -4,8 +4,26 @@ Comprehensive tests for the War card game implementation.
 Tests both the core classes and the game functionality.
 """
 
+import copy
+import itertools
+import pickle
+import random
 import unittest
-from helper_functions import Card, Suit, Player, GameState
+from helper_functions import (
+    Card,
+    Suit,
+    Player,
+    GameMetrics,
+    GameState,
+    DEAL_COUNT,
+    ORDERED_DECK,
+    canonical_deal,
+    comparison_table,
+    encode_card,
+    is_canonical_deal,
+    rank_deal,
+    unrank_deal,
+)
 
 
 class TestCard(unittest.TestCase):
@@ -31,13 +49,43 @@ class TestCard(unittest.TestCase):
         king = Card(13, Suit.SPADES)
         five = Card(5, Suit.CLUBS)
 
-        # Test less than
-        self.assertTrue(king < ace)
-        self.assertTrue(five < king)
+        # Test ranks, suit doesn't matter
+        self.assertLess(king.rank, ace.rank)
+        self.assertLess(five.rank, king.rank)
+        self.assertEqual(ace.rank, Card(14, Suit.CLUBS).rank)
 
-        # Test equality (value only, suit doesn't matter)
-        self.assertEqual(ace, Card(14, Suit.CLUBS))
+        # Test equality and hashing by card code, as plain ints
+        self.assertNotEqual(ace, Card(14, Suit.CLUBS))
         self.assertNotEqual(ace, king)
+        self.assertEqual(ace, int(ace))
+        self.assertIn(int(five), {five})
+        self.assertEqual(len(set(ORDERED_DECK)), 52)
+        self.assertEqual(ORDERED_DECK.index(Card(2, Suit.SPADES)), 39)
+
+    def test_card_integer_encoding(self):
+        """Test cards are their compact integer codes"""
+        self.assertEqual(int(Card(2, Suit.CLUBS)), 0)
+        self.assertEqual(int(Card(2, Suit.SPADES)), 3)
+        self.assertEqual(int(Card(14, Suit.SPADES)), 51)
+        self.assertEqual(encode_card(13, Suit.HEARTS), int(Card(13, Suit.HEARTS)))
+        self.assertIs(Card.from_code(0), Card(2, Suit.CLUBS))
+        self.assertTrue(Card(2, Suit.CLUBS))  # Code 0 is still a truthy card
+
+        with self.assertRaises(ValueError):
+            Card(15, Suit.HEARTS)
+
+    def test_cards_are_interned(self):
+        """Test every Card is a shared flyweight, including copies"""
+        card = Card(5, Suit.HEARTS)
+        self.assertIs(card, Card(5, Suit.HEARTS))
+        self.assertIs(copy.deepcopy(card), card)
+        self.assertIs(pickle.loads(pickle.dumps(card)), card)
+
+        game = GameState()
+        game.setup_game(shuffle_deck=True)
+        for dealt in list(game.player1.hand) + list(game.player2.hand):
+            self.assertIs(dealt, Card.from_code(dealt))
+        self.assertEqual(sorted(map(int, ORDERED_DECK)), list(range(52)))
 
 
 class TestPlayer(unittest.TestCase):
@@ -87,6 +135,41 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(player.discard_size(), 0)  # Discard should be empty
         self.assertGreater(player.hand_size(), 0)  # Hand should have cards
 
+    def test_refill_reverses_discard(self):
+        """Test a picked up discard pile plays top and bottom in the reversed order"""
+        player = Player("Test")
+        player.add_cards_to_discard(
+            [Card(5, Suit.HEARTS), Card(10, Suit.CLUBS), Card(3, Suit.SPADES)]
+        )
+
+        self.assertEqual(str(player.draw_card()), "5h")  # First discarded is on top
+        self.assertEqual(str(player.draw_card(from_bottom=True)), "3s")
+        self.assertEqual([str(c) for c in player.hand], ["10c"])
+
+    def test_hand_shown_bottom_first_after_refill(self):
+        """Test hand and hand_cards show a picked up hand like a dealt one"""
+        player = Player("Test")
+        player.add_cards_to_discard([Card(5, Suit.HEARTS), Card(10, Suit.CLUBS)])
+        player.draw_card()  # Picks up, then draws 5h
+        player.add_cards_to_discard([Card(3, Suit.SPADES)])
+        player.hand.extend([Card(14, Suit.CLUBS), Card(4, Suit.CLUBS)])  # New top
+
+        self.assertEqual([str(c) for c in player.hand_cards()], ["10c", "Ac", "4c"])
+        self.assertEqual([str(c) for c in player.hand], ["10c", "Ac", "4c"])
+        self.assertEqual(str(player.draw_card()), "4c")
+        self.assertEqual(str(player.draw_card(from_bottom=True)), "10c")
+        self.assertEqual([str(c) for c in player.discard], ["3s"])
+
+    def test_add_several_card_lists_to_discard(self):
+        """Test adding several lists keeps their order without joining them"""
+        player = Player("Test")
+        mine = [Card(5, Suit.HEARTS), Card(10, Suit.CLUBS)]
+        theirs = [Card(3, Suit.SPADES)]
+
+        player.add_cards_to_discard(mine, theirs, iter([Card(14, Suit.CLUBS)]))
+
+        self.assertEqual([str(c) for c in player.discard], ["5h", "10c", "3s", "Ac"])
+
     def test_draw_card_no_cards_left(self):
         """Test drawing card when player has no cards left"""
         player = Player("Test")
@@ -156,6 +239,24 @@ class TestGameState(unittest.TestCase):
         result = game.compare_cards(king, ace, battle_advantage_active=True)
         self.assertEqual(result, 2)  # King < Ace, normal comparison
 
+    def test_comparison_tables(self):
+        """Test every table entry against the rules written out by value and suit"""
+        for suit_up in (False, True):
+            for battle_advantage in (False, True):
+                table = comparison_table(suit_up, battle_advantage)
+                for card_1 in ORDERED_DECK:
+                    for card_2 in ORDERED_DECK:
+                        values = {card_1.value, card_2.value}
+                        if card_1.value == card_2.value:
+                            expected = 0
+                        elif battle_advantage and values == {12, 13}:
+                            expected = 4
+                        elif suit_up and card_1.suit == card_2.suit:
+                            expected = 3
+                        else:
+                            expected = 1 if card_1.value > card_2.value else 2
+                        self.assertEqual(table[card_1 * 52 + card_2], expected)
+
     def test_check_game_over(self):
         """Test game over detection"""
         game = GameState()
@@ -187,6 +288,233 @@ class TestGameState(unittest.TestCase):
         self.assertEqual(game.round_number, 2)
 
 
+class TestCanonicalDeals(unittest.TestCase):
+    """Test mapping equivalent deals to one representative"""
+
+    def setUp(self):
+        self.deck = list(ORDERED_DECK)
+        random.Random(3).shuffle(self.deck)
+
+    def test_value_only_equivalence(self):
+        """Test without suit up the nth card of each value gets the nth suit"""
+        canonical = canonical_deal(self.deck)
+
+        self.assertEqual([c.value for c in canonical], [c.value for c in self.deck])
+        self.assertEqual(sorted(map(int, canonical)), list(range(52)))
+        for value in range(2, 15):
+            suits = [c.suit for c in canonical if c.value == value]
+            self.assertEqual(suits, list(Suit))
+
+    def test_suit_permutation_equivalence(self):
+        """Test with suit up every renaming of the suits has one representative"""
+        # Compare codes, Card equality ignores suits
+        canonical = list(map(int, canonical_deal(self.deck, suit_up=True)))
+        for permutation in itertools.permutations(range(4)):
+            renamed = [card & ~3 | permutation[card & 3] for card in self.deck]
+            self.assertEqual(
+                list(map(int, canonical_deal(renamed, suit_up=True))), canonical
+            )
+        self.assertEqual(canonical[0] & 3, 0)  # First suit seen becomes clubs
+
+    def test_representative_is_canonical(self):
+        """Test a representative maps to itself"""
+        for suit_up in (False, True):
+            canonical = canonical_deal(self.deck, suit_up)
+            self.assertTrue(is_canonical_deal(canonical, suit_up))
+        self.assertFalse(is_canonical_deal([Card(2, Suit.SPADES)]))
+
+    def test_deal_key_canonical(self):
+        """Test equivalent deals share a canonical deal key"""
+        renamed = [card & ~3 | 3 - (card & 3) for card in self.deck]
+        keys = []
+        for deck in (self.deck, renamed):
+            game = GameState()
+            game.player1.hand.extend(deck[0::2])
+            game.player2.hand.extend(deck[1::2])
+            keys.append(game.deal_key(canonical=True, suit_up=True))
+
+        self.assertEqual(keys[0], keys[1])
+        self.assertEqual(len(keys[0]), 29)
+
+
+class TestDealIds(unittest.TestCase):
+    """Test numbering every ordering of the deck"""
+
+    def test_first_and_last_deal(self):
+        """Test IDs run from the deck in card code order to it reversed"""
+        self.assertEqual(rank_deal(range(52)), 0)
+        self.assertEqual(rank_deal(range(51, -1, -1)), DEAL_COUNT - 1)
+        self.assertEqual(list(map(int, unrank_deal(0))), list(range(52)))
+        self.assertLess(DEAL_COUNT.bit_length(), 227)
+
+    def test_round_trip(self):
+        """Test unranking a deal's ID gives the same deck back"""
+        rng = random.Random(1)
+        for _ in range(20):
+            deck = list(ORDERED_DECK)
+            rng.shuffle(deck)
+            self.assertEqual(
+                list(map(int, unrank_deal(rank_deal(deck)))), list(map(int, deck))
+            )
+            deal_id = rng.randrange(DEAL_COUNT)
+            self.assertEqual(rank_deal(unrank_deal(deal_id)), deal_id)
+
+    def test_invalid_deals(self):
+        """Test decks that aren't a full deck and out of range IDs are rejected"""
+        with self.assertRaises(ValueError):
+            rank_deal([0] * 52)
+        with self.assertRaises(ValueError):
+            unrank_deal(DEAL_COUNT)
+
+    def test_setup_game_with_deal_id(self):
+        """Test setup_game deals the deck with the given ID"""
+        deck = unrank_deal(12345678901234567890)
+        game = GameState()
+        game.setup_game(deal_id=12345678901234567890)
+
+        self.assertEqual(list(map(int, game.player1.hand)), deck[0::2])
+        self.assertEqual(list(map(int, game.player2.hand)), deck[1::2])
+
+
+class TestSnapshots(unittest.TestCase):
+    """Test snapshots and forks of a game in progress"""
+
+    def setUp(self):
+        self.game = GameState()
+        self.game.setup_game(rng=random.Random(5))
+        player1, player2 = self.game.player1, self.game.player2
+        player1.add_cards_to_discard(
+            [player1.draw_card() for _ in range(26)], [player2.draw_card()]
+        )
+        player2.add_cards_to_discard([player1.draw_card()])  # Picks up the discard
+        self.game.round_number = 12
+
+    def test_snapshot_round_trip(self):
+        """Test a restored game has the same position, round and cards"""
+        snapshot = self.game.snapshot()
+        restored = GameState.from_snapshot(snapshot)
+
+        self.assertEqual(len(snapshot), 62)
+        self.assertEqual(restored.round_number, 12)
+        self.assertEqual(restored.position_key(), self.game.position_key())
+        card = restored.player2.hand[0]
+        self.assertIs(card, Card.from_code(int(card)))
+
+    def test_restore_in_place(self):
+        """Test restoring goes back to the snapshot position"""
+        snapshot = self.game.snapshot()
+        expected = self.game.position_key()
+        self.game.player2.draw_card()
+        self.game.increment_round()
+        self.game.restore(snapshot)
+
+        self.assertEqual(self.game.position_key(), expected)
+        self.assertEqual(self.game.round_number, 12)
+
+    def test_rejects_other_bytes(self):
+        """Test restoring something that isn't a snapshot fails clearly"""
+        with self.assertRaises(ValueError):
+            GameState.from_snapshot(b"")
+        with self.assertRaises(ValueError):
+            GameState.from_snapshot(self.game.snapshot()[:-1])
+        with self.assertRaises(ValueError):
+            Player("Test").restore(bytes((1, 52, 0)))
+
+    def test_fork_is_independent(self):
+        """Test changing a fork leaves the original game alone"""
+        expected = self.game.position_key()
+        fork = self.game.fork()
+        fork.player1.draw_card()
+        fork.player2.add_cards_to_discard([fork.player1.draw_card()])
+        fork.increment_round()
+
+        self.assertEqual(self.game.position_key(), expected)
+        self.assertEqual(self.game.round_number, 12)
+        self.assertEqual(self.game.fork().position_key(), expected)
+
+    def test_fork_keeps_every_attribute(self):
+        """Test forks copy attributes they don't know about, except metrics"""
+        self.game.enable_metrics()
+        self.game.label = "branch"
+        self.game.player1.label = "first"
+        fork = self.game.fork()
+
+        self.assertEqual((fork.label, fork.player1.label), ("branch", "first"))
+        self.assertIs(fork.logger, self.game.logger)
+        self.assertIsNone(fork.metrics)
+        self.assertIsNone(fork.player1.metrics)
+        self.assertEqual(fork.player1.hand_cards(), self.game.player1.hand_cards())
+
+
+class TestGameMetrics(unittest.TestCase):
+    """Test the optional mechanic counters"""
+
+    def test_metrics_off_by_default(self):
+        """Test games count nothing unless metrics are enabled"""
+        game = GameState()
+        self.assertIsNone(game.metrics)
+        self.assertIsNone(game.player1.metrics)
+        self.assertNotIn("metrics", game.get_game_status())
+
+    def test_draws_and_refills(self):
+        """Test players count draws and the cards each pickup moves"""
+        game = GameState()
+        metrics = game.enable_metrics()
+        game.player1.add_cards_to_discard([Card(5, Suit.HEARTS), Card(10, Suit.CLUBS)])
+
+        game.player1.draw_card()
+        game.player1.draw_card()
+        game.player1.draw_card()  # Nothing left, not a draw
+
+        self.assertEqual(
+            (metrics.draws, metrics.refills, metrics.refill_cards), (2, 1, 2)
+        )
+        self.assertIs(game.player2.metrics, metrics)
+        self.assertEqual(game.get_game_status()["metrics"]["draws"], 2)
+
+    def test_war_chains(self):
+        """Test wars in the same round count as one chain"""
+        metrics = GameMetrics()
+        metrics.record_war()
+        metrics.record_war()
+        metrics.end_round()
+        metrics.record_war()
+        metrics.end_round()
+        metrics.end_round()
+
+        self.assertEqual(metrics.rounds, 3)
+        self.assertEqual(metrics.wars, 3)
+        self.assertEqual(metrics.as_dict()["war_chains"], {1: 1, 2: 1})
+
+    def test_merge(self):
+        """Test merging adds every counter and chain depth"""
+        first, second = GameMetrics(), GameMetrics()
+        first.record_war()
+        first.end_round()
+        second.record_war()
+        second.end_round()
+        second.end_game(empty_hand=True)
+
+        first.merge(second)
+
+        self.assertEqual(first.wars, 2)
+        self.assertEqual(first.war_chains, {1: 2})
+        self.assertEqual((first.games, first.empty_hand_endings), (1, 1))
+
+    def test_prometheus_export(self):
+        """Test counters render as Prometheus text with labels"""
+        metrics = GameMetrics()
+        metrics.record_war()
+        metrics.end_round()
+
+        text = metrics.to_prometheus(labels={"rules": "plain"})
+
+        self.assertIn("# TYPE war_rounds_total counter\n", text)
+        self.assertIn('war_rounds_total{rules="plain"} 1\n', text)
+        self.assertIn('war_war_chains_total{rules="plain",depth="1"} 1\n', text)
+        self.assertIn("war_draws_total 0\n", metrics.to_prometheus())
+
+
 class TestGameIntegration(unittest.TestCase):
     """Integration tests for the complete game system"""
 
@@ -0,0 +1,566 @@
+"""
+NumPy lockstep engine that plays many War games at once.
+
+Every game's hands, discard piles and played cards live in shared 2-D integer
+arrays, and each ``step`` advances every unfinished game by one round using
+masked array operations. The rules are the same as ``war_game.play_round``,
+so for the same deals the results match ``simulation.play_game`` exactly.
+That includes stopping games that cycle, all games share one round count, so
+a single Brent's algorithm schedule covers the whole batch.
+
+Cards use the same integer codes as ``helper_functions.Card``.
+"""
+
+import random
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+from helper_functions import (
+    DEAL_COUNT,
+    KING_RANK,
+    ORDERED_DECK,
+    Card,
+    GameState,
+    comparison_table,
+)
+from simulation import (
+    CYCLE,
+    MAX_ROUNDS,
+    ROUND_LIMIT,
+    BatchTotals,
+    GameResult,
+    play_game,
+)
+
+DECK_SIZE = 52
+PLAYER_1, PLAYER_2 = 0, 1
+
+
+@dataclass
+class VectorResults:
+    """Per-game results of a lockstep batch, one array entry per deal"""
+
+    winner: np.ndarray  # 1 or 2, DRAW, CYCLE or ROUND_LIMIT
+    rounds: np.ndarray
+    wars: np.ndarray
+    suit_ups: np.ndarray
+    battles: np.ndarray
+    cycle_start: np.ndarray
+    cycle_length: np.ndarray
+
+    def __len__(self):
+        return len(self.winner)
+
+    def to_game_results(self) -> List[GameResult]:
+        """Convert to the ``GameResult`` objects used by the object engine"""
+        return [
+            GameResult(*map(int, row))
+            for row in zip(
+                self.winner,
+                self.rounds,
+                self.wars,
+                self.suit_ups,
+                self.battles,
+                self.cycle_start,
+                self.cycle_length,
+            )
+        ]
+
+    def totals(self) -> BatchTotals:
+        """Sum the batch into ``BatchTotals``"""
+        return BatchTotals(
+            games=len(self.winner),
+            player1_wins=int(np.count_nonzero(self.winner == 1)),
+            player2_wins=int(np.count_nonzero(self.winner == 2)),
+            draws=int(np.count_nonzero(self.winner == 0)),
+            cycles=int(np.count_nonzero(self.winner == CYCLE)),
+            round_limits=int(np.count_nonzero(self.winner == ROUND_LIMIT)),
+            rounds=int(self.rounds.sum()),
+            wars=int(self.wars.sum()),
+            suit_ups=int(self.suit_ups.sum()),
+            battles=int(self.battles.sum()),
+        )
+
+
+def deals_from_seeds(seeds: Iterable[int]) -> np.ndarray:
+    """
+    Build one shuffled deck per seed, dealt identically to
+    ``GameState.setup_game(rng=random.Random(seed))``
+    """
+    deals = []
+    for seed in seeds:
+        # Shuffling the same starting order with the same Random gives the same deal
+        deck = list(ORDERED_DECK)
+        random.Random(seed).shuffle(deck)
+        deals.append(deck)
+    return np.array(deals, dtype=np.int8).reshape(-1, DECK_SIZE)
+
+
+def _radix_chunks() -> List[tuple]:
+    """
+    Split the deal ID digits, radix 52 down to 1, into (start, stop, product)
+    runs whose radix product fits in an int64, so each run is one array column
+    """
+    chunks = []
+    start, product = 0, 1
+    for position in range(DECK_SIZE):
+        radix = DECK_SIZE - position
+        if product * radix >= 2**63:
+            chunks.append((start, position, product))
+            start, product = position, 1
+        product *= radix
+    chunks.append((start, DECK_SIZE, product))
+    return chunks
+
+
+_RADIX_CHUNKS = _radix_chunks()
+
+
+def deal_ids(deals: np.ndarray) -> List[int]:
+    """
+    Batched ``helper_functions.rank_deal``: the deal ID of every deck (row)
+    of deals, computed with array operations apart from the final big ints
+    """
+    deals = np.asarray(deals, dtype=np.int8).reshape(-1, DECK_SIZE)
+    # Lehmer digits, the later cards of each deck that sort before each card
+    later = np.triu(np.ones((DECK_SIZE, DECK_SIZE), dtype=bool), k=1)
+    digits = ((deals[:, :, None] > deals[:, None, :]) & later).sum(axis=2)
+
+    columns = []
+    for start, stop, _ in _RADIX_CHUNKS:
+        column = np.zeros(len(deals), dtype=np.int64)
+        for position in range(start, stop):
+            column = column * (DECK_SIZE - position) + digits[:, position]
+        columns.append(column.tolist())
+
+    ids = [0] * len(deals)
+    for (_, _, product), column in zip(_RADIX_CHUNKS, columns):
+        ids = [deal_id * product + value for deal_id, value in zip(ids, column)]
+    return ids
+
+
+def deals_from_ids(ids: Sequence[int]) -> np.ndarray:
+    """Batched ``helper_functions.unrank_deal``: one deck (row) per deal ID"""
+    ids = list(ids)
+    if any(not 0 <= deal_id < DEAL_COUNT for deal_id in ids):
+        raise ValueError("Deal IDs run from 0 to 52! - 1")
+    columns = [[] for _ in _RADIX_CHUNKS]
+    for deal_id in ids:
+        for column, (_, _, product) in zip(reversed(columns), reversed(_RADIX_CHUNKS)):
+            deal_id, value = divmod(deal_id, product)
+            column.append(value)
+
+    digits = np.zeros((len(ids), DECK_SIZE), dtype=np.int8)
+    for (start, stop, _), column in zip(_RADIX_CHUNKS, columns):
+        value = np.array(column, dtype=np.int64)
+        for position in range(stop - 1, start - 1, -1):
+            value, digits[:, position] = np.divmod(value, DECK_SIZE - position)
+
+    # Decode right to left: each digit counts the later cards below its card,
+    # so every later card at or above it moves up one
+    deals = digits
+    for position in range(DECK_SIZE - 2, -1, -1):
+        later = deals[:, position + 1 :]
+        later += later >= deals[:, [position]]
+    return deals
+
+
+class LockstepBatch:
+    """
+    Array-backed state for a batch of games advanced one round per step.
+
+    Each player's piles are a row of a 2-D array, row ``2 * game + player``.
+    Hands are the slice [hand_lo, hand_hi) of their row with the top of the
+    hand at hand_hi - 1, discard piles fill their row from the left.
+    """
+
+    def __init__(
+        self,
+        deals: np.ndarray,
+        suit_up: bool = False,
+        battle_advantage: bool = False,
+        max_rounds: int = MAX_ROUNDS,
+    ):
+        deals = np.asarray(deals, dtype=np.int8).reshape(-1, DECK_SIZE)
+        num_games = len(deals)
+        self.deals = deals
+        self.suit_up = suit_up
+        self.battle_advantage = battle_advantage
+        self.max_rounds = max_rounds
+        # House rules never apply to the cards that end a war
+        self._comparison_tables = np.frombuffer(
+            comparison_table(suit_up, battle_advantage) + comparison_table(),
+            dtype=np.uint8,
+        )
+
+        self.hand = np.zeros((2 * num_games, DECK_SIZE), dtype=np.int8)
+        self.hand_lo = np.zeros(2 * num_games, dtype=np.int16)
+        self.hand_hi = np.zeros(2 * num_games, dtype=np.int16)
+        self.discard = np.zeros((2 * num_games, DECK_SIZE), dtype=np.int8)
+        self.discard_n = np.zeros(2 * num_games, dtype=np.int16)
+        self.played = np.zeros((2 * num_games, DECK_SIZE), dtype=np.int8)
+        self.played_n = np.zeros(num_games, dtype=np.int16)
+
+        # Alternate dealing cards to each player, like GameState._split_deck
+        half = DECK_SIZE // 2
+        self.hand[PLAYER_1::2, :half] = deals[:, 0::2]
+        self.hand[PLAYER_2::2, :half] = deals[:, 1::2]
+        self.hand_hi[:] = half
+
+        self.active = np.ones(num_games, dtype=bool)
+        self.winner = np.zeros(num_games, dtype=np.int8)
+        self.rounds = np.ones(num_games, dtype=np.int32)
+        self.wars = np.zeros(num_games, dtype=np.int32)
+        self.suit_ups = np.zeros(num_games, dtype=np.int32)
+        self.battles = np.zeros(num_games, dtype=np.int32)
+        self.cycle_start = np.zeros(num_games, dtype=np.int32)
+        self.cycle_length = np.zeros(num_games, dtype=np.int32)
+
+        # Brent's algorithm state, like helper_functions.CycleDetector
+        rows = np.arange(2 * num_games)
+        self._saved_sizes = self._pile_sizes(rows)
+        self._saved_positions = self._positions(rows)
+        self._power = 1
+        self._length = 0
+
+    def results(self) -> VectorResults:
+        """Current per-game results, only final once ``active`` is all False"""
+        return VectorResults(
+            winner=self.winner.copy(),
+            rounds=self.rounds.copy(),
+            wars=self.wars.copy(),
+            suit_ups=self.suit_ups.copy(),
+            battles=self.battles.copy(),
+            cycle_start=self.cycle_start.copy(),
+            cycle_length=self.cycle_length.copy(),
+        )
+
+    def run(self) -> VectorResults:
+        """Step until every game is over"""
+        while self.active.any():
+            self.step()
+        return self.results()
+
+    def _total_cards(self, rows: np.ndarray) -> np.ndarray:
+        return self.hand_hi[rows] - self.hand_lo[rows] + self.discard_n[rows]
+
+    def _pile_sizes(self, rows: np.ndarray) -> np.ndarray:
+        """Hand and discard sizes of each row, [len(rows), 2]"""
+        return np.stack(
+            (self.hand_hi[rows] - self.hand_lo[rows], self.discard_n[rows]), axis=1
+        )
+
+    def _positions(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Hand (bottom first) then discard pile of each row, both padded to
+        DECK_SIZE with -1, so equal positions give equal rows
+        """
+        cols = np.arange(DECK_SIZE)
+        lo = self.hand_lo[rows, None]
+        hand = self.hand.take(rows[:, None] * DECK_SIZE + lo + cols, mode="clip")
+        hand[cols >= self.hand_hi[rows, None] - lo] = -1
+        discard = self.discard[rows]
+        discard[cols >= self.discard_n[rows, None]] = -1
+        return np.concatenate((hand, discard), axis=1)
+
+    def _check_cycles(self, games: np.ndarray) -> np.ndarray:
+        """
+        One step of Brent's algorithm for games that finished a round without
+        a winner. Ends the games whose position repeated, returns the rest.
+        """
+        self._length += 1
+        rows = np.stack((2 * games + PLAYER_1, 2 * games + PLAYER_2), axis=1)
+        sizes = self._pile_sizes(rows.ravel()).reshape(len(games), 4)
+        saved_sizes = self._saved_sizes[rows.ravel()].reshape(len(games), 4)
+        candidates = np.flatnonzero((sizes == saved_sizes).all(axis=1))
+        if len(candidates):
+            candidate_rows = rows[candidates].ravel()
+            same = (
+                self._positions(candidate_rows) == self._saved_positions[candidate_rows]
+            )
+            repeated = candidates[
+                same.reshape(len(candidates), 4 * DECK_SIZE).all(axis=1)
+            ]
+            if len(repeated):
+                self._finish_cycles(games[repeated])
+                games = np.delete(games, repeated)
+                rows = np.delete(rows, repeated, axis=0)
+
+        if self._length == self._power:
+            rows = rows.ravel()
+            self._saved_sizes[rows] = self._pile_sizes(rows)
+            self._saved_positions[rows] = self._positions(rows)
+            self._power *= 2
+            self._length = 0
+        return games
+
+    def _finish_cycles(self, games: np.ndarray):
+        """End cycling games, replaying each one in the object engine for its start"""
+        self._finish(games, CYCLE)
+        self.cycle_length[games] = self._length
+        for game in games:
+            # Cycles are rare, so the slower replay is only ever run a few times
+            deal = [Card.from_code(int(code)) for code in self.deals[game]]
+            game_state = GameState.from_position((deal[0::2], (), deal[1::2], ()))
+            result = play_game(
+                game_state, self.suit_up, self.battle_advantage, self.max_rounds
+            )
+            self.cycle_start[game] = result.cycle_start
+
+    def _finish(self, games: np.ndarray, winner):
+        self.active[games] = False
+        self.winner[games] = winner
+
+    def _refill(self, rows: np.ndarray):
+        """Move each discard pile into its empty hand, reversing order like Player"""
+        count = self.discard_n[rows]
+        source = np.clip(count[:, None] - 1 - np.arange(DECK_SIZE), 0, DECK_SIZE - 1)
+        self.hand[rows] = self.discard.take(rows[:, None] * DECK_SIZE + source)
+        self.hand_lo[rows] = 0
+        self.hand_hi[rows] = count
+        self.discard_n[rows] = 0
+
+    def _draw(self, rows: np.ndarray, from_bottom):
+        """
+        Draw one card from each pile row, refilling empty hands first.
+        Returns (cards, drew) where drew is False for players with no cards left.
+        """
+        lo = self.hand_lo[rows]
+        hi = self.hand_hi[rows]
+        empty = lo == hi
+        drew = ~empty
+        if empty.any():
+            has_discard = self.discard_n[rows] > 0
+            refill = empty & has_discard
+            if refill.any():
+                self._refill(rows[refill])
+                lo = self.hand_lo[rows]
+                hi = self.hand_hi[rows]
+            drew |= has_discard
+
+        position = np.where(from_bottom, lo, hi - 1)
+        cards = self.hand.take(rows * DECK_SIZE + position, mode="clip")
+        self.hand_lo[rows] = lo + (drew & from_bottom)
+        self.hand_hi[rows] = hi - (drew & ~np.asarray(from_bottom))
+        return cards, drew
+
+    def _append_discard(self, rows: np.ndarray, cards: np.ndarray, counts):
+        """Append the first counts[i] entries of cards[i] to each discard row"""
+        counts = np.asarray(counts, dtype=np.int16)
+        start = self.discard_n[rows]
+        if cards.shape[1] == 1:
+            # Plain rounds only move a single card per player
+            self.discard[rows, start] = cards[:, 0]
+        else:
+            cols = np.arange(cards.shape[1])
+            mask = cols < counts[:, None]
+            target = rows[:, None] * DECK_SIZE + start[:, None] + cols
+            np.put(self.discard, target[mask], cards[mask])
+        self.discard_n[rows] = start + counts
+
+    def _collect(
+        self, games: np.ndarray, winners: np.ndarray, extras=None, extras_n=None
+    ):
+        """Give the played cards, winner's first, plus any extras to the winner"""
+        if not len(games):
+            return
+        winner_rows = 2 * games + winners
+        loser_rows = 2 * games + (1 - winners)
+        counts = self.played_n[games]
+        width = int(counts.max())
+        self._append_discard(winner_rows, self.played[winner_rows, :width], counts)
+        self._append_discard(winner_rows, self.played[loser_rows, :width], counts)
+        if extras is not None:
+            self._append_discard(winner_rows, extras, extras_n)
+
+    def _draw_for_round(
+        self, games: np.ndarray, deal: np.ndarray, from_bottom: np.ndarray
+    ) -> np.ndarray:
+        """
+        Draw deal[i] cards each for both players of every game, ending games whose
+        players run out. Returns the mask of games that are still in the round.
+        """
+        in_round = np.ones(len(games), dtype=bool)
+        for draw_number in range(int(deal.max())):
+            index = np.flatnonzero(in_round & (deal > draw_number))
+            if not len(index):
+                break
+            current = games[index]
+            bottom = from_bottom[index]
+
+            card_1, drew_1 = self._draw(2 * current + PLAYER_1, bottom)
+            if not drew_1.all():
+                # Player 1 can only fail to draw when out of cards. If player 2
+                # is out too, the last cards played settle the game instead
+                out = current[~drew_1]
+                both_out = self._total_cards(2 * out + PLAYER_2) == 0
+                last = self.played_n[out] - 1
+                rank_1 = self.played[2 * out + PLAYER_1, last] // 4
+                rank_2 = self.played[2 * out + PLAYER_2, last] // 4
+                settled = np.where(rank_1 > rank_2, 1, 2)
+                settled[(rank_1 == rank_2) | (last < 0)] = 0
+                self._finish(out, np.where(both_out, settled, 2))
+                in_round[index[~drew_1]] = False
+                index, current = index[drew_1], current[drew_1]
+                bottom, card_1 = bottom[drew_1], card_1[drew_1]
+
+            card_2, drew_2 = self._draw(2 * current + PLAYER_2, bottom)
+            if not drew_2.all():
+                self._finish(current[~drew_2], 1)
+                in_round[index[~drew_2]] = False
+                current, card_1, card_2 = (
+                    current[drew_2],
+                    card_1[drew_2],
+                    card_2[drew_2],
+                )
+
+            position = self.played_n[current]
+            self.played[2 * current + PLAYER_1, position] = card_1
+            self.played[2 * current + PLAYER_2, position] = card_2
+            self.played_n[current] = position + 1
+        return in_round
+
+    def _compare(self, games: np.ndarray, in_war: np.ndarray) -> np.ndarray:
+        """Vectorized GameState.compare_cards on the last played cards"""
+        last = self.played_n[games] - 1
+        card_1 = self.played[2 * games + PLAYER_1, last].astype(np.intp)
+        card_2 = self.played[2 * games + PLAYER_2, last]
+        return self._comparison_tables.take(
+            in_war * DECK_SIZE * DECK_SIZE + card_1 * DECK_SIZE + card_2
+        )
+
+    def _battle(self, games: np.ndarray, from_bottom: np.ndarray):
+        """
+        Vectorized GameState.battle_with_advantage plus handing over the cards,
+        from the bottom of the hands where suit up makes it, like
+        rule_pipeline.battle_from_bottom
+        """
+        last = self.played_n[games] - 1
+        card_1 = self.played[2 * games + PLAYER_1, last]
+        if self.suit_up:
+            card_2 = self.played[2 * games + PLAYER_2, last]
+            from_bottom = from_bottom | (card_1 % 4 == card_2 % 4)
+        else:
+            from_bottom = np.zeros(len(games), dtype=bool)
+        king_is_player_1 = card_1 // 4 == KING_RANK
+        king = 2 * games + np.where(king_is_player_1, PLAYER_1, PLAYER_2)
+        queen = 2 * games + np.where(king_is_player_1, PLAYER_2, PLAYER_1)
+
+        king_wins = np.ones(len(games), dtype=bool)
+        extras = np.zeros((len(games), 3), dtype=np.int8)
+        extras_n = np.zeros(len(games), dtype=np.int16)
+
+        # Queen plays one card, King wins by default if she can't
+        queen_second, drew = self._draw(queen, from_bottom)
+        extras[:, 0] = queen_second
+        extras_n[drew] = 1
+        pending = np.flatnonzero(drew)
+
+        # King plays one card, Queen wins by default if he can't
+        king_second, drew = self._draw(king[pending], from_bottom[pending])
+        king_wins[pending[~drew]] = False
+        pending, king_second = pending[drew], king_second[drew]
+        extras[pending, 1] = king_second
+        extras_n[pending] = 2
+
+        # King plays a third card if his second is not higher
+        lower = king_second // 4 <= queen_second[pending] // 4
+        pending = pending[lower]
+        king_third, drew = self._draw(king[pending], from_bottom[pending])
+        king_wins[pending[~drew]] = False
+        pending, king_third = pending[drew], king_third[drew]
+        extras[pending, 2] = king_third
+        extras_n[pending] = 3
+        king_wins[pending] = king_third // 4 > queen_second[pending] // 4
+
+        winners = np.where(king_wins, king, queen) - 2 * games
+        self._collect(games, winners, extras, extras_n)
+
+    def step(self):
+        """Play one round, including any wars, suit ups and battles, for every active game"""
+        games = np.flatnonzero(self.active)
+        self.played_n[games] = 0
+
+        deal = np.ones(len(games), dtype=np.int8)
+        from_bottom = np.zeros(len(games), dtype=bool)
+        in_war = np.zeros(len(games), dtype=bool)
+        resolving = np.arange(len(games))
+
+        while len(resolving):
+            in_round = self._draw_for_round(
+                games[resolving], deal[resolving], from_bottom[resolving]
+            )
+            resolving = resolving[in_round]
+            current = games[resolving]
+            outcome = self._compare(current, in_war[resolving])
+
+            settled = outcome <= 2
+            settled &= outcome > 0
+            self._collect(current[settled], outcome[settled] - 1)
+
+            war = outcome == 0
+            if war.any():
+                self.wars[current[war]] += 1
+                deal[resolving[war]] = 4
+                from_bottom[resolving[war]] = False
+                in_war[resolving[war]] = True
+
+            suit_up = outcome == 3
+            if suit_up.any():
+                self.suit_ups[current[suit_up]] += 1
+                deal[resolving[suit_up]] = 2
+                from_bottom[resolving[suit_up]] = True
+                in_war[resolving[suit_up]] = False
+
+            battle = outcome == 4
+            if battle.any():
+                self.battles[current[battle]] += 1
+                self._battle(current[battle], from_bottom[resolving[battle]])
+
+            resolving = resolving[war | suit_up]
+
+        # Same order as GameState.check_game_over
+        games = games[self.active[games]]
+        player_1_out = self._total_cards(2 * games + PLAYER_1) == 0
+        player_2_out = self._total_cards(2 * games + PLAYER_2) == 0
+        self._finish(games[player_1_out], 2)
+        self._finish(games[~player_1_out & player_2_out], 1)
+
+        games = self._check_cycles(games[~player_1_out & ~player_2_out])
+        capped = self.rounds[games] >= self.max_rounds
+        self._finish(games[capped], ROUND_LIMIT)
+        self.rounds[games[~capped]] += 1
+
+
+def simulate_deals(
+    deals: np.ndarray,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    max_rounds: int = MAX_ROUNDS,
+) -> VectorResults:
+    """Play every deal (one 52-card row per game) to completion in lockstep"""
+    return LockstepBatch(deals, suit_up, battle_advantage, max_rounds).run()
+
+
+def simulate_seed_range(
+    start_seed: int,
+    stop_seed: int,
+    suit_up: bool = False,
+    battle_advantage: bool = False,
+    batch_size: int = 50000,
+    max_rounds: int = MAX_ROUNDS,
+) -> BatchTotals:
+    """
+    Lockstep counterpart of ``simulation.run_seed_range``, giving the same totals
+    for the same seeds. Deals are played batch_size games at a time.
+    """
+    totals = BatchTotals()
+    for batch_start in range(start_seed, stop_seed, batch_size):
+        seeds = range(batch_start, min(batch_start + batch_size, stop_seed))
+        results = simulate_deals(
+            deals_from_seeds(seeds), suit_up, battle_advantage, max_rounds
+        )
+        totals.merge(results.totals())
+    return totals
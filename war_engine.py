@@ -0,0 +1,280 @@
+"""
+The War card game engine behind ``war_game.py``, with per-round logging.
+
+Importing this module has no side effects: house rules, prompting and
+verbosity are passed to ``play_war`` / ``play_round`` explicitly, and log
+records go to the game's ``GameState.logger``, the root logger unless
+``play_war`` is given another one. Nothing is shared between games, so
+games can be played in several threads at once.
+"""
+
+from helper_functions import (
+    CYCLE,
+    DRAW,
+    ROUND_LIMIT,
+    CycleDetector,
+    GameMetrics,
+    GameState,
+)
+from rule_pipeline import battle_from_bottom, settle_battle
+from simulation import MAX_ROUNDS, finish_round
+
+# "none" skips all logging, "summary" logs only results, "rounds" logs every round
+VERBOSITY_LEVELS = ("none", "summary", "rounds")
+
+
+def _handle_empty_hands(game_state, player_1_played_cards, player_2_played_cards):
+    """Handle the case where both players are out of cards during war"""
+    if not game_state.player1.has_cards() and not game_state.player2.has_cards():
+        if player_1_played_cards and player_2_played_cards:
+            return game_state.compare_cards(
+                player_1_played_cards[-1],
+                player_2_played_cards[-1],
+                suit_up_active=False,
+            )
+        else:
+            return 0  # Draw if no cards were played
+    return None
+
+
+def _draw_cards_for_round(
+    game_state, player_1_played_cards, player_2_played_cards, deal, reversed
+):
+    """Draw the required number of cards for both players"""
+    for _ in range(0, deal):
+        # Check if both players are out of cards
+        empty_hand_result = _handle_empty_hands(
+            game_state, player_1_played_cards, player_2_played_cards
+        )
+        if empty_hand_result is not None:
+            return empty_hand_result
+
+        # Player 1 draws a card
+        card1 = game_state.player1.draw_card(from_bottom=reversed)
+        if card1 is None:
+            return 2  # Player 2 wins
+        player_1_played_cards.append(card1)
+
+        # Player 2 draws a card
+        card2 = game_state.player2.draw_card(from_bottom=reversed)
+        if card2 is None:
+            return 1  # Player 1 wins
+        player_2_played_cards.append(card2)
+
+    return None  # Continue with round
+
+
+def _log_round_results(
+    game_state, player_1_played_cards, player_2_played_cards, comparison
+):
+    """Log the results of the current round, formatted only if a handler emits it"""
+    game_state.logger.info(
+        "P1: H:%-2d | D:%-2d | %s%s",
+        game_state.player1.hand_size(),
+        game_state.player1.discard_size(),
+        player_1_played_cards,
+        "*" if comparison == 1 else " ",
+    )
+    game_state.logger.info(
+        "P2: H:%-2d | D:%-2d | %s%s",
+        game_state.player2.hand_size(),
+        game_state.player2.discard_size(),
+        player_2_played_cards,
+        "*" if comparison == 2 else " ",
+    )
+
+
+def play_round(
+    game_state,
+    player_1_played_cards,
+    player_2_played_cards,
+    deal=1,
+    reversed=False,
+    trace=None,
+    suit_up=False,
+    battle_advantage=False,
+    prompt=False,
+    log_rounds=True,
+):
+    """
+    Single round of gameplay, wars and suit ups are considered part of the same round.
+    They are resolved in this loop, each one drawing more cards onto the same
+    played card lists, instead of recursing once per war.
+    Cards drawn and comparisons are recorded to trace if one is given.
+    prompt waits for Enter before each draw, log_rounds logs every comparison.
+    """
+
+    while True:
+        if prompt:
+            input("Press Enter to play")
+
+        # Draw cards for this step of the round
+        drawn_before = len(player_1_played_cards)
+        early_result = _draw_cards_for_round(
+            game_state, player_1_played_cards, player_2_played_cards, deal, reversed
+        )
+        if trace is not None:
+            trace.record_draw(
+                player_1_played_cards, player_2_played_cards, drawn_before
+            )
+        if early_result is not None:
+            return early_result
+
+        # Compare the cards, house rules don't apply to the cards ending a war
+        comparison = game_state.compare_cards(
+            player_1_played_cards[-1],
+            player_2_played_cards[-1],
+            suit_up_active=(suit_up and deal != 4),
+            battle_advantage_active=(battle_advantage and deal != 4),
+        )
+        if trace is not None and comparison != 4:
+            trace.record_outcome(comparison)
+
+        # Log round results
+        if log_rounds:
+            _log_round_results(
+                game_state, player_1_played_cards, player_2_played_cards, comparison
+            )
+
+        # Handle the comparison result
+        if comparison == 1:
+            game_state.player1.add_cards_to_discard(
+                player_1_played_cards, player_2_played_cards
+            )
+        elif comparison == 2:
+            game_state.player2.add_cards_to_discard(
+                player_2_played_cards, player_1_played_cards
+            )
+        elif comparison == 0:
+            if log_rounds:
+                game_state.logger.info("War!")
+            if game_state.metrics is not None:
+                game_state.metrics.record_war()
+            deal, reversed = 4, False
+            continue
+        elif comparison == 3:
+            if log_rounds:
+                game_state.logger.info("Suit Up!")
+            if game_state.metrics is not None:
+                game_state.metrics.suit_ups += 1
+            deal, reversed = 2, True
+            continue
+        elif comparison == 4:
+            if log_rounds:
+                game_state.logger.info("Battle with Advantage Triggered!")
+            if game_state.metrics is not None:
+                game_state.metrics.battles += 1
+            settle_battle(
+                game_state,
+                player_1_played_cards,
+                player_2_played_cards,
+                battle_from_bottom(
+                    suit_up,
+                    reversed,
+                    player_1_played_cards[-1],
+                    player_2_played_cards[-1],
+                ),
+                trace,
+                log_rounds,
+            )
+
+        return None  # no winner yet
+
+
+def _log_game_result(game_state, winner, cycle_start, cycle_length):
+    """Log how the game ended"""
+    if winner == DRAW:
+        game_state.logger.info("Draw!")
+    elif winner == CYCLE:
+        game_state.logger.info(
+            "Cycle detected in round %d: the game repeats every %d rounds "
+            "from round %d",
+            game_state.round_number,
+            cycle_length,
+            cycle_start,
+        )
+    elif winner == ROUND_LIMIT:
+        game_state.logger.info(
+            "Stopped after %d rounds without a winner", game_state.round_number
+        )
+    else:
+        player = game_state.player1 if winner == 1 else game_state.player2
+        game_state.logger.info(
+            "%s Wins in %d rounds!", player.name, game_state.round_number
+        )
+
+
+def play_war(
+    suit_up=False,
+    battle_advantage=False,
+    verbosity="rounds",
+    prompt=False,
+    max_rounds=MAX_ROUNDS,
+    trace=None,
+    rng=None,
+    metrics=None,
+    log=None,
+    stats=None,
+):
+    """
+    Play game, recording it to trace if one is given.
+    verbosity is one of VERBOSITY_LEVELS, rng a random.Random for the deal.
+    metrics is a GameMetrics to count the game's mechanics into.
+    log is a logging.Logger for this game's records instead of the root logger.
+    stats is a game_stats.GameStats to add the game's outcome to, with its
+    war chains unless they are counted into metrics (see GameStats.add_metrics).
+    Returns the winning player number, or DRAW, CYCLE or ROUND_LIMIT.
+    """
+
+    # Setup game using GameState class
+    game_state = GameState()
+    if log is not None:
+        game_state.logger = log
+    game_state.setup_game(shuffle_deck=True, rng=rng)
+    # The game's own counters for stats' war chains if the caller has none
+    chains_for_stats = stats is not None and metrics is None
+    if chains_for_stats:
+        metrics = GameMetrics()
+    if metrics is not None:
+        game_state.enable_metrics(metrics)
+    if trace is not None:
+        trace.begin_game(game_state, suit_up, battle_advantage)
+    log_rounds = verbosity == "rounds"
+    log_summary = verbosity != "none"
+    # If players don't grab their own cards first when picking up, the game can loop forever
+    detector = CycleDetector(game_state)
+
+    while True:
+        # Game play loop
+        player_1_played_cards, player_2_played_cards = [], []
+        if log_rounds:
+            game_state.logger.info("---- Round %d ----", game_state.round_number)
+
+        winner = play_round(
+            game_state,
+            player_1_played_cards,
+            player_2_played_cards,
+            deal=1,
+            trace=trace,
+            suit_up=suit_up,
+            battle_advantage=battle_advantage,
+            prompt=prompt,
+            log_rounds=log_rounds,
+        )
+        end = finish_round(
+            game_state, winner, detector, suit_up, battle_advantage, max_rounds
+        )
+        if end is not None:
+            break
+        game_state.increment_round()
+
+    winner, cycle_start, cycle_length = end
+    if log_summary:
+        _log_game_result(game_state, winner, cycle_start, cycle_length)
+    if trace is not None:
+        trace.end_game(winner, game_state.round_number, cycle_start, cycle_length)
+    if stats is not None:
+        stats.add(winner, game_state.round_number, cycle_length)
+        if chains_for_stats:
+            stats.add_metrics(metrics)
+    return winner
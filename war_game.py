@@ -1,227 +1,453 @@
-import logging
+"""
+Command line entry point for the War card game.
+
+The game itself lives in ``war_engine`` and the headless batch runner in
+``simulation``; this module only parses arguments, sets up logging and
+dispatches, so nothing happens until ``main`` is called.
+"""
+
 import argparse
-from helper_functions import GameState
+import logging
+import random
+from game_stats import GameStats
+from game_trace import TraceWriter
+from result_sinks import RESULT_SINKS, format_for_path
+from rule_comparison import compare_rules
+from simulation import MAX_ROUNDS, POOLS, estimate_rate, run_seed_range
+from war_engine import VERBOSITY_LEVELS, play_war
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    handlers=[],
-)
 logger = logging.getLogger()
 
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "--auto",
-    action="store_true",
-    help="Prevent request for user action, move game along automatically",
-)
-parser.add_argument(
-    "--output",
-    nargs="?",
-    const="gameplay.log",
-    default=False,
-    help="Auto play game and output the game results to a log file",
-)
-parser.add_argument(
-    "--suit-up", action="store_true", help='run game with "suit up" house rule'
-)
-parser.add_argument(
-    "--battle-advantage",
-    action="store_true",
-    help='run game with "battle with advantage" house rule',
-)
-args = parser.parse_args()
-
-
-def _handle_empty_hands(game_state, player_1_played_cards, player_2_played_cards):
-    """Handle the case where both players are out of cards during war"""
-    if not game_state.player1.has_cards() and not game_state.player2.has_cards():
-        if player_1_played_cards and player_2_played_cards:
-            return game_state.compare_cards(
-                player_1_played_cards[-1],
-                player_2_played_cards[-1],
-                suit_up_active=False,
-            )
-        else:
-            return 0  # Draw if no cards were played
-    return None
 
+def build_parser():
+    """Argument parser for the command line options"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--auto",
+        action="store_true",
+        help="Prevent request for user action, move game along automatically",
+    )
+    parser.add_argument(
+        "--output",
+        nargs="?",
+        const="gameplay.log",
+        default=False,
+        help="Auto play game and output the game results to a log file",
+    )
+    parser.add_argument(
+        "--suit-up", action="store_true", help='run game with "suit up" house rule'
+    )
+    parser.add_argument(
+        "--battle-advantage",
+        action="store_true",
+        help='run game with "battle with advantage" house rule',
+    )
+    parser.add_argument(
+        "--games",
+        type=int,
+        default=None,
+        help="Play this many games headlessly and log a summary of the results",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="First seed of a --games batch, game i is dealt from seed + i",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of workers for a --games batch (defaults to the CPU count)",
+    )
+    parser.add_argument(
+        "--pool",
+        choices=POOLS,
+        default=None,
+        help="Run --games workers as processes or threads (defaults to threads "
+        "on free-threaded Python builds, processes otherwise)",
+    )
+    parser.add_argument(
+        "--max-rounds",
+        type=int,
+        default=MAX_ROUNDS,
+        help="Stop a game that has not finished after this many rounds",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="Also record the game (or every game of a --games batch) to this binary "
+        "trace file, render it with: python game_trace.py FILE",
+    )
+    parser.add_argument(
+        "--results",
+        default=None,
+        help="Write every game of a --games batch to this file as it finishes: "
+        "seed, rules, winner, rounds and mechanic counts",
+    )
+    parser.add_argument(
+        "--results-format",
+        choices=list(RESULT_SINKS),
+        default=None,
+        help="Format of the --results file (defaults to jsonl or csv by its "
+        "extension, columnar binary otherwise)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="SQLite outcome cache for a --games batch or --margin estimate, deals "
+        "already in it are not played again and new results are added to it",
+    )
+    parser.add_argument(
+        "--margin",
+        type=float,
+        default=None,
+        help="Play batches of seeds until the player 1 win rate is known to within "
+        "this margin (e.g. 0.001 for 0.1%%), --games caps the total (default 10M)",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.99,
+        help="Confidence level of the --margin interval",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Most games in the first --margin batch, later ones are sized from "
+        "the rate so far",
+    )
+    parser.add_argument(
+        "--compare-rules",
+        action="store_true",
+        help="Play every deal of a --games batch under all four rule sets and log "
+        "each one's paired differences from the plain game",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Also log rates, round count and cycle length percentiles and war "
+        "chain depths for a --games batch or --margin estimate",
+    )
+    parser.add_argument(
+        "--verbosity",
+        choices=VERBOSITY_LEVELS,
+        default=None,
+        help="How much to log: nothing, only game/batch results, or every round "
+        "(defaults to rounds for a single game and summary for --games)",
+    )
+    return parser
 
-def _draw_cards_for_round(
-    game_state, player_1_played_cards, player_2_played_cards, deal, reversed
-):
-    """Draw the required number of cards for both players"""
-    for _ in range(0, deal):
-        # Check if both players are out of cards
-        empty_hand_result = _handle_empty_hands(
-            game_state, player_1_played_cards, player_2_played_cards
-        )
-        if empty_hand_result is not None:
-            return empty_hand_result
 
-        # Player 1 draws a card
-        card1 = game_state.player1.draw_card(from_bottom=reversed)
-        if card1 is None:
-            return 2  # Player 2 wins
-        player_1_played_cards.append(card1)
+class BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that lets the file's own buffer batch up writes instead of
+    flushing after every record. Records are still formatted as they are
+    logged, the buffer is written out when it fills and when the handler closes.
+    """
 
-        # Player 2 draws a card
-        card2 = game_state.player2.draw_card(from_bottom=reversed)
-        if card2 is None:
-            return 1  # Player 1 wins
-        player_2_played_cards.append(card2)
+    def __init__(self, filename, mode="w", buffer_size=1 << 16):
+        self.buffer_size = buffer_size
+        super().__init__(filename, mode=mode)
 
-    return None  # Continue with round
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=self.buffer_size,
+            encoding=self.encoding,
+            errors=self.errors,
+        )
 
+    def flush(self):
+        pass  # Written out by the file buffer and on close
 
-def _handle_battle_with_advantage(
-    game_state, player_1_played_cards, player_2_played_cards
+
+def play_batch(
+    num_games,
+    suit_up=False,
+    battle_advantage=False,
+    start_seed=None,
+    workers=None,
+    max_rounds=MAX_ROUNDS,
+    trace_path=None,
+    log_summary=True,
+    results_path=None,
+    results_format=None,
+    cache_path=None,
+    pool=None,
+    stats=None,
 ):
-    """Handle battle with advantage when King vs Queen is played"""
-    card1, card2 = player_1_played_cards[-1], player_2_played_cards[-1]
+    """
+    Play many seeded games without per-round logging and log a summary of the results.
+    start_seed defaults to a random seed, the totals are returned as well.
+    results_format defaults to the one implied by results_path's extension.
+    With stats, a game_stats.GameStats, the games are added to it and its
+    percentiles logged too.
+    """
+    if start_seed is None:
+        start_seed = random.randrange(2**32)
+    totals = run_seed_range(
+        start_seed,
+        start_seed + num_games,
+        suit_up=suit_up,
+        battle_advantage=battle_advantage,
+        workers=workers,
+        max_rounds=max_rounds,
+        trace_path=trace_path,
+        results_path=results_path,
+        results_format=results_format or format_for_path(results_path or ""),
+        cache_path=cache_path,
+        pool=pool,
+        stats=stats,
+    )
+    if not log_summary:
+        return totals
 
-    if card1.value == 13:  # Player 1 has King
-        winner, all_cards = game_state.battle_with_advantage(
-            card2, card1, game_state.player2, game_state.player1
-        )
-        if winner == 1:  # Queen (Player 2) wins
-            game_state.player2.add_cards_to_discard(
-                player_2_played_cards + player_1_played_cards + all_cards[2:]
-            )
-        else:  # King (Player 1) wins
-            game_state.player1.add_cards_to_discard(
-                player_1_played_cards + player_2_played_cards + all_cards[2:]
-            )
-    else:  # Player 2 has King
-        winner, all_cards = game_state.battle_with_advantage(
-            card1, card2, game_state.player1, game_state.player2
-        )
-        if winner == 1:  # Queen (Player 1) wins
-            game_state.player1.add_cards_to_discard(
-                player_1_played_cards + player_2_played_cards + all_cards[2:]
-            )
-        else:  # King (Player 2) wins
-            game_state.player2.add_cards_to_discard(
-                player_2_played_cards + player_1_played_cards + all_cards[2:]
-            )
+    logger.info(
+        f"Played {totals.games} games (seeds {start_seed}-{start_seed + num_games - 1})"
+    )
+    logger.info(f"Player 1 wins: {totals.player1_wins}")
+    logger.info(f"Player 2 wins: {totals.player2_wins}")
+    logger.info(f"Draws: {totals.draws}")
+    logger.info(f"Cycles: {totals.cycles}")
+    logger.info(f"Stopped at {max_rounds} rounds: {totals.round_limits}")
+    if totals.games:
+        logger.info(f"Average rounds: {totals.rounds / totals.games:.2f}")
+        logger.info(f"Average wars: {totals.wars / totals.games:.2f}")
+        logger.info(f"Average suit ups: {totals.suit_ups / totals.games:.2f}")
+        logger.info(f"Average battles: {totals.battles / totals.games:.2f}")
+    if stats is not None and stats.games:
+        log_stats(stats)
+    return totals
 
 
-def _log_round_results(
-    game_state, player_1_played_cards, player_2_played_cards, comparison
+def play_until_confident(
+    margin,
+    confidence=0.99,
+    suit_up=False,
+    battle_advantage=False,
+    start_seed=None,
+    max_games=None,
+    batch_size=10000,
+    workers=None,
+    max_rounds=MAX_ROUNDS,
+    pool=None,
+    stats=None,
+    log_summary=True,
+    cache_path=None,
 ):
-    """Log the results of the current round"""
+    """
+    Play seeded batches until the player 1 win rate is known to within margin
+    at the given confidence (see simulation.estimate_rate) and log the estimate,
+    the games it took and the wall time. Returns the RateEstimate.
+    """
+    if start_seed is None:
+        start_seed = random.randrange(2**32)
+    estimate = estimate_rate(
+        margin,
+        confidence,
+        suit_up=suit_up,
+        battle_advantage=battle_advantage,
+        start_seed=start_seed,
+        batch_size=batch_size,
+        max_games=10000000 if max_games is None else max_games,
+        workers=workers,
+        max_rounds=max_rounds,
+        pool=pool,
+        stats=stats,
+        cache_path=cache_path,
+    )
+    if not log_summary:
+        return estimate
+
     logger.info(
-        f"P1: H:{str(len(game_state.player1.hand)).ljust(2)} | D:{str(len(game_state.player1.discard)).ljust(2)} | {player_1_played_cards}{'*' if comparison == 1 else ' '}"
+        f"Player 1 win rate: {estimate.rate:.3%} "
+        f"({estimate.low:.3%} to {estimate.high:.3%} at {confidence:.0%} confidence)"
     )
     logger.info(
-        f"P2: H:{str(len(game_state.player2.hand)).ljust(2)} | D:{str(len(game_state.player2.discard)).ljust(2)} | {player_2_played_cards}{'*' if comparison == 2 else ' '}"
+        f"Played {estimate.games} games (seeds {start_seed}-"
+        f"{start_seed + estimate.games - 1}) in {estimate.seconds:.1f}s, "
+        f"{estimate.batches} batch{'es' if estimate.batches != 1 else ''}"
     )
+    if not estimate.converged:
+        logger.info(f"Stopped at {estimate.games} games before reaching ±{margin:.3%}")
+    if stats is not None and stats.games:
+        log_stats(stats)
+    return estimate
 
 
-def play_round(
-    game_state, player_1_played_cards, player_2_played_cards, deal=1, reversed=False
+def compare_rule_sets(
+    num_games,
+    start_seed=None,
+    workers=None,
+    max_rounds=MAX_ROUNDS,
+    pool=None,
+    log_summary=True,
 ):
     """
-    Single round of gameplay, wars are considered part of the same round, and are recursively called
+    Play each seeded deal under every rule set and log how each differs from
+    the plain game on the same deals (see rule_comparison). start_seed
+    defaults to a random seed, the RuleComparison is returned as well.
     """
-    if (not args.auto) and not (args.output):
-        input("Press Enter to play")
-
-    # Draw cards for this round
-    early_result = _draw_cards_for_round(
-        game_state, player_1_played_cards, player_2_played_cards, deal, reversed
+    if start_seed is None:
+        start_seed = random.randrange(2**32)
+    comparison = compare_rules(
+        start_seed,
+        start_seed + num_games,
+        workers=workers,
+        max_rounds=max_rounds,
+        pool=pool,
     )
-    if early_result is not None:
-        return early_result
+    if not log_summary:
+        return comparison
 
-    # Compare the cards
-    comparison = game_state.compare_cards(
-        player_1_played_cards[-1],
-        player_2_played_cards[-1],
-        suit_up_active=(args.suit_up and deal != 4),
-        battle_advantage_active=(args.battle_advantage and deal != 4),
+    logger.info(
+        f"Played {comparison.deals} deals (seeds {start_seed}-"
+        f"{start_seed + num_games - 1}) under each rule set"
     )
-
-    # Log round results
-    _log_round_results(
-        game_state, player_1_played_cards, player_2_played_cards, comparison
+    baseline, *variants = comparison.summary()
+    logger.info(
+        f"{baseline['rules']}: player 1 win rate {baseline['player1_win_rate']:.2%}, "
+        f"average rounds {baseline['rounds_mean']:.2f}"
     )
-
-    # Handle the comparison result
-    if comparison == 1:
-        game_state.player1.add_cards_to_discard(
-            player_1_played_cards + player_2_played_cards
-        )
-    elif comparison == 2:
-        game_state.player2.add_cards_to_discard(
-            player_2_played_cards + player_1_played_cards
+    for row in variants:
+        logger.info(
+            f"{row['rules']}: player 1 win rate {row['player1_win_rate']:.2%}, "
+            f"average rounds {row['rounds_mean']:.2f}, "
+            f"winner flips {row['winner_flips']} ({row['flip_rate']:.2%}), "
+            f"win rate {row['win_rate_delta']:+.2%} ± {row['delta_stderr']:.2%} "
+            f"(± {row['independent_stderr']:.2%} unpaired), "
+            f"rounds {row['rounds_delta_mean']:+.2f} ± {row['rounds_delta_stderr']:.2f}"
         )
-    elif comparison == 0:
-        logger.info("War!")
-        return play_round(
-            game_state, player_1_played_cards, player_2_played_cards, deal=4
-        )
-    elif comparison == 3:
-        logger.info("Suit Up!")
-        return play_round(
-            game_state,
-            player_1_played_cards,
-            player_2_played_cards,
-            deal=2,
-            reversed=True,
+    return comparison
+
+
+def log_stats(stats):
+    """Log the rates and percentiles of a game_stats.GameStats"""
+    summary = stats.summary()
+    logger.info(
+        f"Player 1 win rate: {summary['player1_win_rate']:.2%}, "
+        f"draw rate: {summary['draw_rate']:.2%}, "
+        f"cycle rate: {summary['cycle_rate']:.2%}"
+    )
+    logger.info(
+        f"Rounds: mean {summary['rounds_mean']:.2f}, "
+        f"stdev {summary['rounds_stdev']:.2f}, "
+        f"p50 {summary['rounds_p50']:.0f}, "
+        f"p90 {summary['rounds_p90']:.0f}, "
+        f"p99 {summary['rounds_p99']:.0f}"
+    )
+    if summary["cycle_length_p50"] is not None:
+        logger.info(
+            f"Cycle lengths: p50 {summary['cycle_length_p50']:.0f}, "
+            f"p99 {summary['cycle_length_p99']:.0f}"
         )
-    elif comparison == 4:
-        logger.info("Battle with Advantage Triggered!")
-        _handle_battle_with_advantage(
-            game_state, player_1_played_cards, player_2_played_cards
+    if summary["war_chains"]:
+        chains = ", ".join(
+            f"{depth}: {rounds}" for depth, rounds in summary["war_chains"].items()
         )
-
-    return None  # no winner yet
+        logger.info(f"Rounds by wars in a row: {chains}")
 
 
-def play_war():
-    """
-    Play game
-    """
+def main(argv=None):
+    """Run the game, or a batch of games, as described by the command line"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.margin is not None or args.compare_rules:
+        # Neither writes its games to one file, and a comparison has no one
+        # rule set to cache results or gather statistics for
+        if args.margin is not None:
+            mode, unsupported = "--margin", ("trace", "results")
+        else:
+            mode, unsupported = (
+                "--compare-rules",
+                ("trace", "results", "cache", "stats"),
+            )
+        for option in unsupported:
+            if getattr(args, option):
+                parser.error(f"--{option} can't be used with {mode}")
+    verbosity = args.verbosity
+    if verbosity is None:
+        # Per-round logging unless batching
+        batch = args.games is not None or args.margin is not None or args.compare_rules
+        verbosity = "summary" if batch else "rounds"
 
-    # Setup game using GameState class
-    game_state = GameState()
-    game_state.setup_game(shuffle_deck=True)
+    logger.setLevel(logging.INFO)
+    if args.output:
+        handler = BufferedFileHandler(
+            args.output.replace(".log", "") + ".log", mode="w"
+        )
+    else:
+        handler = logging.StreamHandler()
+    logger.addHandler(handler)
 
-    while True:
-        # Game play loop
-        assert (
-            game_state.round_number < 10000
-        ), "infinite loop suspected"  # if player's don't grab their own deck first when picking up cards, the game can enter infinite loops
-        player_1_played_cards, player_2_played_cards = [], []
-        logger.info(f"---- Round {game_state.round_number} ----")
+    stats = GameStats(args.suit_up, args.battle_advantage) if args.stats else None
+    try:
+        if args.margin is not None:
+            play_until_confident(
+                args.margin,
+                args.confidence,
+                suit_up=args.suit_up,
+                battle_advantage=args.battle_advantage,
+                start_seed=args.seed,
+                max_games=args.games,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                max_rounds=args.max_rounds,
+                pool=args.pool,
+                stats=stats,
+                log_summary=verbosity != "none",
+                cache_path=args.cache,
+            )
+            return
 
-        winner = play_round(
-            game_state, player_1_played_cards, player_2_played_cards, deal=1
-        )
-        if winner:
-            logger.info(f"Player {winner} Wins in {game_state.round_number} rounds!")
-            break
-        elif winner == 0:  # for rare case
-            logger.info("Draw!")
-            break
+        if args.compare_rules:
+            compare_rule_sets(
+                args.games or 1000,
+                start_seed=args.seed,
+                workers=args.workers,
+                max_rounds=args.max_rounds,
+                pool=args.pool,
+                log_summary=verbosity != "none",
+            )
+            return
 
-        # Check if game is over after round
-        game_winner = game_state.check_game_over()
-        if game_winner:
-            logger.info(f"{game_winner} Wins in {game_state.round_number} rounds!")
-            break
+        if args.games is not None:
+            play_batch(
+                args.games,
+                suit_up=args.suit_up,
+                battle_advantage=args.battle_advantage,
+                start_seed=args.seed,
+                workers=args.workers,
+                max_rounds=args.max_rounds,
+                trace_path=args.trace,
+                log_summary=verbosity != "none",
+                results_path=args.results,
+                results_format=args.results_format,
+                cache_path=args.cache,
+                pool=args.pool,
+                stats=stats,
+            )
+            return
 
-        game_state.increment_round()
+        game_options = dict(
+            suit_up=args.suit_up,
+            battle_advantage=args.battle_advantage,
+            verbosity=verbosity,
+            prompt=not args.auto and not args.output,
+            max_rounds=args.max_rounds,
+        )
+        if args.trace:
+            with open(args.trace, "wb") as trace_file:
+                play_war(trace=TraceWriter(trace_file), **game_options)
+        else:
+            play_war(**game_options)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
 
 
 if __name__ == "__main__":
-    if args.output:
-        logger.addHandler(
-            logging.FileHandler(
-                mode="w", filename=(args.output.replace(".log", "") + ".log")
-            )
-        )
-    else:
-        logger.addHandler(logging.StreamHandler())
-    play_war()
+    main()